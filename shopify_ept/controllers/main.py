@@ -92,26 +92,38 @@ class Main(http.Controller):
             sale_order.sudo().process_shopify_order_via_webhook(res, instance, True)
         elif fulfillment_status in ["fulfilled", "unfulfilled", "partial"]:
             res["fulfillment_status"] = fulfillment_status
-            sale_order.sudo().with_context({'is_new_order': True}).process_shopify_order_via_webhook(res,
-                                                                                                     instance)
+            sale_order.sudo().process_shopify_order_via_webhook(res, instance)
         return
 
     def get_basic_info(self, route):
         """
         This method is used to check that instance and webhook are active or not. If yes then return response and
         instance, If no then return response as False and instance.
+        The response is False as well when the HMAC of the webhook is not valid or when the webhook is already
+        received, as Shopify delivers it again while Odoo is slow to answer.
         @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 10-Jan-2020..
         """
         res = request.jsonrequest
-        host = request.httprequest.headers.get("X-Shopify-Shop-Domain")
-        instance = request.env["shopify.instance.ept"].sudo().with_context(active_test=False).search(
-            [("shopify_host", "ilike", host)], limit=1)
-
-        webhook = request.env["shopify.webhook.ept"].sudo().search([("delivery_url", "ilike", route),
-                                                                    ("instance_id", "=", instance.id)], limit=1)
-
-        if not instance.active or not webhook.state == "active":
+        headers = request.httprequest.headers
+        webhook_obj = request.env["shopify.webhook.ept"].sudo()
+        webhook_event_obj = request.env["shopify.webhook.event.ept"].sudo()
+        host = headers.get("X-Shopify-Shop-Domain")
+        instance_id, webhook_id, is_active, shared_secret = webhook_obj.resolve_shopify_webhook(host, route)
+        instance = request.env["shopify.instance.ept"].sudo().with_context(active_test=False).browse(instance_id)
+        webhook = webhook_obj.browse(webhook_id)
+
+        if not is_active:
             _logger.info("The method is skipped. It appears the instance:%s is not active or that "
                          "the webhook %s is not active.", instance.name, webhook.webhook_name)
             res = False
+        elif not webhook_event_obj.verify_shopify_webhook(shared_secret, request.httprequest.get_data(),
+                                                          headers.get("X-Shopify-Hmac-Sha256")):
+            _logger.info("The method is skipped. The HMAC of the webhook %s of the instance:%s is not valid.",
+                         webhook.webhook_name, instance.name)
+            res = False
+        elif not webhook_event_obj.register_shopify_webhook_event(instance, headers.get("X-Shopify-Webhook-Id"),
+                                                                  headers.get("X-Shopify-Topic")):
+            _logger.info("The method is skipped. The webhook %s is already received.",
+                         headers.get("X-Shopify-Webhook-Id"))
+            res = False
         return res, instance
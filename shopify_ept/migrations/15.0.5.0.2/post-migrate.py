@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+import json
+import logging
+
+import pytz
+from dateutil import parser
+from psycopg2 import Binary
+from psycopg2.extras import execute_values
+
+from odoo.addons.shopify_ept.models.order_data_queue_line_ept import compress_queue_data
+
+_logger = logging.getLogger("Shopify Queue Data Migration")
+
+BATCH_SIZE = 1000
+
+
+def column_exists(cr, table, column):
+    cr.execute("""select 1 from information_schema.columns where table_name = %s and column_name = %s""",
+               (table, column))
+    return bool(cr.fetchone())
+
+
+def prepare_payload(data):
+    payload = compress_queue_data(data)
+    return Binary(payload) if payload else None
+
+
+def prepare_order_columns(data):
+    """ Extracts the columns of the order queue line from the JSON data of the order. """
+    try:
+        order = json.loads(data)
+    except ValueError:
+        return None, None, None
+    updated_at = order.get("updated_at")
+    if updated_at:
+        updated_at = parser.parse(updated_at).astimezone(pytz.utc).strftime("%Y-%m-%d %H:%M:%S")
+    return order.get("financial_status"), order.get("fulfillment_status"), updated_at or None
+
+
+def migrate(cr, version):
+    """ Moves the JSON data of the order and product queue lines from their Text column to the compressed Binary
+        column, in batches, and drops the Text column.
+    """
+    if not version:
+        return
+    if column_exists(cr, "shopify_order_data_queue_line_ept", "order_data"):
+        while True:
+            cr.execute("""select id, order_data from shopify_order_data_queue_line_ept where order_data is not null
+                          order by id limit %s""", (BATCH_SIZE,))
+            rows = cr.fetchall()
+            if not rows:
+                break
+            values = [(line_id, prepare_payload(data)) + prepare_order_columns(data) for line_id, data in rows]
+            execute_values(cr._obj, """update shopify_order_data_queue_line_ept as line
+                                       set order_data_compressed = data.payload,
+                                       financial_status = data.financial_status,
+                                       fulfillment_status = data.fulfillment_status,
+                                       shopify_updated_at = data.updated_at, order_data = null
+                                       from (values %s) as data (id, payload, financial_status, fulfillment_status,
+                                                                 updated_at)
+                                       where line.id = data.id""",
+                           values, template="(%s, %s::bytea, %s, %s, %s::timestamp)", page_size=BATCH_SIZE)
+            _logger.info("Compressed data of %s order queue lines.", len(rows))
+        cr.execute("alter table shopify_order_data_queue_line_ept drop column order_data")
+
+    if column_exists(cr, "shopify_product_data_queue_line_ept", "synced_product_data"):
+        while True:
+            cr.execute("""select id, synced_product_data from shopify_product_data_queue_line_ept
+                          where synced_product_data is not null order by id limit %s""", (BATCH_SIZE,))
+            rows = cr.fetchall()
+            if not rows:
+                break
+            execute_values(cr._obj, """update shopify_product_data_queue_line_ept as line
+                                       set synced_product_data_compressed = data.payload, synced_product_data = null
+                                       from (values %s) as data (id, payload) where line.id = data.id""",
+                           [(line_id, prepare_payload(data)) for line_id, data in rows],
+                           template="(%s, %s::bytea)", page_size=BATCH_SIZE)
+            _logger.info("Compressed data of %s product queue lines.", len(rows))
+        cr.execute("alter table shopify_product_data_queue_line_ept drop column synced_product_data")
@@ -4,7 +4,10 @@
 from . import res_company
 from . import instance_ept
 from . import shopify_template_ept
+from . import shopify_image_index_ept
 from . import shopify_product_ept
+from . import shopify_exported_stock_ept
+from . import shopify_stock_export_queue_ept
 from . import common_product_image_ept
 from . import product_data_queue
 from . import product_data_queue_line
@@ -12,8 +15,10 @@ from . import common_log_book_ept
 from . import common_log_lines_ept
 from . import order_data_queue_ept
 from . import order_data_queue_line_ept
+from . import shopify_bulk_operation_ept
 from . import customer_data_queue_ept
 from . import customer_data_queue_line_ept
+from . import shopify_queue_archive_ept
 from . import res_partner
 from . import payment_gateway
 from . import sale_order
@@ -28,6 +33,7 @@ from . import shopify_res_partner_ept
 from . import product
 from . import shopify_product_image_ept
 from . import webhook_ept
+from . import shopify_webhook_event_ept
 from . import shopify_payout_report_line_ept
 from . import shopify_payout_report_ept
 from . import shopify_payout_account_config
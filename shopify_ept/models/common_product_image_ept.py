@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
 # See LICENSE file for full copyright and licensing details.
 
+import hashlib
 import logging
 
-from odoo import models, api
+from odoo import models, fields, api
 
 _logger = logging.getLogger("Shopify Common Image")
 
@@ -11,6 +12,18 @@ _logger = logging.getLogger("Shopify Common Image")
 class ProductImageEpt(models.Model):
     _inherit = 'common.product.image.ept'
 
+    shopify_image_checksum = fields.Char("Image Checksum", compute="_compute_shopify_image_checksum", store=True,
+                                         index=True, help="MD5 of the base64 encoded image, it is used to find the "
+                                                          "same image without reading the images.")
+
+    @api.depends("image")
+    def _compute_shopify_image_checksum(self):
+        """
+        Computes the checksum of the image when it is written.
+        """
+        for record in self.with_context(bin_size=False):
+            record.shopify_image_checksum = hashlib.md5(record.image).hexdigest() if record.image else False
+
     @api.model
     def create(self, vals):
         """
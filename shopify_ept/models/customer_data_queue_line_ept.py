@@ -39,9 +39,9 @@ class ShopifyCustomerDataQueueLineEpt(models.Model):
         :Task ID: 157065
         """
         if customer_queue_id:
-            for result in customer_ids:
-                result = result.to_dict()
-                self.shopify_customer_data_queue_line_create(result, customer_queue_id)
+            line_vals = [self.prepare_customer_data_queue_line_vals(result.to_dict(), customer_queue_id)
+                         for result in customer_ids]
+            self.create(line_vals)
         return True
 
     def shopify_customer_data_queue_line_create(self, result, customer_queue_id):
@@ -51,18 +51,27 @@ class ShopifyCustomerDataQueueLineEpt(models.Model):
         @author: Angel Patel @Emipro Technologies Pvt. Ltd on date 13/01/2020.
         """
         synced_shopify_customers_line_obj = self.env["shopify.customer.data.queue.line.ept"]
+        line_vals = self.prepare_customer_data_queue_line_vals(result, customer_queue_id)
+        return synced_shopify_customers_line_obj.create(line_vals)
+
+    def prepare_customer_data_queue_line_vals(self, result, customer_queue_id):
+        """
+        This method is used to prepare the vals of a customer queue line.
+        :param result: Response of 1 customer.
+        :param customer_queue_id: Record of the customer queue.
+        @return: Dictionary of vals.
+        """
         name = "%s %s" % (result.get("first_name") or "", result.get("last_name") or "")
         customer_id = result.get("id")
         data = json.dumps(result)
-        line_vals = {
+        return {
             "synced_customer_queue_id": customer_queue_id.id,
             "shopify_customer_data_id": customer_id or "",
             "name": name.strip(),
             "shopify_synced_customer_data": data,
-            "shopify_instance_id": self.shopify_instance_id.id,
+            "shopify_instance_id": customer_queue_id.shopify_instance_id.id,
             "last_process_date": datetime.now(),
         }
-        return synced_shopify_customers_line_obj.create(line_vals)
 
     @api.model
     def sync_shopify_customer_into_odoo(self):
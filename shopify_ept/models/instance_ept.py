@@ -10,6 +10,7 @@ from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 from .. import shopify
 from ..shopify.pyactiveresource.connection import ForbiddenAccess
+from .webhook_ept import WEBHOOK_RESOLVER_INSTANCE_FIELDS
 
 _logger = logging.getLogger("Shopify Instance")
 _secondsConverter = {
@@ -158,6 +159,18 @@ class ShopifyInstanceEpt(models.Model):
     update_category_in_odoo_product = fields.Boolean(string="Update Category In Odoo Product ?",
                                                      default=False)
     shopify_stock_field = fields.Many2one('ir.model.fields', string='Stock Field')
+    shopify_stock_export_method = fields.Selection([("rest", "One Request per Product"),
+                                                    ("graphql", "Batched GraphQL Requests")],
+                                                   string="Export Stock Method", default="rest",
+                                                   help="One Request per Product: Stock of every product is "
+                                                        "exported with its own InventoryLevel request.\n"
+                                                        "Batched GraphQL Requests: Stock of up to 250 products is "
+                                                        "exported together with the inventorySetQuantities "
+                                                        "mutation.")
+    shopify_stock_export_on_move = fields.Boolean("Export Stock on Stock Moves", default=False,
+                                                  help="If checked, products are queued for stock export as soon as "
+                                                       "their stock moves are confirmed, reserved or done, and the "
+                                                       "queue is exported within seconds.")
     last_date_order_import = fields.Datetime(string="Last Date Of Unshipped Order Import",
                                              help="Last date of sync orders from Shopify to Odoo")
     shopify_section_id = fields.Many2one('crm.team', 'Sales Team')
@@ -200,6 +213,10 @@ class ShopifyInstanceEpt(models.Model):
     is_shopify_create_schedule = fields.Boolean("Create Schedule Activity ? ", default=False,
                                                 help="If checked, Then Schedule Activity create on order data queues"
                                                      " will any queue line failed.")
+    shopify_queue_retention_days = fields.Integer("Queue Lines Retention Days", default=0,
+                                                  help="Done, failed and cancelled queue lines and log lines older "
+                                                       "than these days are moved to the archive tables. Keep 0 to "
+                                                       "never archive them.")
     active = fields.Boolean(default=True)
     sync_product_with_images = fields.Boolean("Sync Images?",
                                               help="Check if you want to import images along with "
@@ -253,6 +270,13 @@ class ShopifyInstanceEpt(models.Model):
 
     import_order_after_date = fields.Datetime(help="Connector only imports those orders which have created after a "
                                                    "given date.", default=_default_shopify_import_after_date)
+    defer_auto_workflow = fields.Boolean("Process Auto Workflow Separately", default=False,
+                                         help="If checked, Orders are only created while importing and their auto "
+                                              "workflow is processed in batches by the auto workflow cron.")
+    batch_auto_workflow_invoices = fields.Boolean("Batch Invoices and Payments", default=False,
+                                                  help="If checked, The auto workflow cron confirms the orders and "
+                                                       "creates, posts and pays their invoices for many orders "
+                                                       "together, grouped by auto workflow and payment gateway.")
 
     custom_service_product_id = fields.Many2one("product.product", "Custom Service Product",
                                                 domain=[('detailed_type', '=', 'service')],
@@ -770,7 +794,26 @@ class ShopifyInstanceEpt(models.Model):
         sales_team = self.create_sales_channel(vals.get('name'))
 
         vals.update({"shopify_default_pos_customer_id": customer.id, "shopify_section_id": sales_team.id})
-        return super(ShopifyInstanceEpt, self).create(vals)
+        res = super(ShopifyInstanceEpt, self).create(vals)
+        self.clear_caches()
+        return res
+
+    def write(self, vals):
+        """
+        Clears the cache of the webhook requests resolution, when a field used by it changes.
+        """
+        res = super(ShopifyInstanceEpt, self).write(vals)
+        if WEBHOOK_RESOLVER_INSTANCE_FIELDS.intersection(vals):
+            self.clear_caches()
+        return res
+
+    def unlink(self):
+        """
+        Clears the cache of the webhook requests resolution, as the webhooks of the instances are deleted too.
+        """
+        res = super(ShopifyInstanceEpt, self).unlink()
+        self.clear_caches()
+        return res
 
     def create_sales_channel(self, name):
         """
@@ -6,10 +6,10 @@ import re
 import logging
 from datetime import datetime, timedelta
 import pytz
+from six.moves.urllib.parse import urlparse, parse_qs
 from odoo import models, fields, api, _
 
 from odoo.exceptions import UserError
-from ..shopify.pyactiveresource.connection import ClientError
 from .. import shopify
 
 utc = pytz.utc
@@ -57,6 +57,11 @@ class ShopifyOrderDataQueueEpt(models.Model):
     is_action_require = fields.Boolean(default=False, help="it is used  to find the action require queue")
     queue_type = fields.Selection([("shipped", "Shipped Order Queue"), ("unshipped", "Unshipped Order Queue")],
                                   help="Identify to queue for which type of order import.")
+    next_page_info = fields.Char(copy=False, help="Cursor of the next page of orders, kept on the last queue while "
+                                                  "the import is running. An interrupted import resumes from it.")
+    next_page_order_status = fields.Char(copy=False, help="Fulfillment status of the orders of the cursor.")
+    next_page_from_date = fields.Datetime(copy=False, help="From date of the import of the cursor.")
+    next_page_to_date = fields.Datetime(copy=False, help="To date of the import of the cursor.")
 
     @api.depends('order_data_queue_line_ids.state')
     def _compute_queue_state(self):
@@ -161,7 +166,6 @@ class ShopifyOrderDataQueueEpt(models.Model):
         Task Id : 157350
         @change: Maulik Barad on Date 10-Sep-2020.
         """
-        order_data_queue_line_obj = self.env["shopify.order.data.queue.line.ept"]
         start = time.time()
         order_queues = []
         instance.connect_in_shopify()
@@ -169,16 +173,8 @@ class ShopifyOrderDataQueueEpt(models.Model):
             queue_type = 'unshipped'
             for order_status_id in instance.shopify_order_status_ids:
                 order_status = order_status_id.status
-                order_ids = self.shopify_order_request(instance, from_date, to_date, order_status)
-
-                if order_ids:
-                    order_queues = order_data_queue_line_obj.create_order_data_queue_line(order_ids,
-                                                                                          instance,
-                                                                                          queue_type,
-                                                                                          created_by)
-                    if len(order_ids) >= 250:
-                        order_queue_list = self.list_all_orders(order_ids, instance, created_by, queue_type)
-                        order_queues += order_queue_list
+                order_queues += self.shopify_import_order_pages(instance, from_date, to_date, order_status,
+                                                                queue_type, created_by)
                 instance.last_date_order_import = to_date - timedelta(days=2)
         else:
             order_queues = self.shopify_shipped_order_request(instance, from_date, to_date, created_by="import",
@@ -212,63 +208,70 @@ class ShopifyOrderDataQueueEpt(models.Model):
             @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 30 December 2020 .
             Task_id:169381 - Gift card order import changes
         """
-        order_data_queue_line_obj = self.env["shopify.order.data.queue.line.ept"]
-        order_queues = []
-        queue_type = 'shipped'
-        order_ids = self.shopify_order_request(instance, from_date, to_date, order_type)
-        if order_ids:
-            order_queues = order_data_queue_line_obj.create_order_data_queue_line(order_ids,
-                                                                                  instance,
-                                                                                  queue_type,
-                                                                                  created_by)
-            if len(order_ids) >= 250:
-                order_queue_list = self.list_all_orders(order_ids, instance, created_by, queue_type)
-                order_queues += order_queue_list
-
-        return order_queues
+        return self.shopify_import_order_pages(instance, from_date, to_date, order_type, "shipped", created_by)
 
-    def list_all_orders(self, result, instance, created_by, queue_type):
+    def shopify_import_order_pages(self, instance, from_date, to_date, order_status, queue_type, created_by):
         """
-        This method used to get the list of orders from Shopify to Odoo.
-        @param result: Response of order which received from Shopify store.
-        @param order_type: Here we receive 2 type of order type(unshipped, shipped).
-        @param created_by: To identify which process is created a queue record(webhook, Manually).
-        @param instance:
-        @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 06/11/2019.
-        Task_id : 157350
-        Modify on date 27/12/2019 Taken pagination changes
-        @change : Maulik Barad on Date 10-Sep-2020.
+        This method is used to import the orders page by page. An import interrupted before its last page, for
+        the same order status, is first resumed from its cursor, then only the orders updated after it are
+        requested.
+        @param order_status: Fulfillment status of the orders to import.
+        @param queue_type: Type of the order queues to create, shipped or unshipped.
+        @return: List of order queue ids.
         """
-        order_data_queue_line_obj = self.env["shopify.order.data.queue.line.ept"]
         order_queue_list = []
-        catch = ""
+        interrupted_queues = self.search([("shopify_instance_id", "=", instance.id), ("queue_type", "=", queue_type),
+                                          ("next_page_order_status", "=", order_status),
+                                          ("next_page_info", "!=", False)], order="id desc")
+        interrupted_queue = interrupted_queues[:1]
+        if interrupted_queue and interrupted_queue.next_page_from_date <= from_date:
+            page_info = interrupted_queue.next_page_info
+            resume_from_date, resume_to_date = interrupted_queue.next_page_from_date, interrupted_queue.next_page_to_date
+            interrupted_queues.write({"next_page_info": False})
+            _logger.info("Resuming the interrupted import of %s orders from queue %s.", order_status,
+                         interrupted_queue.name)
+            try:
+                orders = shopify.Order().find(limit=250, page_info=page_info)
+            except Exception as error:
+                raise UserError(error)
+            order_queue_list += self.create_order_queues_from_pages(orders, instance, order_status, resume_from_date,
+                                                                    resume_to_date, queue_type, created_by)
+            from_date = max(from_date, resume_to_date)
+        else:
+            interrupted_queues.write({"next_page_info": False})
 
-        while result:
-            page_info = ""
-            # link: link of next page.
-            link = shopify.ShopifyResource.connection.response.headers.get('Link')
-            if not link or not isinstance(link, str):
-                return order_queue_list
+        if from_date < to_date:
+            orders = self.shopify_order_request(instance, from_date, to_date, order_status)
+            order_queue_list += self.create_order_queues_from_pages(orders, instance, order_status, from_date,
+                                                                    to_date, queue_type, created_by)
+        return order_queue_list
 
-            for page_link in link.split(','):
-                if page_link.find('next') > 0:
-                    page_info = page_link.split(';')[0].strip('<>').split('page_info=')[1]
-                    try:
-                        result = shopify.Order().find(limit=250, page_info=page_info)
-                    except ClientError as error:
-                        if hasattr(error,
-                                   "response") and error.response.code == 429 and error.response.msg == "Too Many Requests":
-                            time.sleep(int(float(error.response.headers.get('Retry-After', 5))))
-                            result = shopify.Order().find(limit=250, page_info=page_info)
-                    except Exception as error:
-                        raise UserError(error)
-                    if result:
-                        order_queues = order_data_queue_line_obj.create_order_data_queue_line(result, instance,
-                                                                                              queue_type,
-                                                                                              created_by)
-                        order_queue_list += order_queues
-            if catch == page_info:
+    def create_order_queues_from_pages(self, orders, instance, order_status, from_date, to_date, queue_type,
+                                       created_by):
+        """
+        This method is used to add the orders into queues page by page, keeping only one page in memory. After
+        each page, the cursor of the next page is committed on the last queue created.
+        @param orders: First page of orders.
+        @return: List of order queue ids.
+        """
+        order_data_queue_line_obj = self.env["shopify.order.data.queue.line.ept"]
+        order_queue_list = []
+        cursor_queue = self.browse()
+        for page in shopify.PrefetchPaginatedIterator(orders):
+            if not page:
                 break
+            page_info = False
+            if page.has_next_page():
+                page_info = parse_qs(urlparse(page.next_page_url).query).get("page_info", [False])[0]
+            order_queues = order_data_queue_line_obj.create_order_data_queue_line(page, instance, queue_type,
+                                                                                  created_by)
+            order_queue_list += order_queues
+            if order_queues:
+                cursor_queue.write({"next_page_info": False})
+                cursor_queue = self.browse(order_queues[-1])
+                cursor_queue.write({"next_page_info": page_info, "next_page_order_status": order_status,
+                                    "next_page_from_date": from_date, "next_page_to_date": to_date})
+            self._cr.commit()
         return order_queue_list
 
     def import_order_process_by_remote_ids(self, instance, order_ids):
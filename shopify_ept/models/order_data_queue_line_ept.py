@@ -1,13 +1,33 @@
 # -*- coding: utf-8 -*-
 # See LICENSE file for full copyright and licensing details.
+import base64
 import json
 import logging
 import time
-from odoo import models, fields
+import zlib
+
+import pytz
+from dateutil import parser
+from psycopg2 import OperationalError
+from odoo import models, fields, api
 
 _logger = logging.getLogger("Shopify Order Queue Line")
 
 
+def compress_queue_data(data):
+    """ Compresses the JSON data of a queue line into the base64 value of a Binary field. """
+    if not data:
+        return False
+    return base64.b64encode(zlib.compress(data.encode("utf-8")))
+
+
+def decompress_queue_data(payload):
+    """ Decompresses the base64 value of a Binary field into the JSON data of a queue line. """
+    if not payload:
+        return False
+    return zlib.decompress(base64.b64decode(payload)).decode("utf-8")
+
+
 class ShopifyOrderDataQueueLineEpt(models.Model):
     _name = "shopify.order.data.queue.line.ept"
     _description = "Shopify Order Data Queue Line"
@@ -18,10 +38,16 @@ class ShopifyOrderDataQueueLineEpt(models.Model):
                                           help="Order imported from this Shopify Instance.")
     state = fields.Selection([("draft", "Draft"), ("failed", "Failed"), ("done", "Done"),
                               ("cancel", "Cancelled")], default="draft", copy=False)
-    shopify_order_id = fields.Char(help="Id of imported order.", copy=False)
+    shopify_order_id = fields.Char(help="Id of imported order.", copy=False, index=True)
     sale_order_id = fields.Many2one("sale.order", copy=False,
                                     help="Order created in Odoo.")
-    order_data = fields.Text(help="Data imported from Shopify of current order.", copy=False)
+    order_data = fields.Text(help="Data imported from Shopify of current order.", copy=False,
+                             compute="_compute_order_data", inverse="_inverse_order_data")
+    order_data_compressed = fields.Binary(attachment=False, copy=False,
+                                          help="Data imported from Shopify of current order, compressed.")
+    financial_status = fields.Char(copy=False, index=True, help="Financial status of the order in Shopify.")
+    fulfillment_status = fields.Char(copy=False, index=True, help="Fulfillment status of the order in Shopify.")
+    shopify_updated_at = fields.Datetime(copy=False, index=True, help="Last update of the order in Shopify.")
 
     customer_name = fields.Text(help="Shopify Customer Name", copy=False)
 
@@ -33,6 +59,18 @@ class ShopifyOrderDataQueueLineEpt(models.Model):
                                                          "shopify_order_data_queue_line_id",
                                                          help="Log lines created against which line.")
     name = fields.Char(help="Order Name")
+    lease_expires_at = fields.Datetime(copy=False, help="The line is claimed by a worker of the order queue cron "
+                                                        "until this time.")
+
+    @api.depends("order_data_compressed")
+    def _compute_order_data(self):
+        """ Decompresses the order data only when it is read. """
+        for line in self:
+            line.order_data = decompress_queue_data(line.with_context(bin_size=False).order_data_compressed)
+
+    def _inverse_order_data(self):
+        for line in self:
+            line.order_data_compressed = compress_queue_data(line.order_data)
 
     def create_order_queue_line(self, order_dict, instance, order_data, customer_name, customer_email, order_queue_id):
         """
@@ -42,18 +80,36 @@ class ShopifyOrderDataQueueLineEpt(models.Model):
         :param order_queue_id: Record of order queue.
         @author: Maulik Barad on Date 10-Sep-2020.
         """
-        order_queue_line_vals = {"shopify_order_id": order_dict.get("id", False),
-                                 "shopify_instance_id": instance.id,
-                                 "order_data": order_data,
-                                 "name": order_dict.get("name", ""),
-                                 "customer_name": customer_name,
-                                 "customer_email": customer_email,
-                                 "shopify_order_data_queue_id": order_queue_id.id}
+        order_queue_line_vals = self.prepare_order_queue_line_vals(order_dict, instance, order_data, customer_name,
+                                                                   customer_email, order_queue_id)
         return self.create(order_queue_line_vals)
 
+    def prepare_order_queue_line_vals(self, order_dict, instance, order_data, customer_name, customer_email,
+                                      order_queue_id):
+        """ This method is used to prepare the vals of an order data queue line.
+            :param order_dict: The response of order in the dictionary.
+            :param order_data: The response of order in dump data.
+            :param order_queue_id: Record of order queue.
+            @return: Dictionary of vals.
+        """
+        updated_at = order_dict.get("updated_at")
+        if updated_at:
+            updated_at = parser.parse(updated_at).astimezone(pytz.utc).strftime("%Y-%m-%d %H:%M:%S")
+        return {"shopify_order_id": order_dict.get("id", False),
+                "shopify_instance_id": instance.id,
+                "order_data_compressed": compress_queue_data(order_data),
+                "financial_status": order_dict.get("financial_status"),
+                "fulfillment_status": order_dict.get("fulfillment_status"),
+                "shopify_updated_at": updated_at or False,
+                "name": order_dict.get("name", ""),
+                "customer_name": customer_name,
+                "customer_email": customer_email,
+                "shopify_order_data_queue_id": order_queue_id.id}
+
     def create_order_data_queue_line(self, orders_data, instance, queue_type, created_by="import"):
         """
         This method used to create order data queue lines. It creates new queue after 50 order queue lines.
+        The lines of a queue are created together.
         @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 06/11/2019.
         Task Id : 157350
         """
@@ -61,6 +117,7 @@ class ShopifyOrderDataQueueLineEpt(models.Model):
         need_to_create_queue = True
         orders_data.reverse()
         order_queue_list = []
+        order_queue_line_vals = []
         is_new_order = bool(self._context.get('is_new_order'))
         for order in orders_data:
             if created_by == "webhook" and not is_new_order:
@@ -70,6 +127,8 @@ class ShopifyOrderDataQueueLineEpt(models.Model):
                 order = order.to_dict()
 
             if need_to_create_queue:
+                self.create(order_queue_line_vals)
+                order_queue_line_vals = []
                 order_queue = self.shopify_create_order_queue(instance, queue_type, created_by)
                 order_queue_list.append(order_queue.id)
                 message = "Order Queue %s created." % order_queue.name
@@ -80,14 +139,14 @@ class ShopifyOrderDataQueueLineEpt(models.Model):
 
             data = json.dumps(order)
             customer_name, customer_email = self.get_customer_name_and_email(order)
-            self.create_order_queue_line(order, instance, data, customer_name, customer_email, order_queue)
-            if created_by == "webhook" and len(order_queue.order_data_queue_line_ids) >= 50:
-                order_queue.order_data_queue_line_ids.process_import_order_queue_data(update_order=True)
+            order_queue_line_vals.append(self.prepare_order_queue_line_vals(order, instance, data, customer_name,
+                                                                            customer_email, order_queue))
 
             count += 1
             if count == 50:
                 count = 0
                 need_to_create_queue = True
+        self.create(order_queue_line_vals)
         if not order_queue.order_data_queue_line_ids:
             order_queue.unlink()
             order_queue_list.remove(order_queue.id)
@@ -104,7 +163,8 @@ class ShopifyOrderDataQueueLineEpt(models.Model):
         order_queue = shopify_order_queue_obj.search(
             [("created_by", "=", created_by), ("state", "=", "draft"), ("shopify_instance_id", "=", instance.id),
              ("queue_type", "=", queue_type)], limit=1)
-        if order_queue:
+        # Webhook orders are processed by the order queue cron, a new queue is created after 50 order queue lines.
+        if order_queue and len(order_queue.order_data_queue_line_ids) < 50:
             message = "Order %s added into Order Queue %s." % (order.get("name"), order_queue.name)
             need_to_create_queue = False
             _logger.info(message)
@@ -155,35 +215,95 @@ class ShopifyOrderDataQueueLineEpt(models.Model):
 
     def auto_import_order_queue_data(self):
         """
-        This method is used to find order queue which queue lines have state in draft and is_action_require is False.
-        If cronjob has tried more than 3 times to process any queue then it marks that queue has need process
-        to manually. It will be called from auto queue process cron.
+        This method is used to process the draft lines of the order queues which is_action_require is False. The
+        lines are claimed queue by queue with a lease, so the workers of the auto queue process cron can run
+        together without processing the same lines. If cronjob has tried more than 3 times to process any queue
+        then it marks that queue has need process to manually. It will be called from auto queue process crons.
         @author: Haresh Mori @Emipro Technologies Pvt.Ltd on date 07/10/2019.
         Task Id : 157350
         """
-        shopify_order_queue_obj = self.env["shopify.order.data.queue.ept"]
-        order_queue_ids = []
+        start = time.time()
+        order_queue_process_cron_time = self.env["shopify.instance.ept"].get_shopify_cron_execution_time(
+            "shopify_ept.process_shopify_order_queue")
 
-        self.env.cr.execute(
-            """update shopify_order_data_queue_ept set is_process_queue = False where is_process_queue = True""")
+        self.env.cr.execute("""update shopify_order_data_queue_ept as queue set is_process_queue = False
+                               where is_process_queue = True and not exists (
+                                    select 1 from shopify_order_data_queue_line_ept as queue_line
+                                    where queue_line.shopify_order_data_queue_id = queue.id
+                                    and queue_line.state = 'draft'
+                                    and queue_line.lease_expires_at > now() at time zone 'UTC')""")
         self._cr.commit()
 
-        query = """select queue.id
-                from shopify_order_data_queue_line_ept as queue_line
-                inner join shopify_order_data_queue_ept as queue on queue_line.shopify_order_data_queue_id = queue.id
-                where queue_line.state='draft' and queue.is_action_require = 'False'
-                ORDER BY queue_line.create_date ASC"""
-        self._cr.execute(query)
-        order_queue_list = self._cr.fetchall()
-        if not order_queue_list:
-            return True
+        while time.time() - start < order_queue_process_cron_time - 60:
+            # The lease outlasts the cron run, as the last claimed queue may be processed after the time limit.
+            order_data_queue_lines = self.claim_order_queue_lines(order_queue_process_cron_time * 2)
+            if not order_data_queue_lines:
+                return True
+            self.filter_order_queue_lines_and_post_message(order_data_queue_lines.shopify_order_data_queue_id)
 
-        for result in order_queue_list:
-            if result[0] not in order_queue_ids:
-                order_queue_ids.append(result[0])
+        # Lines are left to process, so the cron runs again without waiting for its next call.
+        self.env.ref("shopify_ept.process_shopify_order_queue")._trigger()
+        return True
 
-        queues = shopify_order_queue_obj.browse(order_queue_ids)
-        self.filter_order_queue_lines_and_post_message(queues)
+    def claim_order_queue_lines(self, lease_time):
+        """
+        This method is used to claim the draft lines of the oldest order queue which lines are not claimed by
+        another worker. The queue is locked with SKIP LOCKED, so workers claiming together get different queues.
+        :param lease_time: Seconds until the claim expires, then the lines can be claimed again.
+        @return: Records of claimed order queue lines.
+        """
+        self._cr.commit()
+        query = """with claimed_queue as (
+                        select queue.id from shopify_order_data_queue_ept as queue
+                        where queue.is_action_require = False
+                        and exists (select 1 from shopify_order_data_queue_line_ept as queue_line
+                                    where queue_line.shopify_order_data_queue_id = queue.id
+                                    and queue_line.state = 'draft')
+                        and not exists (select 1 from shopify_order_data_queue_line_ept as queue_line
+                                        where queue_line.shopify_order_data_queue_id = queue.id
+                                        and queue_line.state = 'draft'
+                                        and queue_line.lease_expires_at > now() at time zone 'UTC')
+                        order by queue.id limit 1 for update skip locked)
+                    update shopify_order_data_queue_line_ept as queue_line
+                    set lease_expires_at = now() at time zone 'UTC' + %s * interval '1 second'
+                    from claimed_queue
+                    where queue_line.shopify_order_data_queue_id = claimed_queue.id and queue_line.state = 'draft'
+                    returning queue_line.id"""
+        for _attempt in range(3):
+            try:
+                self._cr.execute(query, (lease_time,))
+                line_ids = [result[0] for result in self._cr.fetchall()]
+                self._cr.commit()
+                return self.browse(line_ids)
+            except OperationalError as error:
+                # Another worker claimed the queue after this transaction started.
+                _logger.info("Order queue lines are not claimed, retrying. Error: %s", error)
+                self._cr.rollback()
+        return self.browse()
+
+    def claim_order_queue_lines_of_queue(self, queue_id, lease_time):
+        """
+        This method is used to claim the draft and failed lines of an order queue to process them manually. Lines
+        claimed by a worker of the order queue cron, or locked by it, are skipped.
+        :param queue_id: Id of the order queue.
+        :param lease_time: Seconds until the claim expires, then the lines can be claimed again.
+        @return: Records of claimed order queue lines.
+        """
+        self._cr.commit()
+        self._cr.execute("""with claimed_line as (
+                                select queue_line.id from shopify_order_data_queue_line_ept as queue_line
+                                where queue_line.shopify_order_data_queue_id = %s
+                                and queue_line.state in ('draft', 'failed')
+                                and (queue_line.lease_expires_at is null
+                                     or queue_line.lease_expires_at <= now() at time zone 'UTC')
+                                for update skip locked)
+                            update shopify_order_data_queue_line_ept as queue_line
+                            set lease_expires_at = now() at time zone 'UTC' + %s * interval '1 second'
+                            from claimed_line where queue_line.id = claimed_line.id
+                            returning queue_line.id""", (queue_id, lease_time))
+        line_ids = [result[0] for result in self._cr.fetchall()]
+        self._cr.commit()
+        return self.browse(line_ids)
 
     def filter_order_queue_lines_and_post_message(self, queues):
         """
@@ -218,6 +338,35 @@ class ShopifyOrderDataQueueLineEpt(models.Model):
             if time.time() - start > order_queue_process_cron_time - 60:
                 return True
 
+    def skip_superseded_order_queue_lines(self):
+        """ This method is used to cancel the draft lines of which order has a newer line, draft or done, by the
+            updated date of the order in Shopify. Shopify sends the update order webhook for every change of an
+            order, so only the latest update is processed.
+            @return: Records of cancelled order queue lines.
+        """
+        if not self:
+            return self
+        self.flush(["state", "shopify_order_id", "shopify_updated_at"])
+        self._cr.execute("""update shopify_order_data_queue_line_ept as queue_line
+                            set state = 'cancel', processed_at = now() at time zone 'UTC'
+                            where queue_line.id in %s and queue_line.state = 'draft' and exists (
+                                select 1 from shopify_order_data_queue_line_ept as newer_line
+                                where newer_line.shopify_instance_id = queue_line.shopify_instance_id
+                                and newer_line.shopify_order_id = queue_line.shopify_order_id
+                                and newer_line.state in ('draft', 'done') and newer_line.id != queue_line.id
+                                and (coalesce(newer_line.shopify_updated_at, '1970-01-01'), newer_line.id) >
+                                    (coalesce(queue_line.shopify_updated_at, '1970-01-01'), queue_line.id))
+                            returning queue_line.id""", (tuple(self.ids),))
+        skipped_lines = self.browse([result[0] for result in self._cr.fetchall()])
+        if skipped_lines:
+            skipped_lines.invalidate_cache(["state", "processed_at"], skipped_lines.ids)
+            # The state of the queues depends on the state of their lines, which is updated behind the ORM.
+            skipped_lines.modified(["state"])
+            skipped_lines.shopify_order_data_queue_id.recompute()
+            _logger.info("Skipped %s order queue lines superseded by a newer update of their order.",
+                         len(skipped_lines))
+        return skipped_lines
+
     def process_import_order_queue_data(self, update_order=False):
         """This method processes order queue lines.
             :param update_order: It is used for webhook. While we receive update order webhook response and it
@@ -247,7 +396,8 @@ class ShopifyOrderDataQueueLineEpt(models.Model):
             # Below two line used for When the update order webhook calls.
             if update_order or queue_id.created_by == "webhook":
                 created_by = 'Webhook'
-                sale_order_obj.update_shopify_order(self, log_book_id, created_by)
+                sale_order_obj.update_shopify_order(self - self.skip_superseded_order_queue_lines(), log_book_id,
+                                                    created_by)
             else:
                 sale_order_obj.import_shopify_orders(self, log_book_id)
             queue_id.write({'is_process_queue': False, 'shopify_order_common_log_book_id': log_book_id})
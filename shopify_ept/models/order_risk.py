@@ -24,14 +24,15 @@ class ShopifyOrderRisk(models.Model):
 
     def shopify_create_risk_in_order(self, risk_result, order):
         """This method used to create a risk, if found risk in Shopify order when import orders from Shopify to Odoo.
-            :param risk_result: Response of risk API call.
+            :param risk_result: Response of risk API call, or list of risk dictionaries.
             :param order: Record of sale order.
             @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 11/11/2019.
             Task Id : 157350
         """
         flag = True
         for risk_id in risk_result:
-            risk = risk_id.to_dict()
+            # Risks requested together with the other orders of the batch are already dictionaries.
+            risk = risk_id if isinstance(risk_id, dict) else risk_id.to_dict()
             if risk.get('recommendation') != 'accept':
                 flag = False
             vals = self.prepare_vals_for_risk_order(risk, order)
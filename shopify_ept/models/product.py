@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 # See LICENSE file for full copyright and licensing details.
 
-from odoo import models
+from odoo import models, api
+
+# Fields of the products used by the variant resolver of the Shopify product import.
+PRODUCT_RESOLVER_FIELDS = {"default_code", "barcode", "active"}
 
 
 class ProductTemplate(models.Model):
@@ -29,6 +32,26 @@ class ProductTemplate(models.Model):
 class ProductProduct(models.Model):
     _inherit = 'product.product'
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        """
+        Inherited create method to forget the SKUs and barcodes of the created products in the variant resolver of
+        the Shopify product import.
+        """
+        products = super(ProductProduct, self).create(vals_list)
+        variant_resolver = self._context.get("shopify_variant_resolver")
+        if variant_resolver:
+            variant_resolver.forget(products.prepare_variant_resolver_keys().values())
+        return products
+
+    def prepare_variant_resolver_keys(self):
+        """
+        This method is used to prepare the keys of the products used by the variant resolver of the Shopify product
+        import.
+        @return: Dictionary of id and tuple of variant id, SKU, SKU of the product, barcode of the product and active.
+        """
+        return {product.id: (False, False, product.default_code, product.barcode, product.active) for product in self}
+
     def write(self, vals):
         """
         This method use to archive/unarchive shopify product base on odoo product.
@@ -43,5 +66,10 @@ class ProductProduct(models.Model):
                     shopify_product = shopify_product_product_obj.search(
                         [('product_id', '=', product.id), ('active', '=', False)])
                 shopify_product.write({'active': vals.get('active')})
+        variant_resolver = self._context.get("shopify_variant_resolver")
+        if not variant_resolver or not PRODUCT_RESOLVER_FIELDS & set(vals):
+            return super(ProductProduct, self).write(vals)
+        keys_before = self.prepare_variant_resolver_keys()
         res = super(ProductProduct, self).write(vals)
+        variant_resolver.forget_changed(keys_before, self.prepare_variant_resolver_keys())
         return res
@@ -1,16 +1,16 @@
 # -*- coding: utf-8 -*-
 # See LICENSE file for full copyright and licensing details.
 
-import time
 import json
 import logging
 import re
 from datetime import datetime, timedelta
 
+from six.moves.urllib.parse import urlparse, parse_qs
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 from .. import shopify
-from ..shopify.pyactiveresource.connection import ClientError
+from .order_data_queue_line_ept import compress_queue_data
 
 _logger = logging.getLogger("Shopify Product Queue")
 
@@ -50,6 +50,12 @@ class ShopifyProductDataQueue(models.Model):
     queue_process_count = fields.Integer(string="Queue Process Times",
                                          help="it is used know queue how many time processed")
     skip_existing_product = fields.Boolean(string="Do Not Update Existing Products")
+    next_page_info = fields.Char(copy=False, help="Cursor of the next page of products, kept on the last queue "
+                                                  "while the import is running. An interrupted import resumes from "
+                                                  "it.")
+    next_page_import_based_on = fields.Char(copy=False, help="Date on which the products of the cursor are filtered.")
+    next_page_from_date = fields.Datetime(copy=False, help="From date of the import of the cursor.")
+    next_page_to_date = fields.Datetime(copy=False, help="To date of the import of the cursor.")
 
     @api.depends("product_data_queue_lines.state")
     def _compute_queue_line_record(self):
@@ -104,10 +110,14 @@ class ShopifyProductDataQueue(models.Model):
         @author: Maulik Barad on Date 28-Aug-2020.
         """
         product_queue_list = []
+        product_queue_line_vals = []
         order_data_queue_line = self.env['shopify.order.data.queue.line.ept']
+        product_data_queue_line_obj = self.env["shopify.product.data.queue.line.ept"]
         count = 125
         for result in results:
             if count == 125:
+                product_data_queue_line_obj.create(product_queue_line_vals)
+                product_queue_line_vals = []
                 product_queue = self.shopify_create_product_queue(instance, skip_existing_product=skip_existing_product)
                 product_queue_list.append(product_queue.id)
                 message = "Product Queue Created", product_queue.name
@@ -117,8 +127,9 @@ class ShopifyProductDataQueue(models.Model):
                 count = 0
                 if template_ids:
                     product_queue.message_post(body=_('%s products are not imported') % ','.join(template_ids))
-            self.shopify_create_product_data_queue_line(result, instance, product_queue)
+            product_queue_line_vals.append(self.prepare_product_data_queue_line_vals(result, instance, product_queue))
             count = count + 1
+        product_data_queue_line_obj.create(product_queue_line_vals)
         self._cr.commit()
         return product_queue_list
 
@@ -145,17 +156,9 @@ class ShopifyProductDataQueue(models.Model):
             if product_queue_list:
                 results = True
         else:
-            if import_based_on == "create_date":
-                results = shopify.Product().find(status='active', created_at_min=from_date, created_at_max=to_date,
-                                                 limit=250)
-            else:
-                results = shopify.Product().find(status='active', updated_at_min=from_date, updated_at_max=to_date,
-                                                 limit=250)
-
-            product_queue_list += self.create_product_queues(instance, results, skip_existing_product)
-
-            if len(results) >= 250:
-                product_queue_list += self.shopify_list_all_products(instance, results, skip_existing_product)
+            product_queue_list += self.shopify_import_product_pages(instance, import_based_on, from_date, to_date,
+                                                                    skip_existing_product)
+            results = bool(product_queue_list)
             if results:
                 instance.shopify_last_date_product_import = datetime.now()
         if not results:
@@ -192,34 +195,71 @@ class ShopifyProductDataQueue(models.Model):
             raise UserError(_("Please enter the product template ids 100 or less"))
         return product_queue_list
 
-    def shopify_list_all_products(self, instance, result, skip_existing_product):
-        """This method used to call the page wise data of product to import from Shopify to Odoo.
-            @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 14/10/2019.
-            Modify on date 27/12/2019 Taken pagination changes.
+    def shopify_import_product_pages(self, instance, import_based_on, from_date, to_date, skip_existing_product):
+        """ This method is used to import the products page by page. An import interrupted before its last page,
+            filtered on the same date, is first resumed from its cursor, then only the products of the dates after
+            it are requested.
+            :param import_based_on: create_date or update_date.
+            @return: List of product queue ids.
         """
         product_queue_list = []
-        catch = ""
-        while result:
-            page_info = ""
-            link = shopify.ShopifyResource.connection.response.headers.get("Link")
-            if not link or not isinstance(link, str):
-                return product_queue_list
-            for page_link in link.split(","):
-                if page_link.find("next") > 0:
-                    page_info = page_link.split(";")[0].strip("<>").split("page_info=")[1]
-                    try:
-                        result = shopify.Product().find(page_info=page_info, limit=250)
-                    except ClientError as error:
-                        if hasattr(error,
-                                   "response") and error.response.code == 429 and error.response.msg == "Too Many Requests":
-                            time.sleep(int(float(error.response.headers.get('Retry-After', 5))))
-                            result = shopify.Product().find(page_info=page_info, limit=250)
-                    except Exception as error:
-                        raise UserError(error)
-                    if result:
-                        product_queue_list += self.create_product_queues(instance, result, skip_existing_product)
-            if catch == page_info:
+        import_based_on = import_based_on or "update_date"
+        interrupted_queues = self.search([("shopify_instance_id", "=", instance.id),
+                                          ("next_page_import_based_on", "=", import_based_on),
+                                          ("next_page_info", "!=", False)], order="id desc")
+        interrupted_queue = interrupted_queues[:1]
+        if interrupted_queue and from_date and interrupted_queue.next_page_from_date and \
+                interrupted_queue.next_page_from_date <= from_date:
+            page_info = interrupted_queue.next_page_info
+            resume_from_date, resume_to_date = interrupted_queue.next_page_from_date, interrupted_queue.next_page_to_date
+            interrupted_queues.write({"next_page_info": False})
+            _logger.info("Resuming the interrupted import of products from queue %s.", interrupted_queue.name)
+            try:
+                results = shopify.Product().find(page_info=page_info, limit=250)
+            except Exception as error:
+                raise UserError(error)
+            product_queue_list += self.create_product_queues_from_pages(results, instance, import_based_on,
+                                                                        resume_from_date, resume_to_date,
+                                                                        skip_existing_product)
+            from_date = max(from_date, resume_to_date)
+        else:
+            interrupted_queues.write({"next_page_info": False})
+
+        if not from_date or not to_date or from_date < to_date:
+            date_field = "created_at" if import_based_on == "create_date" else "updated_at"
+            params = {"status": "active", "%s_min" % date_field: from_date, "%s_max" % date_field: to_date,
+                      "limit": 250}
+            try:
+                results = shopify.Product().find(**params)
+            except Exception as error:
+                raise UserError(error)
+            product_queue_list += self.create_product_queues_from_pages(results, instance, import_based_on,
+                                                                        from_date, to_date, skip_existing_product)
+        return product_queue_list
+
+    def create_product_queues_from_pages(self, results, instance, import_based_on, from_date, to_date,
+                                         skip_existing_product):
+        """ This method is used to add the products into queues page by page, keeping only one page in memory.
+            After each page, the cursor of the next page is committed on the last queue created.
+            :param results: First page of products.
+            @return: List of product queue ids.
+        """
+        product_queue_list = []
+        cursor_queue = self.browse()
+        for page in shopify.PrefetchPaginatedIterator(results):
+            if not page:
                 break
+            page_info = False
+            if page.has_next_page():
+                page_info = parse_qs(urlparse(page.next_page_url).query).get("page_info", [False])[0]
+            product_queues = self.create_product_queues(instance, page, skip_existing_product)
+            product_queue_list += product_queues
+            if product_queues:
+                cursor_queue.write({"next_page_info": False})
+                cursor_queue = self.browse(product_queues[-1])
+                cursor_queue.write({"next_page_info": page_info, "next_page_import_based_on": import_based_on,
+                                    "next_page_from_date": from_date, "next_page_to_date": to_date})
+            self._cr.commit()
         return product_queue_list
 
     def shopify_create_product_queue(self, instance, created_by="import", skip_existing_product=False):
@@ -245,7 +285,18 @@ class ShopifyProductDataQueue(models.Model):
         @author: Maulik Barad on Date 01-Sep-2020.
         """
         product_data_queue_line_obj = self.env["shopify.product.data.queue.line.ept"]
+        product_queue_line_vals = self.prepare_product_data_queue_line_vals(result, instance, product_data_queue)
+        product_data_queue_line_obj.create(product_queue_line_vals)
+        return True
 
+    def prepare_product_data_queue_line_vals(self, result, instance, product_data_queue):
+        """
+        This method is used to prepare the vals of a product data queue line.
+        @param result: Response of a product from shopify.
+        @param instance: Shopify Instance.
+        @param product_data_queue: Product data queue to attach the queue line with.
+        @return: Dictionary of vals.
+        """
         # No need to convert the response into dictionary, when response is coming from webhook.
         if not isinstance(result, dict):
             result = result.to_dict()
@@ -253,15 +304,13 @@ class ShopifyProductDataQueue(models.Model):
         image_import_state = 'done'
         if instance.sync_product_with_images:
             image_import_state = 'pending'
-        product_queue_line_vals = {"product_data_id": result.get("id"),
-                                   "shopify_instance_id": instance and instance.id or False,
-                                   "name": result.get("title"),
-                                   "synced_product_data": data,
-                                   "product_data_queue_id": product_data_queue and product_data_queue.id or False,
-                                   "shopify_image_import_state": image_import_state,
-                                   }
-        product_data_queue_line_obj.create(product_queue_line_vals)
-        return True
+        return {"product_data_id": result.get("id"),
+                "shopify_instance_id": instance and instance.id or False,
+                "name": result.get("title"),
+                "synced_product_data_compressed": compress_queue_data(data),
+                "product_data_queue_id": product_data_queue and product_data_queue.id or False,
+                "shopify_image_import_state": image_import_state,
+                }
 
     def create_schedule_activity_for_product(self, queue_line, from_sale=False):
         """
@@ -321,7 +370,8 @@ class ShopifyProductDataQueue(models.Model):
 
     def create_shopify_product_queue_from_webhook(self, product_data, instance):
         """
-        This method used to create a product queue while receive a response from webhook.
+        This method used to create a product queue while receive a response from webhook. The queue line is processed
+        by the product queue cron which is triggered right away.
         @author: Dipak Gogiya on Date 10-Jan-2020.
         """
         product_data_queue = self.search([("created_by", "=", "webhook"), ("state", "=", "draft"),
@@ -334,10 +384,7 @@ class ShopifyProductDataQueue(models.Model):
         _logger.info(message)
 
         self.shopify_create_product_data_queue_line(product_data, instance, product_data_queue)
-
-        if len(self.product_data_queue_lines) == 50:
-            product_data_queue.product_data_queue_lines.process_product_queue_line_data()
-            _logger.info("Processed product %s of %s via Webhook Successfully.", product_data.get("id"), instance.name)
+        self.env.ref("shopify_ept.process_shopify_product_queue")._trigger()
         return True
 
     @api.model
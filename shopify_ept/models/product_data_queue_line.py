@@ -5,11 +5,15 @@ import json
 import logging
 import time
 
-from odoo import models, fields
+from odoo import models, fields, api
 from .. import shopify
+from .order_data_queue_line_ept import compress_queue_data, decompress_queue_data
 
 _logger = logging.getLogger("Shopify Product Queue Line")
 
+# Templates of which the images are downloaded together by the image import cron.
+IMAGE_IMPORT_BATCH_SIZE = 10
+
 
 class ShopifyProductDataQueueLineEpt(models.Model):
     _name = "shopify.product.data.queue.line.ept"
@@ -17,7 +21,9 @@ class ShopifyProductDataQueueLineEpt(models.Model):
 
     shopify_instance_id = fields.Many2one("shopify.instance.ept", string="Instance")
     last_process_date = fields.Datetime()
-    synced_product_data = fields.Text()
+    synced_product_data = fields.Text(compute="_compute_synced_product_data", inverse="_inverse_synced_product_data")
+    synced_product_data_compressed = fields.Binary(attachment=False, copy=False,
+                                                   help="Data imported from Shopify of the product, compressed.")
     product_data_id = fields.Char()
     state = fields.Selection([("draft", "Draft"), ("failed", "Failed"), ("done", "Done"),
                               ("cancel", "Cancelled")],
@@ -31,6 +37,17 @@ class ShopifyProductDataQueueLineEpt(models.Model):
     shopify_image_import_state = fields.Selection([('pending', 'Pending'), ('done', 'Done')], default='done',
                                                   help="It used to identify that product image imported explicitly")
 
+    @api.depends("synced_product_data_compressed")
+    def _compute_synced_product_data(self):
+        """ Decompresses the product data only when it is read. """
+        for line in self:
+            line.synced_product_data = decompress_queue_data(
+                line.with_context(bin_size=False).synced_product_data_compressed)
+
+    def _inverse_synced_product_data(self):
+        for line in self:
+            line.synced_product_data_compressed = compress_queue_data(line.synced_product_data)
+
     def auto_import_product_queue_line_data(self):
         """
         This method is used to find product queue which queue lines have state in draft and is_action_require is False.
@@ -116,6 +133,13 @@ class ShopifyProductDataQueueLineEpt(models.Model):
                 self.env.cr.execute(
                     """update shopify_product_data_queue_ept set is_process_queue = False where is_process_queue = True""")
                 self._cr.commit()
+                templates_data = [json.loads(product_queue_line.synced_product_data) for product_queue_line in self
+                                  if product_queue_line.synced_product_data]
+                variant_resolver = shopify_product_template_obj.prepare_shopify_variant_resolver(shopify_instance,
+                                                                                                 templates_data)
+                attribute_resolver = shopify_product_template_obj.prepare_shopify_attribute_resolver(templates_data)
+                shopify_product_template_obj = shopify_product_template_obj.with_context(
+                    shopify_variant_resolver=variant_resolver, shopify_attribute_resolver=attribute_resolver)
                 for product_queue_line in self:
                     shopify_product_template_obj.shopify_sync_products(product_queue_line,
                                                                        False,
@@ -153,25 +177,34 @@ class ShopifyProductDataQueueLineEpt(models.Model):
             Task_id: 167684 - Changes for image import explicitly
         """
         shopify_template_obj = self.env['shopify.product.template.ept']
+        shopify_image_index_obj = self.env['shopify.image.index.ept']
         instance_obj = self.env['shopify.instance.ept']
         start_time = time.time()
         image_import_cron_time = instance_obj.get_shopify_cron_execution_time(
             "shopify_ept.shopify_ir_cron_import_image_explicitly")
         product_queue_lines = self.query_find_queue_line_for_import_image()
-        for queue in product_queue_lines:
-            product_queue = self.browse(queue)
-            template_data = product_queue.synced_product_data
-            template_data = json.loads(template_data)
-            shopify_template = shopify_template_obj.search([('shopify_tmpl_id', '=', product_queue.product_data_id),
-                                                            ('shopify_instance_id', '=',
-                                                             product_queue.shopify_instance_id.id)], limit=1)
-            if not shopify_template:
-                continue
-            shopify_template.shopify_sync_product_images(template_data)
-            product_queue.write({'shopify_image_import_state': 'done'})
-            self._cr.commit()
-            if time.time() - start_time > image_import_cron_time - 60:
-                return True
+        for index in range(0, len(product_queue_lines), IMAGE_IMPORT_BATCH_SIZE):
+            templates_data = []
+            for queue in product_queue_lines[index:index + IMAGE_IMPORT_BATCH_SIZE]:
+                product_queue = self.browse(queue)
+                template_data = product_queue.synced_product_data
+                template_data = json.loads(template_data)
+                shopify_template = shopify_template_obj.search(
+                    [('shopify_tmpl_id', '=', product_queue.product_data_id),
+                     ('shopify_instance_id', '=', product_queue.shopify_instance_id.id)], limit=1)
+                if shopify_template:
+                    templates_data.append((product_queue, shopify_template, template_data))
+
+            # Images of the batch are downloaded concurrently, then synced one template at a time.
+            downloaded_images = shopify_image_index_obj.get_shopify_images(
+                [image for _product_queue, shopify_template, template_data in templates_data
+                 for image in shopify_template.prepare_shopify_images_to_sync(template_data)])
+            for product_queue, shopify_template, template_data in templates_data:
+                shopify_template.shopify_sync_product_images(template_data, downloaded_images)
+                product_queue.write({'shopify_image_import_state': 'done'})
+                self._cr.commit()
+                if time.time() - start_time > image_import_cron_time - 60:
+                    return True
 
         return True
 
@@ -6,11 +6,13 @@ import logging
 from datetime import datetime, timedelta
 import time
 import pytz
+from psycopg2 import IntegrityError, errorcodes
 
 from dateutil import parser
 
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
+from odoo.osv import expression
 from ..shopify.pyactiveresource.util import xml_to_dict
 from .. import shopify
 from ..shopify.pyactiveresource.connection import ClientError
@@ -19,6 +21,61 @@ utc = pytz.utc
 
 _logger = logging.getLogger("Shopify Order")
 
+# Risks and transactions of the orders of a batch of queue lines are requested together, 50 orders per request.
+ORDER_PREFETCH_BATCH_SIZE = 50
+AUTO_WORKFLOW_BATCH_SIZE = 50
+# Orders which auto workflow fails this many times are left for manual action.
+AUTO_WORKFLOW_MAX_ATTEMPTS = 3
+ORDER_RISKS_AND_TRANSACTIONS_QUERY = """
+query orderRisksAndTransactions($ids: [ID!]!) {
+  nodes(ids: $ids) {
+    ... on Order {
+      legacyResourceId
+      risk {
+        assessments {
+          riskLevel
+          provider {
+            title
+          }
+          facts {
+            description
+          }
+        }
+      }
+      transactions(first: 50) {
+        id
+        kind
+        status
+        gateway
+        amountSet {
+          presentmentMoney {
+            amount
+          }
+        }
+      }
+    }
+  }
+}
+"""
+# Recommendation and score of the REST risks matching the risk level of the GraphQL assessments.
+RISK_LEVEL_RECOMMENDATIONS = {"HIGH": ("cancel", 1.0), "MEDIUM": ("investigate", 0.5)}
+
+
+class ShopifyOrderLookup:
+    """ Ids of the products, taxes, sources and pricelists needed by a batch of Shopify orders of one instance. It is
+        prepared with one query per kind of record before importing the orders and passed in the context, so the
+        order lines are matched from memory. Records missing in it are searched in the database and added to it.
+    """
+
+    def __init__(self, instance_id):
+        self.instance_id = instance_id
+        self.product_ids = {"variant_id": {}, "default_code": {}}
+        self.tax_ids = {}
+        self.source_ids = {}
+        self.pricelist_ids = {}
+        self.checked_order_ids = set()
+        self.sale_order_ids = {"shopify_order_id": {}, "client_order_ref": {}}
+
 
 class SaleOrder(models.Model):
     _inherit = "sale.order"
@@ -80,6 +137,12 @@ class SaleOrder(models.Model):
     shopify_location_id = fields.Many2one("shopify.location.ept", "Shopify Location", copy=False)
     checkout_id = fields.Char(copy=False)
     is_risky_order = fields.Boolean("Risky Order?", default=False, copy=False)
+    shopify_auto_workflow_pending = fields.Boolean("Auto Workflow Pending", copy=False, index=True,
+                                                   help="Auto workflow of the order is processed by the auto workflow "
+                                                        "cron.")
+    shopify_auto_workflow_attempts = fields.Integer("Auto Workflow Attempts", copy=False,
+                                                    help="Number of times the auto workflow cron failed to process "
+                                                         "the auto workflow of the order.")
     updated_in_shopify = fields.Boolean("Updated In Shopify ?", compute=_get_shopify_order_status,
                                         search='_search_shopify_order_ids')
     closed_at_ept = fields.Datetime("Closed At", copy=False)
@@ -92,7 +155,7 @@ class SaleOrder(models.Model):
                                           string="Payment Lines")
 
     _sql_constraints = [('unique_shopify_order',
-                         'unique(shopify_instance_id,shopify_order_id,shopify_order_number)',
+                         'unique(shopify_instance_id,shopify_order_id)',
                          "Shopify order must be Unique.")]
 
     def create_shopify_log_line(self, message, queue_line, log_book, order_name):
@@ -302,17 +365,18 @@ class SaleOrder(models.Model):
         instance = log_book.shopify_instance_id
 
         instance.connect_in_shopify()
+        order_prefetch = self.prefetch_shopify_order_risks_and_transactions(order_data_lines)
+        order_responses = [json.loads(order_data_line.order_data) for order_data_line in order_data_lines]
+        order_lookup = self.prepare_shopify_order_lookup(instance, order_responses)
+        self = self.with_context(shopify_order_lookup=order_lookup)
 
-        for order_data_line in order_data_lines:
+        for order_data_line, order_response in zip(order_data_lines, order_responses):
             if commit_count == 5:
                 self._cr.commit()
                 commit_count = 0
             commit_count += 1
-            order_data = order_data_line.order_data
-            order_response = json.loads(order_data)
 
             order_number = order_response.get("order_number")
-            shopify_financial_status = order_response.get("financial_status")
             _logger.info("Started processing Shopify order(%s) and order id is(%s)", order_number,
                          order_response.get("id"))
 
@@ -347,8 +411,26 @@ class SaleOrder(models.Model):
                 order_data_line.write({"state": "failed", "processed_at": datetime.now()})
                 continue
 
-            sale_order = self.shopify_create_order(instance, partner, delivery_address, invoice_address,
-                                                   order_data_line, order_response, log_book, lines, order_number)
+            prefetched_data = order_prefetch.get(str(order_response.get("id")), {})
+            try:
+                with self._cr.savepoint():
+                    sale_order = self.shopify_create_order(instance, partner, delivery_address, invoice_address,
+                                                           order_data_line, order_response, log_book, lines,
+                                                           order_number, prefetched_data.get("transactions"))
+            except IntegrityError as error:
+                if error.pgcode != errorcodes.UNIQUE_VIOLATION or \
+                        error.diag.constraint_name != "sale_order_unique_shopify_order":
+                    message = "Shopify Order(%s) could not be created, Error is: %s" % (order_number, error)
+                    _logger.info(message)
+                    self.create_shopify_log_line(message, order_data_line, log_book, order_response.get("name"))
+                    order_data_line.write({"state": "failed", "processed_at": datetime.now()})
+                    continue
+                # The order is imported by another worker meanwhile, the unique constraint prevents a duplicate. That
+                # order is not visible in the snapshot of this transaction, so the queue line is left in draft and
+                # the next run finds the order and marks the line as done.
+                _logger.info("Shopify Order(%s) is imported by another process meanwhile, it will be linked to its "
+                             "queue line in the next run.", order_number)
+                continue
             if not sale_order:
                 message = "Configuration missing in Odoo while importing Shopify Order(%s) and id (%s)" % (
                     order_number, order_response.get("id"))
@@ -356,45 +438,33 @@ class SaleOrder(models.Model):
                 self.create_shopify_log_line(message, order_data_line, log_book, order_response.get("name"))
                 continue
             order_ids.append(sale_order.id)
+            order_key = (str(order_response.get("id")), str(order_number))
+            order_lookup.sale_order_ids["shopify_order_id"][order_key] = sale_order.id
 
             location_vals = self.set_shopify_location_and_warehouse(order_response, instance, pos_order)
             sale_order.write(location_vals)
 
-            risk_result = shopify.OrderRisk().find(order_id=order_response.get("id"))
+            if "risks" in prefetched_data:
+                risk_result = prefetched_data["risks"]
+            else:
+                risk_result = shopify.OrderRisk().find(order_id=order_response.get("id"))
             if risk_result:
                 order_risk_obj.shopify_create_risk_in_order(risk_result, sale_order)
                 risk = sale_order.risk_ids.filtered(lambda x: x.recommendation != "accept")
                 if risk:
                     sale_order.is_risky_order = True
 
+            if instance.defer_auto_workflow:
+                sale_order.shopify_auto_workflow_pending = True
+                order_data_line.write({"state": "done", "processed_at": datetime.now(),
+                                       "sale_order_id": sale_order.id})
+                _logger.info("Auto workflow of Odoo order(%s) is left to the auto workflow cron.", sale_order.name)
+                continue
+
             _logger.info("Starting auto workflow process for Odoo order(%s) and Shopify order is (%s)",
                          sale_order.name, order_number)
-            message = ""
             try:
-                if sale_order.shopify_order_status == "fulfilled":
-                    sale_order.auto_workflow_process_id.with_context(
-                        log_book_id=log_book.id).shipped_order_workflow_ept(sale_order)
-                    if order_data_line and order_data_line.shopify_order_data_queue_id.created_by == "scheduled_action":
-                        created_by = 'Scheduled Action'
-                    else:
-                        created_by = self.env.user.name
-                    # Below code add for create partially/fully refund
-                    message = self.create_shipped_order_refund(shopify_financial_status, order_response, sale_order,
-                                                               created_by)
-                elif not sale_order.is_risky_order:
-                    if sale_order.shopify_order_status == "partial":
-                        sale_order.process_order_fullfield_qty(order_response)
-                        sale_order.with_context(log_book_id=log_book.id).process_orders_and_invoices_ept()
-                        if order_data_line and order_data_line.shopify_order_data_queue_id.created_by == \
-                                "scheduled_action":
-                            created_by = 'Scheduled Action'
-                        else:
-                            created_by = self.env.user.name
-                        # Below code add for create partially/fully refund
-                        message = self.create_shipped_order_refund(shopify_financial_status, order_response, sale_order,
-                                                                   created_by)
-                    else:
-                        sale_order.with_context(log_book_id=log_book.id).process_orders_and_invoices_ept()
+                message = sale_order.process_shopify_auto_workflow(order_response, order_data_line, log_book)
             except Exception as error:
                 if order_data_line:
                     order_data_line.write({"state": "failed", "processed_at": datetime.now(),
@@ -416,8 +486,316 @@ class SaleOrder(models.Model):
                                        "sale_order_id": sale_order.id})
             _logger.info("Processed the Odoo Order %s process and Shopify Order (%s)", sale_order.name, order_number)
 
+        if instance.defer_auto_workflow and order_ids:
+            self.env.ref("shopify_ept.ir_cron_process_shopify_auto_workflow")._trigger()
         return order_ids
 
+    def process_shopify_auto_workflow(self, order_response, order_data_line, log_book):
+        """ This method is used to process the auto workflow of the imported order as per its fulfillment status, and
+            to create the refund of a shipped order.
+            :param order_response: Response of the order.
+            :param order_data_line: Record of order data queue line.
+            :param log_book: Record of log book.
+            @return: Message of the refund, if it is not created.
+        """
+        message = ""
+        if order_data_line and order_data_line.shopify_order_data_queue_id.created_by == "scheduled_action":
+            created_by = 'Scheduled Action'
+        else:
+            created_by = self.env.user.name
+        shopify_financial_status = order_response.get("financial_status")
+        if self.shopify_order_status == "fulfilled":
+            self.auto_workflow_process_id.with_context(log_book_id=log_book.id).shipped_order_workflow_ept(self)
+            # Below code add for create partially/fully refund
+            message = self.create_shipped_order_refund(shopify_financial_status, order_response, self, created_by)
+        elif not self.is_risky_order:
+            if self.shopify_order_status == "partial":
+                self.process_order_fullfield_qty(order_response)
+                self.with_context(log_book_id=log_book.id).process_orders_and_invoices_ept()
+                # Below code add for create partially/fully refund
+                message = self.create_shipped_order_refund(shopify_financial_status, order_response, self,
+                                                           created_by)
+            else:
+                self.with_context(log_book_id=log_book.id).process_orders_and_invoices_ept()
+        return message
+
+    @api.model
+    def auto_process_shopify_auto_workflow(self):
+        """ This method is used to process the auto workflow of the orders imported without it, in batches. It will
+            be called from the auto workflow cron.
+        """
+        common_log_obj = self.env["common.log.book.ept"]
+        start = time.time()
+        workflow_cron_time = self.env["shopify.instance.ept"].get_shopify_cron_execution_time(
+            "shopify_ept.ir_cron_process_shopify_auto_workflow")
+        log_books = {}
+        failed_orders = self.browse()
+        while True:
+            # Orders failing stay pending and are retried in the next runs of the cron, up to the maximum attempts.
+            orders = self.search([("shopify_auto_workflow_pending", "=", True), ("id", "not in", failed_orders.ids)],
+                                 order="id", limit=AUTO_WORKFLOW_BATCH_SIZE)
+            if not orders:
+                break
+            failed_orders |= orders.process_shopify_pending_auto_workflow(log_books)
+            self._cr.commit()
+            if time.time() - start > workflow_cron_time - 60:
+                break
+
+        log_book_ids = [log_book.id for log_book in log_books.values()]
+        common_log_obj.browse(log_book_ids).filtered(lambda log_book: not log_book.log_lines).unlink()
+        return True
+
+    def process_shopify_pending_auto_workflow(self, log_books):
+        """ This method is used to process the auto workflow of the orders in one transaction. The order data is
+            taken from the queue line of the order. An order failing is rolled back alone, its queue line is failed
+            and it stays pending until it has failed AUTO_WORKFLOW_MAX_ATTEMPTS times, then it is left for manual
+            action.
+            :param log_books: Dictionary of instance id and log book, the log books are created when not found.
+            @return: Orders which auto workflow failed and are still pending.
+        """
+        common_log_obj = self.env["common.log.book.ept"]
+        queue_lines = self.env["shopify.order.data.queue.line.ept"].search([("sale_order_id", "in", self.ids)],
+                                                                            order="id desc")
+        queue_line_by_order = {}
+        for queue_line in queue_lines:
+            queue_line_by_order.setdefault(queue_line.sale_order_id.id, queue_line)
+
+        failed_orders = self.browse()
+        orders = self - self.process_shopify_auto_workflow_in_batch()
+        for order in orders:
+            instance = order.shopify_instance_id
+            if instance.id not in log_books:
+                model_id = common_log_obj.log_lines.get_model_id(self._name)
+                log_books[instance.id] = common_log_obj.shopify_create_common_log_book("import", instance, model_id)
+            log_book = log_books[instance.id]
+            queue_line = queue_line_by_order.get(order.id, queue_lines.browse())
+            order_response = json.loads(queue_line.order_data) if queue_line.order_data else {}
+            try:
+                with self._cr.savepoint():
+                    message = order.process_shopify_auto_workflow(order_response, queue_line, log_book)
+            except Exception as error:
+                message = "Receive error while process auto invoice workflow, Error is:  (%s)" % (error)
+                _logger.info(message)
+                queue_line.write({"state": "failed", "processed_at": datetime.now()})
+                order.shopify_auto_workflow_attempts += 1
+                if order.shopify_auto_workflow_attempts < AUTO_WORKFLOW_MAX_ATTEMPTS:
+                    failed_orders |= order
+                else:
+                    message += "\nThe auto workflow failed %s times, it will not be retried. Please process the " \
+                               "order manually." % order.shopify_auto_workflow_attempts
+            else:
+                queue_line.filtered(lambda line: line.state == "failed").write({"state": "done",
+                                                                               "processed_at": datetime.now()})
+            if message:
+                self.create_shopify_log_line(message, queue_line, log_book, order.client_order_ref)
+        (self - failed_orders).write({"shopify_auto_workflow_pending": False})
+        return failed_orders
+
+    def process_shopify_auto_workflow_in_batch(self):
+        """ This method is used to process the auto workflow of the orders of the instances with batch invoices, by
+            groups of orders having the same auto workflow and payment gateway. A group failing is rolled back and
+            its orders are processed one by one.
+            @return: Orders processed in batch.
+        """
+        batch_orders = self.filtered(lambda order: order.shopify_instance_id.batch_auto_workflow_invoices and
+                                     order.is_shopify_batch_workflow_order())
+        order_groups = {}
+        for order in batch_orders:
+            group_key = (order.auto_workflow_process_id, order.shopify_payment_gateway_id)
+            order_groups[group_key] = order_groups.get(group_key, self.browse()) | order
+
+        processed_orders = self.browse()
+        for (workflow, payment_gateway), orders in order_groups.items():
+            try:
+                with self._cr.savepoint():
+                    orders.process_shopify_invoices_in_batch(workflow)
+            except Exception as error:
+                _logger.info("Auto workflow of orders %s of payment gateway %s could not be processed together, "
+                             "they are processed one by one. Error is: %s", orders.ids, payment_gateway.name, error)
+                continue
+            processed_orders |= orders
+        return processed_orders
+
+    def is_shopify_batch_workflow_order(self):
+        """ This method is used to check if the auto workflow of the order only confirms it and creates, posts and
+            pays the invoice of all its lines, which can be done for many orders together.
+            @return: True if the order can be processed in batch.
+        """
+        self.ensure_one()
+        workflow = self.auto_workflow_process_id
+        if not workflow.validate_order or not workflow.create_invoice or self.state not in ("draft", "sent"):
+            return False
+        if self.is_risky_order or self.shopify_order_status in ("fulfilled", "partial"):
+            return False
+        if any(line.product_id.invoice_policy != "order" for line in self.order_line if line.product_id):
+            return False
+        # Orders before the lock date are left to the auto workflow, which logs them.
+        return self.date_order.date() > self.company_id._get_user_fiscal_lock_date()
+
+    def process_shopify_invoices_in_batch(self, workflow):
+        """ This method is used to confirm the orders and to create, post and pay their invoices with one call for
+            all the orders.
+            :param workflow: Record of auto workflow of the orders.
+        """
+        account_payment_obj = self.env["account.payment"]
+        date_orders = {order.id: order.date_order for order in self}
+        self.action_confirm()
+        for order in self:
+            order.date_order = date_orders[order.id]
+
+        invoices = self._create_invoices(grouped=True)
+        invoices.action_post()
+        if not workflow.register_payment:
+            return True
+
+        payment_vals_list, reconcile_pairs = [], []
+        for invoice in invoices.filtered(lambda move: move.amount_residual):
+            order = invoice.invoice_line_ids.sale_line_ids.order_id[:1]
+            if order.is_shopify_multi_payment:
+                order.paid_invoice_ept(invoice)
+                continue
+            payment_vals_list.append(invoice.prepare_payment_dict(workflow))
+            reconcile_pairs.append((order, invoice))
+        payments = account_payment_obj.create(payment_vals_list)
+        payments.action_post()
+        for payment, (order, invoice) in zip(payments, reconcile_pairs):
+            order.reconcile_payment_ept(payment, invoice)
+        return True
+
+    def prepare_shopify_order_lookup(self, instance, order_responses):
+        """ This method is used to search the products, taxes and sources used by the orders with one query each,
+            instead of searching them for every order line.
+            :param instance: Record of instance.
+            :param order_responses: List of order responses.
+            @return: ShopifyOrderLookup of the instance.
+        """
+        shopify_product_obj = self.env["shopify.product.product.ept"]
+        order_lookup = ShopifyOrderLookup(instance.id)
+        company = instance.shopify_warehouse_id.company_id
+        variant_ids, skus, tax_names, sources = set(), set(), set(), set()
+
+        self.prepare_existing_shopify_orders(order_lookup, order_responses)
+        for order_response in order_responses:
+            taxes_included = order_response.get("taxes_included") or False
+            if order_response.get("source_name"):
+                sources.add(order_response.get("source_name"))
+            for line in (order_response.get("line_items") or []) + (order_response.get("shipping_lines") or []):
+                if line.get("variant_id"):
+                    variant_ids.add(str(line.get("variant_id")))
+                if line.get("sku"):
+                    skus.add(line.get("sku"))
+                for tax in line.get("tax_lines") or []:
+                    rate = float(tax.get("rate", 0.0)) * 100
+                    tax_names.add(self.prepare_shopify_tax_name(tax.get("title"), rate, taxes_included, company))
+
+        if variant_ids or skus:
+            for product in shopify_product_obj.search_read(
+                    [("shopify_instance_id", "=", instance.id), ("exported_in_shopify", "=", True), "|",
+                     ("variant_id", "in", list(variant_ids)), ("default_code", "in", list(skus))],
+                    ["variant_id", "default_code"]):
+                for field_name in ("variant_id", "default_code"):
+                    if product[field_name]:
+                        order_lookup.product_ids[field_name].setdefault(product[field_name], []).append(product["id"])
+
+        if tax_names:
+            for tax in self.env["account.tax"].search_read(
+                    [("type_tax_use", "=", "sale"), ("name", "in", list(tax_names)), ("company_id", "=", company.id)],
+                    ["name", "amount", "price_include"]):
+                order_lookup.tax_ids.setdefault((tax["name"], round(tax["amount"], 4), tax["price_include"]),
+                                                tax["id"])
+
+        if sources:
+            for source in self.env["utm.source"].search_read(
+                    expression.OR([[("name", "=ilike", source)] for source in sources]), ["name"]):
+                order_lookup.source_ids.setdefault(source["name"].lower(), source["id"])
+
+        return order_lookup
+
+    def prepare_existing_shopify_orders(self, order_lookup, order_responses):
+        """ This method is used to search the orders already imported for the order responses with one query, so
+            the existing orders are found from the lookup.
+            :param order_lookup: ShopifyOrderLookup of the instance.
+            :param order_responses: List of order responses.
+        """
+        shopify_order_ids = {str(order_response.get("id")) for order_response in order_responses
+                             if order_response.get("id")}
+        order_names = {order_response.get("name") for order_response in order_responses if order_response.get("name")}
+        if not shopify_order_ids and not order_names:
+            return order_lookup
+        for order in self.search_read([("shopify_instance_id", "=", order_lookup.instance_id), "|",
+                                       ("shopify_order_id", "in", list(shopify_order_ids)),
+                                       ("client_order_ref", "in", list(order_names))],
+                                      ["shopify_order_id", "shopify_order_number", "client_order_ref"]):
+            if order["shopify_order_id"]:
+                order_lookup.sale_order_ids["shopify_order_id"].setdefault(
+                    (order["shopify_order_id"], order["shopify_order_number"]), order["id"])
+            if order["client_order_ref"]:
+                order_lookup.sale_order_ids["client_order_ref"].setdefault(order["client_order_ref"], order["id"])
+        order_lookup.checked_order_ids.update(shopify_order_ids)
+        return order_lookup
+
+    def get_shopify_order_lookup(self, instance):
+        """ This method is used to get the lookup of the orders being imported for the instance, if any.
+            @return: ShopifyOrderLookup or None.
+        """
+        order_lookup = self._context.get("shopify_order_lookup")
+        if order_lookup and order_lookup.instance_id == instance.id:
+            return order_lookup
+        return None
+
+    def prefetch_shopify_order_risks_and_transactions(self, order_data_lines):
+        """ This method is used to request the risks and transactions of the orders of the queue lines in batches of
+            50 orders, instead of two requests per order.
+            :param order_data_lines: Records of order data queue lines.
+            @return: Dictionary of Shopify order id with a dictionary of its risks and transactions, in the format of
+            the REST API. Orders of a failed request are missing and are requested one by one.
+        """
+        order_prefetch = {}
+        order_ids = [order_id for order_id in order_data_lines.mapped("shopify_order_id") if order_id]
+        for index in range(0, len(order_ids), ORDER_PREFETCH_BATCH_SIZE):
+            variables = {"ids": ["gid://shopify/Order/%s" % order_id for order_id in
+                                 order_ids[index:index + ORDER_PREFETCH_BATCH_SIZE]]}
+            try:
+                result = shopify.GraphQL(shopify.GRAPHQL_API_VERSION).execute_with_retry(
+                    ORDER_RISKS_AND_TRANSACTIONS_QUERY, variables)
+                errors = result.get("errors") or []
+            except Exception as error:
+                _logger.info("Risks and transactions of orders could not be requested together: %s", error)
+                continue
+            if errors:
+                _logger.info("Risks and transactions of orders could not be requested together: %s", errors)
+                continue
+            for order in result.get("data", {}).get("nodes") or []:
+                if order:
+                    order_prefetch[order["legacyResourceId"]] = self.prepare_shopify_order_prefetched_data(order)
+        return order_prefetch
+
+    def prepare_shopify_order_prefetched_data(self, order):
+        """ This method is used to convert the risk assessments and transactions of an order received from GraphQL
+            into the format of the REST API.
+            :param order: Order node of the GraphQL response.
+            @return: Dictionary with risks and transactions.
+        """
+        risks = []
+        for assessment in (order.get("risk") or {}).get("assessments") or []:
+            recommendation, score = RISK_LEVEL_RECOMMENDATIONS.get(assessment.get("riskLevel"), ("accept", 0.0))
+            facts = assessment.get("facts") or []
+            risks.append({"order_id": order["legacyResourceId"],
+                          "cause_cancel": recommendation == "cancel",
+                          "display": True,
+                          "message": "\n".join(fact.get("description") or "" for fact in facts),
+                          "recommendation": recommendation,
+                          "score": score,
+                          "source": (assessment.get("provider") or {}).get("title") or "Shopify"})
+        transactions = []
+        for transaction in order.get("transactions") or []:
+            transactions.append({"id": int(transaction["id"].rsplit("/", 1)[1]),
+                                 "kind": (transaction.get("kind") or "").lower(),
+                                 "status": (transaction.get("status") or "").lower(),
+                                 "gateway": transaction.get("gateway"),
+                                 "amount": transaction["amountSet"]["presentmentMoney"]["amount"]})
+        return {"risks": risks, "transactions": transactions}
+
     def import_shopify_cancel_order(self, instance, from_date, to_date):
         """ This method is used if Shopify orders imported in odoo and after Shopify store in some orders are canceled
             then this method cancel imported orders and created a log note.
@@ -509,6 +887,11 @@ class SaleOrder(models.Model):
             @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 27 October 2020 .
             Task_id: 167537
         """
+        order_lookup = self.get_shopify_order_lookup(instance)
+        if order_lookup and str(order_response.get("id")) in order_lookup.checked_order_ids:
+            sale_order_ids = order_lookup.sale_order_ids
+            sale_order_id = sale_order_ids["shopify_order_id"].get((str(order_response.get("id")), str(order_number)))
+            return self.browse(sale_order_id or sale_order_ids["client_order_ref"].get(order_response.get("name")))
 
         sale_order = self.search([("shopify_order_id", "=", order_response.get("id")),
                                   ("shopify_instance_id", "=", instance.id),
@@ -569,22 +952,38 @@ class SaleOrder(models.Model):
             Task_id: 167537
         """
         shopify_variant = False
-        shopify_product_obj = self.env["shopify.product.product.ept"]
         sku = line.get("sku") or False
         if line.get("variant_id", None):
-            shopify_variant = shopify_product_obj.search(
-                [("variant_id", "=", line.get("variant_id")),
-                 ("shopify_instance_id", "=", instance.id), ('exported_in_shopify', '=', True)])
+            shopify_variant = self.search_shopify_product_by_field(instance, "variant_id", line.get("variant_id"))
         if not shopify_variant and sku:
-            shopify_variant = shopify_product_obj.search(
-                [("default_code", "=", sku),
-                 ("shopify_instance_id", "=", instance.id), ('exported_in_shopify', '=', True)])
+            shopify_variant = self.search_shopify_product_by_field(instance, "default_code", sku)
         return shopify_variant
 
+    def search_shopify_product_by_field(self, instance, field_name, value):
+        """ This method is used to search the exported Shopify products of the instance by the variant id or the SKU,
+            from the lookup of the orders being imported, else from the database.
+            :param field_name: variant_id or default_code.
+            :param value: Value of the field received in the order line.
+            @return: Records of Shopify products.
+        """
+        shopify_product_obj = self.env["shopify.product.product.ept"]
+        order_lookup = self.get_shopify_order_lookup(instance)
+        product_ids = order_lookup.product_ids[field_name] if order_lookup else {}
+        if str(value) in product_ids:
+            return shopify_product_obj.browse(product_ids[str(value)])
+        shopify_products = shopify_product_obj.search([(field_name, "=", value),
+                                                       ("shopify_instance_id", "=", instance.id),
+                                                       ('exported_in_shopify', '=', True)])
+        if shopify_products and order_lookup:
+            product_ids[str(value)] = shopify_products.ids
+        return shopify_products
+
     def shopify_create_order(self, instance, partner, shipping_address, invoice_address,
-                             order_data_queue_line, order_response, log_book_id, lines, order_number):
+                             order_data_queue_line, order_response, log_book_id, lines, order_number,
+                             transactions=None):
         """This method used to create a sale order and it's line.
             @param : self, instance, partner, shipping_address, invoice_address,order_data_queue_line, order_response
+            @param transactions: Transactions of the order already requested, else they are requested if needed.
             @return: order
             @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 12/11/2019.
             Task Id : 157350
@@ -605,7 +1004,8 @@ class SaleOrder(models.Model):
                                                      workflow)
         if len(order_response.get('payment_gateway_names')) > 1:
             payment_vals = self.prepare_vals_shopify_multi_payment(instance, order_data_queue_line, order_response,
-                                                                   log_book_id, payment_gateway, workflow)
+                                                                   log_book_id, payment_gateway, workflow,
+                                                                   transactions)
             if not payment_vals:
                 return False
             order_vals.update({'shopify_payment_ids': payment_vals, 'is_shopify_multi_payment': True})
@@ -706,9 +1106,14 @@ class SaleOrder(models.Model):
         Task_id: 187155
         """
         utm_source_obj = self.env['utm.source']
+        order_lookup = self._context.get("shopify_order_lookup")
+        if order_lookup and source and source.lower() in order_lookup.source_ids:
+            return utm_source_obj.browse(order_lookup.source_ids[source.lower()])
         source_id = utm_source_obj.search([('name', '=ilike', source)], limit=1)
         if not source_id:
             source_id = utm_source_obj.create({'name': source})
+        if order_lookup and source:
+            order_lookup.source_ids[source.lower()] = source_id.id
         return source_id
 
     def shopify_set_pricelist(self, instance, order_response):
@@ -717,9 +1122,23 @@ class SaleOrder(models.Model):
         order currency different then the erp currency so we need to set proper pricelist for that sale order
         otherwise set pricelist based on instance configurations
         """
+        order_currency = order_response.get("currency") or False
+        order_lookup = self.get_shopify_order_lookup(instance)
+        if not order_lookup:
+            return self.search_shopify_pricelist(instance, order_currency)
+        if order_currency not in order_lookup.pricelist_ids:
+            pricelist = self.search_shopify_pricelist(instance, order_currency)
+            order_lookup.pricelist_ids[order_currency] = pricelist.id if pricelist else False
+        return self.env["product.pricelist"].browse(order_lookup.pricelist_ids[order_currency])
+
+    def search_shopify_pricelist(self, instance, order_currency):
+        """ This method is used to search the pricelist of the order currency, it activates the currency and creates
+            the pricelist if needed.
+            :param order_currency: Currency code received in the order.
+            @return: Record of pricelist or False.
+        """
         currency_obj = self.env["res.currency"]
         pricelist_obj = self.env["product.pricelist"]
-        order_currency = order_response.get("currency") or False
         if order_currency:
             currency = currency_obj.search([("name", "=", order_currency)])
             if not currency:
@@ -753,16 +1172,14 @@ class SaleOrder(models.Model):
             @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 14/11/2019.
             Task Id : 157350
         """
-        shopify_product_obj = self.env["shopify.product.product.ept"]
         variant_id = line.get("variant_id")
-        shopify_product = shopify_product_obj.search(
-            [("shopify_instance_id", "=", instance.id), ("variant_id", "=", variant_id),
-             ('exported_in_shopify', '=', True)], limit=1)
+        shopify_product = self.search_shopify_product_by_field(instance, "variant_id", variant_id)[:1]
         if not shopify_product:
-            shopify_product = shopify_product_obj.search([("shopify_instance_id", "=", instance.id),
-                                                          ("default_code", "=", line.get("sku")),
-                                                          ('exported_in_shopify', '=', True)], limit=1)
+            shopify_product = self.search_shopify_product_by_field(instance, "default_code", line.get("sku"))[:1]
             shopify_product.write({"variant_id": variant_id})
+            order_lookup = self.get_shopify_order_lookup(instance)
+            if shopify_product and order_lookup:
+                order_lookup.product_ids["variant_id"].setdefault(str(variant_id), []).append(shopify_product.id)
         return shopify_product
 
     def shopify_create_sale_order_line(self, line, product, quantity, product_name, price,
@@ -866,27 +1283,41 @@ class SaleOrder(models.Model):
         tax_id = []
         taxes = []
         company = instance.shopify_warehouse_id.company_id
+        order_lookup = self.get_shopify_order_lookup(instance)
         for tax in tax_lines:
             rate = float(tax.get("rate", 0.0))
             price = float(tax.get('price', 0.0))
             title = tax.get("title")
             rate = rate * 100
             if rate != 0.0 and price != 0.0:
-                if tax_included:
-                    name = "%s_(%s %s included)_%s" % (title, str(rate), "%", company.name)
-                else:
-                    name = "%s_(%s %s excluded)_%s" % (title, str(rate), "%", company.name)
+                name = self.prepare_shopify_tax_name(title, rate, tax_included, company)
+                tax_key = (name, round(rate, 4), tax_included)
+                if order_lookup and tax_key in order_lookup.tax_ids:
+                    taxes.append(order_lookup.tax_ids[tax_key])
+                    continue
                 tax_id = self.env["account.tax"].search([("price_include", "=", tax_included),
                                                          ("type_tax_use", "=", "sale"), ("amount", "=", rate),
                                                          ("name", "=", name), ("company_id", "=", company.id)], limit=1)
                 if not tax_id:
                     tax_id = self.sudo().shopify_create_account_tax(instance, rate, tax_included, company, name)
                 if tax_id:
+                    if order_lookup:
+                        order_lookup.tax_ids[tax_key] = tax_id.id
                     taxes.append(tax_id.id)
         if taxes:
             tax_id = [(6, 0, taxes)]
         return tax_id
 
+    @api.model
+    def prepare_shopify_tax_name(self, title, rate, tax_included, company):
+        """ This method is used to prepare the name of the tax created for the Shopify tax line.
+            :param rate: Rate of the tax in percentage.
+            @return: Name of the tax.
+        """
+        if tax_included:
+            return "%s_(%s %s included)_%s" % (title, str(rate), "%", company.name)
+        return "%s_(%s %s excluded)_%s" % (title, str(rate), "%", company.name)
+
     @api.model
     def shopify_create_account_tax(self, instance, value, price_included, company, name):
         """This method used to create tax in Odoo when importing orders from Shopify to Odoo.
@@ -909,16 +1340,18 @@ class SaleOrder(models.Model):
         return account_tax_id
 
     def prepare_vals_shopify_multi_payment(self, instance, order_data_queue_line, order_response, log_book_id,
-                                           payment_gateway, workflow):
+                                           payment_gateway, workflow, transactions=None):
         """ This method is use to prepare a values for the multi payment.
+            :param transactions: Transactions already requested for the order, as dictionaries.
             @author: Meera Sidapara @Emipro Technologies Pvt. Ltd on date 16/11/2021 .
             Task_id:179257 - Manage multiple payment.
         """
         payment_gateway_obj = self.env["shopify.payment.gateway.ept"]
-        transactions = shopify.Transaction().find(order_id=order_response.get('id'))
+        if transactions is None:
+            transactions = shopify.Transaction().find(order_id=order_response.get('id'))
         payment_list_vals = []
         for transaction in transactions:
-            result = transaction.to_dict()
+            result = transaction if isinstance(transaction, dict) else transaction.to_dict()
             if result.get('kind') in ['capture', 'sale'] and result.get('status') == 'success':
                 payment_transaction_id = result.get('id')
                 gateway = result.get('gateway')
@@ -1302,25 +1735,20 @@ class SaleOrder(models.Model):
     @api.model
     def process_shopify_order_via_webhook(self, order_data, instance, update_order=False):
         """
-        Creates order data queue and process it.
+        Creates order data queue line, it is processed by the order queue cron which is triggered right away.
         This method is for order imported via create and update webhook.
         @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 10-Jan-2020..
         @param order_data: Dictionary of order's data.
         @param instance: Instance of Shopify.
-        @param update_order: If update order webhook id called.
+        @param update_order: If update order webhook id called. New and updated orders are queued the same way, the
+        webhook queue lines import the orders not found in Odoo.
         """
-        order_queue_obj = self.env["shopify.order.data.queue.ept"]
         order_queue_line_obj = self.env["shopify.order.data.queue.line.ept"]
         queue_type = 'unshipped'
         if order_data.get('fulfillment_status') == 'fulfilled':
             queue_type = 'shipped'
-        queue = order_queue_line_obj.create_order_data_queue_line([order_data],
-                                                                  instance,
-                                                                  queue_type,
-                                                                  created_by='webhook')
-        if not update_order:
-            order_queue_obj.browse(queue).order_data_queue_line_ids.process_import_order_queue_data()
-        self._cr.commit()
+        order_queue_line_obj.create_order_data_queue_line([order_data], instance, queue_type, created_by='webhook')
+        self.env.ref("shopify_ept.process_shopify_order_queue")._trigger()
         return True
 
     @api.model
@@ -1344,7 +1772,7 @@ class SaleOrder(models.Model):
 
             if not order:
                 self.import_shopify_orders(queue_line, log_book)
-                return True
+                continue
 
             # Below condition use for, In shopify store there is full refund.
             if order_data.get('cancel_reason'):
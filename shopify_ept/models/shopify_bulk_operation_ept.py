@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+
+import requests
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from .. import shopify
+
+_logger = logging.getLogger("Shopify Bulk Operation")
+
+# Bulk operations of the GraphQL Admin API run a query asynchronously on Shopify and publish the result as a JSONL
+# file, one object per line, where the objects of a nested connection are flattened into their own lines.
+BULK_OPERATION_BATCH_SIZE = 250
+BULK_OPERATION_DOWNLOAD_TIMEOUT = 60
+BULK_OPERATION_RUN_QUERY_MUTATION = """
+mutation bulkOperationRunQuery($query: String!) {
+  bulkOperationRunQuery(query: $query) {
+    bulkOperation {
+      id
+      status
+    }
+    userErrors {
+      field
+      message
+    }
+  }
+}
+"""
+BULK_OPERATION_STATUS_QUERY = """
+query bulkOperation($id: ID!) {
+  node(id: $id) {
+    ... on BulkOperation {
+      status
+      errorCode
+      objectCount
+      url
+    }
+  }
+}
+"""
+PRODUCTS_BULK_QUERY = """
+{
+  products(query: "%s") {
+    edges {
+      node {
+        id
+        title
+        descriptionHtml
+        vendor
+        productType
+        handle
+        tags
+        status
+        templateSuffix
+        createdAt
+        updatedAt
+        publishedAt
+        options {
+          id
+          name
+          position
+          values
+        }
+        images {
+          edges {
+            node {
+              id
+              url
+              altText
+            }
+          }
+        }
+        variants {
+          edges {
+            node {
+              id
+              title
+              sku
+              barcode
+              price
+              compareAtPrice
+              position
+              taxable
+              inventoryPolicy
+              createdAt
+              updatedAt
+              selectedOptions {
+                name
+                value
+              }
+              image {
+                id
+              }
+              inventoryItem {
+                id
+                tracked
+                requiresShipping
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+# Refunds and fulfillments of an order are lists holding connections, which a bulk operation can not export, so
+# only the ids of the orders are queried and their data is requested from the REST API by ids.
+ORDERS_BULK_QUERY = """
+{
+  orders(query: "%s") {
+    edges {
+      node {
+        id
+      }
+    }
+  }
+}
+"""
+
+
+def get_id_from_gid(gid):
+    """ Returns the numeric id of a GraphQL global id like gid://shopify/ProductVariant/123. """
+    return int(gid.rsplit("/", 1)[1].split("?")[0])
+
+
+class ShopifyBulkOperationEpt(models.Model):
+    _name = "shopify.bulk.operation.ept"
+    _description = "Shopify Bulk Operation"
+    _rec_name = "bulk_operation_id"
+    _order = "id desc"
+
+    shopify_instance_id = fields.Many2one("shopify.instance.ept", string="Instance", required=True,
+                                          ondelete="cascade")
+    bulk_operation_id = fields.Char(string="Bulk Operation", readonly=True, copy=False,
+                                    help="Id of the bulk operation in Shopify.")
+    import_type = fields.Selection([("product", "Products"), ("unshipped_order", "Unshipped Orders"),
+                                    ("shipped_order", "Shipped Orders")], required=True, readonly=True)
+    from_date = fields.Datetime(readonly=True)
+    to_date = fields.Datetime(readonly=True)
+    skip_existing_product = fields.Boolean(string="Do Not Update Existing Products", readonly=True)
+    state = fields.Selection([("running", "Running"), ("importing", "Importing"), ("done", "Done"),
+                              ("failed", "Failed")], default="running", readonly=True, copy=False,
+                             help="Running: Shopify is preparing the result.\n"
+                                  "Importing: The result is being added into queues.")
+    url = fields.Char(readonly=True, copy=False, help="URL of the result file, it expires after one week.")
+    object_count = fields.Integer(readonly=True, copy=False, help="Number of objects written in the result.")
+    imported_count = fields.Integer(string="Queued Records", readonly=True, copy=False,
+                                    help="Number of records of the result added into queues, used to resume the "
+                                         "import.")
+    error_message = fields.Text(readonly=True, copy=False)
+
+    def start_bulk_import(self, instance, import_type, from_date, to_date, import_based_on="update_date",
+                          skip_existing_product=False):
+        """ This method is used to launch a bulk operation in Shopify which exports all the products or orders
+            updated in the given period. The result is added into queues by the bulk operation cron.
+            :param instance: Record of Shopify instance.
+            :param import_type: product, unshipped_order or shipped_order.
+            :param import_based_on: create_date or update_date, used for products only.
+            @return: Record of bulk operation.
+        """
+        instance.connect_in_shopify()
+        search_query = self.prepare_bulk_search_query(instance, import_type, from_date, to_date, import_based_on)
+        if import_type == "product":
+            bulk_query = PRODUCTS_BULK_QUERY % search_query
+        else:
+            bulk_query = ORDERS_BULK_QUERY % search_query
+
+        result = self.request_bulk_graphql(BULK_OPERATION_RUN_QUERY_MUTATION, {"query": bulk_query})
+        response = result.get("data", {}).get("bulkOperationRunQuery") or {}
+        errors = result.get("errors") or response.get("userErrors")
+        if errors:
+            raise UserError(_("Shopify refused to start the bulk operation:\n%s") % "\n".join(
+                error.get("message", "") for error in errors))
+
+        bulk_operation = self.create({"shopify_instance_id": instance.id,
+                                      "bulk_operation_id": response["bulkOperation"]["id"],
+                                      "import_type": import_type,
+                                      "from_date": from_date,
+                                      "to_date": to_date,
+                                      "skip_existing_product": skip_existing_product})
+        _logger.info("Bulk operation %s started for instance %s.", bulk_operation.bulk_operation_id, instance.name)
+        return bulk_operation
+
+    def prepare_bulk_search_query(self, instance, import_type, from_date, to_date, import_based_on):
+        """ This method is used to prepare the search syntax of the products or orders to export, with the same
+            filters as the import through the REST API.
+            @return: Search query string.
+        """
+        date_field = "created_at" if import_type == "product" and import_based_on == "create_date" else "updated_at"
+        conditions = []
+        if from_date:
+            conditions.append("%s:>='%s'" % (date_field, from_date.strftime("%Y-%m-%dT%H:%M:%SZ")))
+        if to_date:
+            conditions.append("%s:<='%s'" % (date_field, to_date.strftime("%Y-%m-%dT%H:%M:%SZ")))
+        if import_type == "product":
+            conditions.append("status:active")
+        elif import_type == "shipped_order":
+            conditions.append("fulfillment_status:shipped")
+        else:
+            order_statuses = instance.shopify_order_status_ids.mapped("status") or ["unshipped"]
+            conditions.append("(%s)" % " OR ".join("fulfillment_status:%s" % status for status in order_statuses))
+        return " AND ".join(conditions)
+
+    def request_bulk_graphql(self, query, variables):
+        """ This method is used to request a bulk operation query and wait while the GraphQL cost bucket of the store
+            is throttled.
+            @return: Decoded response.
+        """
+        return shopify.GraphQL(shopify.GRAPHQL_API_VERSION).execute_with_retry(query, variables)
+
+    @api.model
+    def process_bulk_operations(self):
+        """ This method is used to check the running bulk operations and to add the records of the finished ones
+            into queues. It will be called from the bulk operation cron.
+        """
+        bulk_operations = self.search([("state", "in", ["running", "importing"])], order="id")
+        if not bulk_operations:
+            return True
+        start = time.time()
+        bulk_operation_cron_time = bulk_operations.shopify_instance_id.get_shopify_cron_execution_time(
+            "shopify_ept.ir_cron_process_shopify_bulk_operation")
+        deadline = start + bulk_operation_cron_time - 60
+
+        for bulk_operation in bulk_operations:
+            bulk_operation.shopify_instance_id.connect_in_shopify()
+            if bulk_operation.state == "running":
+                bulk_operation.check_bulk_operation_status()
+            if bulk_operation.state == "importing":
+                bulk_operation.import_bulk_operation_result(deadline)
+            self._cr.commit()
+            if time.time() > deadline:
+                return True
+        return True
+
+    def check_bulk_operation_status(self):
+        """ This method is used to update the bulk operation with its status in Shopify. """
+        result = self.request_bulk_graphql(BULK_OPERATION_STATUS_QUERY, {"id": self.bulk_operation_id})
+        node = result.get("data", {}).get("node")
+        if not node:
+            errors = result.get("errors") or [{"message": "Bulk operation not found."}]
+            self.write({"state": "failed", "error_message": "\n".join(error.get("message", "") for error in errors)})
+            return False
+
+        status = node.get("status")
+        values = {"object_count": int(node.get("objectCount") or 0)}
+        if status == "COMPLETED":
+            values.update({"url": node.get("url"), "state": "importing" if node.get("url") else "done"})
+        elif status in ("FAILED", "CANCELED", "EXPIRED"):
+            values.update({"state": "failed",
+                           "error_message": "Bulk operation %s: %s" % (status.lower(), node.get("errorCode") or "")})
+        self.write(values)
+        if self.state == "done":
+            self.update_instance_last_import_date()
+        return True
+
+    def import_bulk_operation_result(self, deadline):
+        """ This method is used to stream the result file of the bulk operation and to add its records into queues,
+            by batches. The file is read line by line and never loaded whole. The records already queued by a
+            previous run are skipped, so the import resumes where the time limit of the cron stopped it.
+            :param deadline: Time after which no new batch is started.
+        """
+        skip_count = self.imported_count
+        batch = []
+        try:
+            with requests.get(self.url, stream=True, timeout=BULK_OPERATION_DOWNLOAD_TIMEOUT) as response:
+                response.raise_for_status()
+                for record in self.read_bulk_operation_records(response.iter_lines()):
+                    if skip_count:
+                        skip_count -= 1
+                        continue
+                    batch.append(record)
+                    if len(batch) < BULK_OPERATION_BATCH_SIZE:
+                        continue
+                    self.create_queues_from_bulk_records(batch)
+                    batch = []
+                    if time.time() > deadline:
+                        return False
+        except requests.exceptions.RequestException as error:
+            _logger.info("Result of bulk operation %s could not be read: %s", self.bulk_operation_id, error)
+            self.write({"error_message": str(error)})
+            return False
+
+        if batch:
+            self.create_queues_from_bulk_records(batch)
+        self.write({"state": "done", "error_message": False})
+        self.update_instance_last_import_date()
+        return True
+
+    def read_bulk_operation_records(self, lines):
+        """ This method is used to rebuild the records of a bulk operation result. The lines of a nested
+            connection follow their parent and hold its id in __parentId; they are grouped in the parent under
+            the type of their id (e.g. ProductVariant).
+            :param lines: Iterable of the JSONL lines.
+            @return: Generator of dictionaries.
+        """
+        record = False
+        for line in lines:
+            if not line:
+                continue
+            data = json.loads(line)
+            parent_id = data.pop("__parentId", False)
+            if not parent_id:
+                if record:
+                    yield record
+                record = data
+            elif record and record.get("id") == parent_id:
+                record.setdefault(data["id"].split("/")[3], []).append(data)
+            else:
+                _logger.info("Skipped line of bulk operation %s as its parent %s is not before it.",
+                             self.bulk_operation_id, parent_id)
+        if record:
+            yield record
+
+    def create_queues_from_bulk_records(self, records):
+        """ This method is used to add a batch of records of the bulk operation result into product or order
+            queues, and to commit it.
+            :param records: List of records rebuilt from the result.
+        """
+        instance = self.shopify_instance_id
+        if self.import_type == "product":
+            products = [self.prepare_product_data_from_bulk_record(record) for record in records]
+            self.env["shopify.product.data.queue.ept"].create_product_queues(instance, products,
+                                                                             self.skip_existing_product)
+        else:
+            order_ids = [str(get_id_from_gid(record["id"])) for record in records]
+            orders = shopify.Order().find(ids=",".join(order_ids), status="any", limit=BULK_OPERATION_BATCH_SIZE)
+            if orders:
+                queue_type = "shipped" if self.import_type == "shipped_order" else "unshipped"
+                self.env["shopify.order.data.queue.line.ept"].create_order_data_queue_line(orders, instance,
+                                                                                           queue_type)
+        self.imported_count += len(records)
+        _logger.info("Bulk operation %s: %s records added into queues.", self.bulk_operation_id, self.imported_count)
+        self._cr.commit()
+        return True
+
+    def prepare_product_data_from_bulk_record(self, record):
+        """ This method is used to convert a product of the bulk operation result into the format of the product
+            response of the REST API, which is stored in the product queue lines.
+            :param record: Product rebuilt from the result, with its ProductVariant and ProductImage lines.
+            @return: Dictionary of the product.
+        """
+        product_id = get_id_from_gid(record["id"])
+        options = [{"id": get_id_from_gid(option["id"]), "product_id": product_id, "name": option["name"],
+                    "position": option["position"], "values": option["values"]} for option in record.get("options", [])]
+        option_positions = {option["name"]: option["position"] for option in options}
+
+        variants = []
+        image_variant_ids = {}
+        for variant in record.get("ProductVariant", []):
+            variant_id = get_id_from_gid(variant["id"])
+            inventory_item = variant.get("inventoryItem") or {}
+            image_id = variant.get("image") and get_id_from_gid(variant["image"]["id"])
+            if image_id:
+                image_variant_ids.setdefault(image_id, []).append(variant_id)
+            variant_data = {"id": variant_id,
+                            "product_id": product_id,
+                            "title": variant.get("title"),
+                            "sku": variant.get("sku") or "",
+                            "barcode": variant.get("barcode"),
+                            "price": variant.get("price"),
+                            "compare_at_price": variant.get("compareAtPrice"),
+                            "position": variant.get("position"),
+                            "taxable": variant.get("taxable"),
+                            "inventory_policy": (variant.get("inventoryPolicy") or "deny").lower(),
+                            "inventory_management": "shopify" if inventory_item.get("tracked") else None,
+                            "inventory_item_id": inventory_item.get("id") and get_id_from_gid(inventory_item["id"]),
+                            "requires_shipping": inventory_item.get("requiresShipping"),
+                            "image_id": image_id or None,
+                            "created_at": variant.get("createdAt"),
+                            "updated_at": variant.get("updatedAt"),
+                            "option1": None, "option2": None, "option3": None}
+            for selected_option in variant.get("selectedOptions", []):
+                position = option_positions.get(selected_option["name"])
+                if position:
+                    variant_data["option%s" % position] = selected_option["value"]
+            variants.append(variant_data)
+
+        images = []
+        for position, image in enumerate(record.get("ProductImage", []), 1):
+            image_id = get_id_from_gid(image["id"])
+            images.append({"id": image_id, "product_id": product_id, "position": position, "src": image.get("url"),
+                           "alt": image.get("altText"), "variant_ids": image_variant_ids.get(image_id, [])})
+
+        # The bulk query has no publication scope; the product is published in the online store when it has a
+        # published date.
+        return {"id": product_id,
+                "title": record.get("title"),
+                "body_html": record.get("descriptionHtml"),
+                "vendor": record.get("vendor"),
+                "product_type": record.get("productType"),
+                "handle": record.get("handle"),
+                "tags": ", ".join(record.get("tags", [])),
+                "status": (record.get("status") or "").lower(),
+                "template_suffix": record.get("templateSuffix"),
+                "created_at": record.get("createdAt"),
+                "updated_at": record.get("updatedAt"),
+                "published_at": record.get("publishedAt"),
+                "published_scope": "web",
+                "options": options,
+                "variants": variants,
+                "images": images,
+                "image": images and images[0] or None}
+
+    def update_instance_last_import_date(self):
+        """ This method is used to set the last import date of the instance when the bulk operation is done, like the
+            import through the REST API does.
+        """
+        instance = self.shopify_instance_id
+        to_date = self.to_date or datetime.now()
+        if self.import_type == "product":
+            instance.shopify_last_date_product_import = to_date
+        elif self.import_type == "shipped_order":
+            instance.last_shipped_order_import_date = to_date - timedelta(days=2)
+        else:
+            instance.last_date_order_import = to_date - timedelta(days=2)
+        return True
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+
+from psycopg2.extras import execute_values
+
+from odoo import models, fields
+
+
+class ShopifyExportedStockEpt(models.Model):
+    """
+    Last quantity successfully exported for a Shopify variant in a Shopify location, used to export only the
+    quantities which are changed since the previous export.
+    """
+    _name = "shopify.exported.stock.ept"
+    _description = "Shopify Exported Stock"
+
+    shopify_product_id = fields.Many2one("shopify.product.product.ept", required=True, index=True,
+                                         ondelete="cascade")
+    location_id = fields.Many2one("shopify.location.ept", required=True, ondelete="cascade")
+    quantity = fields.Integer()
+    export_date = fields.Datetime()
+
+    _sql_constraints = [("shopify_product_location_unique", "unique(shopify_product_id, location_id)",
+                         "Exported stock must be unique per Shopify product and location!")]
+
+    def get_exported_quantities(self, location, shopify_products):
+        """ This method is used to get the last exported quantities of the products in a location.
+            :param location: Record of shopify location.
+            :param shopify_products: Records of shopify product product.
+            @return: Dictionary of shopify product product id and quantity.
+        """
+        if not shopify_products:
+            return {}
+        self._cr.execute("""SELECT shopify_product_id, quantity FROM shopify_exported_stock_ept
+                            WHERE location_id = %s AND shopify_product_id IN %s""",
+                         (location.id, tuple(shopify_products.ids)))
+        return dict(self._cr.fetchall())
+
+    def set_exported_quantities(self, location, stock_lines):
+        """ This method is used to store the quantities exported in a location with a single upsert query.
+            :param location: Record of shopify location.
+            :param stock_lines: List of tuples of shopify product product record and quantity.
+        """
+        if not stock_lines:
+            return True
+        now = fields.Datetime.now()
+        uid = self.env.uid
+        values = {shopify_product.id: (shopify_product.id, location.id, int(quantity), now, uid, now, uid, now)
+                  for shopify_product, quantity in stock_lines}
+        execute_values(self._cr, """
+            INSERT INTO shopify_exported_stock_ept (shopify_product_id, location_id, quantity, export_date,
+                                                    create_uid, create_date, write_uid, write_date)
+            VALUES %s
+            ON CONFLICT (shopify_product_id, location_id) DO UPDATE
+            SET quantity = EXCLUDED.quantity, export_date = EXCLUDED.export_date,
+                write_uid = EXCLUDED.write_uid, write_date = EXCLUDED.write_date""", list(values.values()))
+        self.invalidate_cache()
+        return True
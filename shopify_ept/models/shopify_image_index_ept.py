@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+
+import base64
+import hashlib
+import logging
+
+from psycopg2 import IntegrityError
+
+from odoo import models, fields, api
+from .shopify_template_ept import request_shopify_images
+
+_logger = logging.getLogger("Shopify Image Index")
+
+# Images of the index not used by any Shopify image layer since these days are removed.
+IMAGE_INDEX_RETENTION_DAYS = 7
+IMAGE_INDEX_GC_BATCH_SIZE = 1000
+
+
+class ShopifyImageIndexEpt(models.Model):
+    """
+    Images downloaded from Shopify, by their Shopify image id. An image is taken from here while its URL and its
+    updated date in Shopify are the same, else it is requested again with the ETag and Last-Modified of the last
+    download, so an image which has not changed is not downloaded again. Images are stored as attachments, which the
+    filestore keeps once by their content, so the same image of many templates or instances is stored once.
+    """
+    _name = "shopify.image.index.ept"
+    _description = "Shopify Downloaded Image"
+
+    shopify_image_id = fields.Char("Shopify Image ID", required=True, index=True, help="Id of image in Shopify.")
+    url = fields.Char(help="URL of the image when it was downloaded.")
+    shopify_updated_at = fields.Char("Updated At", help="Updated date of the image in Shopify.")
+    etag = fields.Char("ETag")
+    last_modified = fields.Char()
+    checksum = fields.Char(index=True, help="MD5 of the base64 encoded image.")
+    image = fields.Binary(attachment=True)
+
+    _sql_constraints = [("shopify_image_unique", "unique(shopify_image_id)", "Shopify image is already downloaded!")]
+
+    @api.model
+    def get_shopify_images(self, images):
+        """ This method is used to get the images of the image responses. Images not changed since their last download
+            are taken from the index, the others are requested concurrently, once per URL, and stored in the index.
+            :param images: List of image responses.
+            @return: Dictionary of URL and base64 encoded image or None when it can not be downloaded.
+        """
+        images = [image for image in images if image.get("id") and image.get("src")]
+        if not images:
+            return {}
+        image_indexes = self.with_context(bin_size=False).search(
+            [("shopify_image_id", "in", list({str(image.get("id")) for image in images}))])
+        index_by_image_id = {image_index.shopify_image_id: image_index for image_index in image_indexes}
+
+        downloaded_images, images_to_store = {}, {}
+        for image in images:
+            url = image.get("src")
+            image_index = index_by_image_id.get(str(image.get("id")), self.browse())
+            is_same_url = image_index.url == url
+            if is_same_url and image_index.shopify_updated_at == image.get("updated_at") and image_index.image:
+                downloaded_images.setdefault(url, image_index.image)
+            else:
+                images_to_store.setdefault(url, []).append((image, image_index if is_same_url else self.browse()))
+
+        # An URL is requested once, conditionally when one of its images has been downloaded from it before.
+        conditional_indexes = {url: next((image_index for _image, image_index in url_images if image_index.image),
+                                         self.browse()) for url, url_images in images_to_store.items()}
+        responses = request_shopify_images([(url, image_index.etag, image_index.last_modified)
+                                            for url, image_index in conditional_indexes.items()
+                                            if url not in downloaded_images])
+        index_by_checksum = self.prepare_image_index_by_checksum(
+            [base64.b64encode(response.content) for response in responses.values()
+             if response is not None and response.status_code == 200])
+        for url, url_images in images_to_store.items():
+            response, headers = responses.get(url), {}
+            conditional_index = conditional_indexes[url]
+            if url in downloaded_images:
+                image_data = downloaded_images[url]
+            elif response is not None and response.status_code == 304 and conditional_index.image:
+                image_data = conditional_index.image
+                headers = {"ETag": conditional_index.etag, "Last-Modified": conditional_index.last_modified}
+            elif response is not None and response.status_code == 200:
+                image_data, headers = base64.b64encode(response.content), response.headers
+            else:
+                downloaded_images[url] = None
+                continue
+            downloaded_images[url] = image_data
+            for image, image_index in url_images:
+                if image_index and image_index == conditional_index and response is not None and \
+                        response.status_code == 304:
+                    image_index.shopify_updated_at = image.get("updated_at")
+                    continue
+                self.store_shopify_image(image, image_data, headers, index_by_image_id.get(str(image.get("id"))),
+                                         index_by_checksum)
+        return downloaded_images
+
+    @api.model
+    def prepare_image_index_by_checksum(self, images_data):
+        """ This method is used to search the indexed images having the same content as the downloaded images.
+            :param images_data: List of base64 encoded images.
+            @return: Dictionary of checksum and record of the image in the index.
+        """
+        checksums = list({hashlib.md5(image_data).hexdigest() for image_data in images_data})
+        index_by_checksum = {}
+        if checksums:
+            for image_index in self.search([("checksum", "in", checksums), ("image", "!=", False)]):
+                index_by_checksum.setdefault(image_index.checksum, image_index)
+        return index_by_checksum
+
+    @api.model
+    def store_shopify_image(self, image, image_data, headers, image_index=None, index_by_checksum=None):
+        """ This method is used to store the downloaded image in the index. When the same image is already indexed, its
+            attachment is shared instead of storing the image again.
+            :param image: Image response.
+            :param image_data: Base64 encoded image.
+            :param headers: Headers of the image download response.
+            :param image_index: Record of the image in the index, if any.
+            :param index_by_checksum: Dictionary of checksum and record of the image in the index, new images are
+            added to it.
+        """
+        index_by_checksum = {} if index_by_checksum is None else index_by_checksum
+        checksum = hashlib.md5(image_data).hexdigest()
+        values = {"shopify_image_id": str(image.get("id")),
+                  "url": image.get("src"),
+                  "shopify_updated_at": image.get("updated_at"),
+                  "etag": headers.get("ETag"),
+                  "last_modified": headers.get("Last-Modified"),
+                  "checksum": checksum}
+        if image_index and image_index.checksum == checksum and image_index.image:
+            # The URL or updated date changed, but not the image.
+            image_index.write(values)
+            index_by_checksum.setdefault(checksum, image_index)
+            return image_index
+
+        same_image_index = index_by_checksum.get(checksum, self.browse())
+        values["image"] = False if same_image_index else image_data
+        if image_index:
+            image_index.write(values)
+        else:
+            try:
+                with self._cr.savepoint():
+                    image_index = self.create(values)
+            except IntegrityError:
+                # The image is stored by another process meanwhile.
+                _logger.info("Shopify image %s is already stored.", values["shopify_image_id"])
+                return self.browse()
+        if same_image_index:
+            self.share_image_attachment(same_image_index, image_index)
+        index_by_checksum.setdefault(checksum, image_index)
+        return image_index
+
+    @api.model
+    def share_image_attachment(self, source_index, image_index):
+        """ This method is used to give the image of the source to the image index, with a copy of the attachment of
+            the source which points to the same file in the filestore.
+        """
+        attachment = self.env["ir.attachment"].sudo().search([("res_model", "=", self._name),
+                                                               ("res_field", "=", "image"),
+                                                               ("res_id", "=", source_index.id)], limit=1)
+        attachment.copy({"res_id": image_index.id})
+        image_index.invalidate_cache(["image"])
+        return True
+
+    @api.autovacuum
+    def _gc_shopify_image_index(self):
+        """ Deletes the images of the index which no Shopify image layer uses anymore, with their attachment. """
+        self._cr.execute("""SELECT image_index.id FROM shopify_image_index_ept AS image_index
+                            WHERE image_index.write_date < now() at time zone 'UTC' - %s * interval '1 day'
+                            AND NOT EXISTS (SELECT 1 FROM shopify_product_image_ept AS product_image
+                                            WHERE product_image.shopify_image_id = image_index.shopify_image_id)
+                            ORDER BY image_index.id LIMIT %s""",
+                         (IMAGE_INDEX_RETENTION_DAYS, IMAGE_INDEX_GC_BATCH_SIZE))
+        image_indexes = self.browse([row[0] for row in self._cr.fetchall()])
+        image_indexes.unlink()
+        _logger.info("Deleted %s unused Shopify images of the index.", len(image_indexes))
@@ -14,6 +14,22 @@ from ..shopify.pyactiveresource.connection import ResourceNotFound
 
 _logger = logging.getLogger("Shopify Product")
 
+# inventorySetQuantities accepts up to 250 quantities per call.
+INVENTORY_SET_BATCH_SIZE = 250
+INVENTORY_SET_QUANTITIES_MUTATION = """
+mutation inventorySetQuantities($input: InventorySetQuantitiesInput!) {
+  inventorySetQuantities(input: $input) {
+    userErrors {
+      field
+      message
+    }
+  }
+}
+"""
+GRAPHQL_THROTTLE_RETRIES = 5
+# Fields of the Shopify variants used by the variant resolver of the product import.
+SHOPIFY_VARIANT_RESOLVER_FIELDS = {"variant_id", "default_code", "product_id", "active", "shopify_instance_id"}
+
 
 class ShopifyProductProductEpt(models.Model):
     _name = "shopify.product.product.ept"
@@ -50,6 +66,33 @@ class ShopifyProductProductEpt(models.Model):
     taxable = fields.Boolean(default=True)
     last_stock_update_date = fields.Datetime(readonly=True, help="It is used in export stock process.")
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        """ Inherited create method to forget the keys of the created variants in the variant resolver. """
+        shopify_products = super(ShopifyProductProductEpt, self).create(vals_list)
+        variant_resolver = self._context.get("shopify_variant_resolver")
+        if variant_resolver:
+            variant_resolver.forget(shopify_products.prepare_variant_resolver_keys().values())
+        return shopify_products
+
+    def write(self, vals):
+        """ Inherited write method to forget the keys of the changed variants in the variant resolver. """
+        variant_resolver = self._context.get("shopify_variant_resolver")
+        if not variant_resolver or not SHOPIFY_VARIANT_RESOLVER_FIELDS & set(vals):
+            return super(ShopifyProductProductEpt, self).write(vals)
+        keys_before = self.prepare_variant_resolver_keys()
+        result = super(ShopifyProductProductEpt, self).write(vals)
+        variant_resolver.forget_changed(keys_before, self.prepare_variant_resolver_keys())
+        return result
+
+    def prepare_variant_resolver_keys(self):
+        """ This method is used to prepare the keys of the variants used by the variant resolver.
+            @return: Dictionary of id and tuple of variant id, SKU, SKU of the product, barcode of the product and
+            active.
+        """
+        return {record.id: (record.variant_id, record.default_code, record.product_id.default_code,
+                            record.product_id.barcode, record.active) for record in self}
+
     def toggle_active(self):
         """
         This method is used to archiving related shopify product template if there is only
@@ -100,20 +143,19 @@ class ShopifyProductProductEpt(models.Model):
            @return: attrib_line_vals(list of attribute vals)
            @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 22/10/2019.
         """
-        product_attribute_obj = self.env["product.attribute"]
-        product_attribute_value_obj = self.env["product.attribute.value"]
+        shopify_product_template_obj = self.env["shopify.product.template.ept"]
         attrib_line_vals = []
+        shopify_product_template_obj.create_shopify_template_attributes(result)
         for attrib in result.get("options"):
             attrib_name = attrib.get("name")
             attrib_values = attrib.get("values")
-            attribute = product_attribute_obj.get_attribute(attrib_name, auto_create=True)[0]
+            attribute = shopify_product_template_obj.get_shopify_attribute(attrib_name, auto_create=True)
             attr_val_ids = []
 
             for attrib_value in attrib_values:
-                attribute_value = product_attribute_value_obj.get_attribute_values(attrib_value, attribute.id,
-                                                                                   auto_create=True)
+                attribute_value = shopify_product_template_obj.get_shopify_attribute_value(attrib_value, attribute.id,
+                                                                                           auto_create=True)
                 if attribute_value:
-                    attribute_value = attribute_value[0]
                     attr_val_ids.append(attribute_value.id)
 
             if attr_val_ids:
@@ -128,11 +170,14 @@ class ShopifyProductProductEpt(models.Model):
             @return: True
             @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 10/10/2019.
         """
+        template_attribute_values = self.env["shopify.product.template.ept"].get_template_attribute_value_ids(
+            product_template.id)
         for variation in result.get("variants"):
             variation_attributes = self.prepare_vals_for_variation_attributes(result, variation)
 
             template_attribute_value_ids = self.prepare_template_attribute_values_ids(variation_attributes,
-                                                                                      product_template)
+                                                                                      product_template,
+                                                                                      template_attribute_values)
 
             odoo_product = self.search_odoo_product_and_set_sku_barcode(template_attribute_value_ids, variation,
                                                                         product_template)
@@ -165,30 +210,33 @@ class ShopifyProductProductEpt(models.Model):
 
         return variation_attributes
 
-    def prepare_template_attribute_values_ids(self, variation_attributes, product_template):
+    def prepare_template_attribute_values_ids(self, variation_attributes, product_template,
+                                              template_attribute_values=None):
         """ This method is used to prepare a template attribute values ids list.
+            :param template_attribute_values: Template attribute value ids of the template by attribute and attribute
+            value, searched once for all the variants of the template.
             @return: template_attribute_value_ids
             @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 20 October 2020 .
             Task_id: 167537
         """
         template_attribute_value_ids = []
-        product_attribute_obj = self.env["product.attribute"]
-        product_attribute_value_obj = self.env["product.attribute.value"]
-        product_template_attribute_value_obj = self.env["product.template.attribute.value"]
+        shopify_product_template_obj = self.env["shopify.product.template.ept"]
+        if template_attribute_values is None:
+            template_attribute_values = shopify_product_template_obj.get_template_attribute_value_ids(
+                product_template.id)
         for variation_attribute in variation_attributes:
             attribute_val = variation_attribute.get("option")
             attribute_name = variation_attribute.get("name")
-            product_attribute = product_attribute_obj.search([("name", "=ilike", attribute_name)], limit=1)
+            product_attribute_value = False
+            product_attribute = shopify_product_template_obj.get_shopify_attribute(attribute_name,
+                                                                                   create_variant=False)
             if product_attribute:
-                product_attribute_value = product_attribute_value_obj.get_attribute_values(attribute_val,
-                                                                                           product_attribute.id)
+                product_attribute_value = shopify_product_template_obj.get_shopify_attribute_value(
+                    attribute_val, product_attribute.id)
             if product_attribute_value:
-                product_attribute_value = product_attribute_value[0]
-                template_attribute_value_id = product_template_attribute_value_obj.search(
-                    [("product_attribute_value_id", "=", product_attribute_value.id),
-                     ("attribute_id", "=", product_attribute.id), ("product_tmpl_id", "=", product_template.id)],
-                    limit=1)
-                template_attribute_value_id and template_attribute_value_ids.append(template_attribute_value_id.id)
+                template_attribute_value_id = template_attribute_values.get((product_attribute.id,
+                                                                             product_attribute_value.id))
+                template_attribute_value_id and template_attribute_value_ids.append(template_attribute_value_id)
 
         return template_attribute_value_ids
 
@@ -458,10 +506,8 @@ class ShopifyProductProductEpt(models.Model):
                              })
         option_index = 0
         option_index_value = ["option1", "option2", "option3"]
-        attribute_value_obj = self.env["product.template.attribute.value"]
-        att_values = attribute_value_obj.search(
-            [("id", "in", variant.product_id.product_template_attribute_value_ids.ids)],
-            order="attribute_id")
+        att_values = variant.product_id.product_template_attribute_value_ids.sorted(
+            key=lambda value: (value.attribute_id.sequence, value.attribute_id.id))
         for att_value in att_values:
             if option_index > 3:
                 continue
@@ -618,13 +664,16 @@ class ShopifyProductProductEpt(models.Model):
         common_log_line_obj = self.env["common.log.lines.ept"]
         product_obj = self.env["product.product"]
         sale_order_obj = self.env["sale.order"]
+        exported_stock_obj = self.env["shopify.exported.stock.ept"]
+        is_force_stock_resync = self._context.get('is_force_stock_resync') or self._context.get(
+            'is_process_from_selected_product')
 
         log_line_array = []
         model = "shopify.product.product.ept"
         model_id = common_log_line_obj.get_model_id(model)
         all_products = self.search_shopify_product_for_export_stock(instance, product_ids)
 
-        if self._context.get('is_process_from_selected_product'):
+        if self._context.get('is_process_from_selected_product') or self._context.get('is_process_from_stock_queue'):
             shopify_products = all_products
         else:
             if instance.shopify_last_date_update_stock:
@@ -656,9 +705,15 @@ class ShopifyProductProductEpt(models.Model):
             odoo_product_ids = shopify_products.product_id.ids
             product_stock = self.check_stock(instance, odoo_product_ids, product_obj,
                                              location_id.export_stock_warehouse_ids)
+            exported_quantities = {} if is_force_stock_resync else exported_stock_obj.get_exported_quantities(
+                location_id, shopify_products)
+            graphql_stock_lines = []
+            exported_stock_lines = []
             commit_count = 0
             for shopify_product in shopify_products:
                 if commit_count == 50:
+                    exported_stock_obj.set_exported_quantities(location_id, exported_stock_lines)
+                    exported_stock_lines = []
                     self._cr.commit()
                     commit_count = 0
                 commit_count += 1
@@ -671,40 +726,23 @@ class ShopifyProductProductEpt(models.Model):
                         log_line_array = self.shopify_create_log(message, model_id, odoo_product, log_line_array)
                         continue
 
-                    quantity = self.compute_qty_for_export_stock(product_stock, shopify_product, odoo_product)
-                    try:
-                        shopify.InventoryLevel.set(location_id.shopify_location_id, shopify_product.inventory_item_id,
-                                                   int(quantity))
-                    except ClientError as error:
-                        if hasattr(error,
-                                   "response") and error.response.code == 429 and error.response.msg == "Too Many Requests":
-                            time.sleep(int(float(error.response.headers.get('Retry-After', 5))))
-                            shopify.InventoryLevel.set(location_id.shopify_location_id,
-                                                       shopify_product.inventory_item_id,
-                                                       int(quantity))
-                            continue
-                        message = "Error while Export stock for Product ID: %s & Product Name: '%s' for instance:" \
-                                  "'%s'\nError: %s\n%s" % (odoo_product.id, odoo_product.name, instance.name,
-                                                           str(error.response.code) + " " + error.response.msg,
-                                                           json.loads(error.response.body.decode()).get("errors")[0]
-                                                           )
-                        log_line_array = self.shopify_create_log(message, model_id, odoo_product, log_line_array)
-                    except ResourceNotFound as error:
-                        if hasattr(error, "response"):
-                            message = "Error while Export stock for Product ID: %s & Product Name: '%s' for instance:" \
-                                      "'%s'not found in Shopify store\nError: %s\n%s" % (odoo_product.id, odoo_product.name, instance.name,
-                                                               str(error.response.code) + " " + error.response.msg,
-                                                               json.loads(error.response.body.decode()).get("errors")[0]
-                                                               )
-                            log_line_array = self.shopify_create_log(message, model_id, odoo_product, log_line_array)
-                    except Exception as error:
-                        message = "Error while Export stock for Product ID: %s & Product Name: '%s' for instance: " \
-                                  "'%s'\nError: %s" % (odoo_product.id, odoo_product.name, instance.name, str(error))
-                        log_line_array = self.shopify_create_log(message, model_id, odoo_product, log_line_array)
+                    quantity = int(self.compute_qty_for_export_stock(product_stock, shopify_product, odoo_product))
+                    if exported_quantities.get(shopify_product.id) != quantity:
+                        if instance.shopify_stock_export_method == "graphql":
+                            graphql_stock_lines.append((shopify_product, quantity))
+                        elif self.export_stock_by_inventory_level(instance, location_id, shopify_product, quantity,
+                                                                  model_id, log_line_array):
+                            exported_stock_lines.append((shopify_product, quantity))
 
                     if not self._context.get('is_process_from_selected_product'):
                         shopify_product.write({
                             'last_stock_update_date': last_export_date if not shopify_product.last_stock_update_date else datetime.now()})
+            if graphql_stock_lines:
+                exported_products = self.export_stock_in_shopify_by_graphql(instance, location_id,
+                                                                            graphql_stock_lines, model_id,
+                                                                            log_line_array)
+                exported_stock_lines += [line for line in graphql_stock_lines if line[0] in exported_products]
+            exported_stock_obj.set_exported_quantities(location_id, exported_stock_lines)
         log_book_id = False
         if len(log_line_array) > 0:
             log_book_id = self.create_log_book(log_line_array, "export", instance)
@@ -724,6 +762,120 @@ class ShopifyProductProductEpt(models.Model):
             sale_order_obj.create_schedule_activity_against_logbook(log_book_id, log_book_id.log_lines, note)
         return all_products
 
+    def export_stock_by_inventory_level(self, instance, location_id, shopify_product, quantity, model_id,
+                                        log_line_array):
+        """ This method is used to export the stock of one variant to a Shopify location with the InventoryLevel
+            REST API.
+            :param location_id: Record of shopify location.
+            :param shopify_product: Record of shopify product product.
+            :param quantity: Quantity to set in the location.
+            @return: True if the stock is updated in Shopify.
+        """
+        odoo_product = shopify_product.product_id
+        try:
+            shopify.InventoryLevel.set(location_id.shopify_location_id, shopify_product.inventory_item_id,
+                                       int(quantity))
+            return True
+        except ClientError as error:
+            if hasattr(error,
+                       "response") and error.response.code == 429 and error.response.msg == "Too Many Requests":
+                time.sleep(int(float(error.response.headers.get('Retry-After', 5))))
+                shopify.InventoryLevel.set(location_id.shopify_location_id,
+                                           shopify_product.inventory_item_id,
+                                           int(quantity))
+                return True
+            message = "Error while Export stock for Product ID: %s & Product Name: '%s' for instance:" \
+                      "'%s'\nError: %s\n%s" % (odoo_product.id, odoo_product.name, instance.name,
+                                               str(error.response.code) + " " + error.response.msg,
+                                               json.loads(error.response.body.decode()).get("errors")[0]
+                                               )
+            log_line_array = self.shopify_create_log(message, model_id, odoo_product, log_line_array)
+        except ResourceNotFound as error:
+            if hasattr(error, "response"):
+                message = "Error while Export stock for Product ID: %s & Product Name: '%s' for instance:" \
+                          "'%s'not found in Shopify store\nError: %s\n%s" % (odoo_product.id, odoo_product.name, instance.name,
+                                                   str(error.response.code) + " " + error.response.msg,
+                                                   json.loads(error.response.body.decode()).get("errors")[0]
+                                                   )
+                log_line_array = self.shopify_create_log(message, model_id, odoo_product, log_line_array)
+        except Exception as error:
+            message = "Error while Export stock for Product ID: %s & Product Name: '%s' for instance: " \
+                      "'%s'\nError: %s" % (odoo_product.id, odoo_product.name, instance.name, str(error))
+            log_line_array = self.shopify_create_log(message, model_id, odoo_product, log_line_array)
+
+        return False
+
+    def export_stock_in_shopify_by_graphql(self, instance, location_id, stock_lines, model_id, log_line_array):
+        """ This method is used to export the stock of many variants to a Shopify location with the
+            inventorySetQuantities GraphQL mutation, sending up to 250 variants per request.
+            Shopify rejects the whole mutation when one of its quantities is invalid, so the user errors are
+            logged against their variants and the rest of the batch is sent once more.
+            :param location_id: Record of shopify location.
+            :param stock_lines: List of tuples of shopify product product record and quantity.
+            @return: Records of shopify product product whose stock is updated in Shopify.
+        """
+        exported_products = self.env["shopify.product.product.ept"]
+        for start in range(0, len(stock_lines), INVENTORY_SET_BATCH_SIZE):
+            batch = stock_lines[start:start + INVENTORY_SET_BATCH_SIZE]
+            for _attempt in range(2):
+                try:
+                    user_errors = self.request_for_inventory_set_quantities(location_id, batch)
+                except Exception as error:
+                    message = "Error while Export stock of %s products to Shopify location '%s' for instance: " \
+                              "'%s'\nError: %s" % (len(batch), location_id.name, instance.name, str(error))
+                    self.shopify_create_log(message, model_id, False, log_line_array)
+                    break
+                if not user_errors:
+                    for shopify_product, _quantity in batch:
+                        exported_products |= shopify_product
+                    break
+                failed_indexes = set()
+                for index, error_message in user_errors:
+                    odoo_product = batch[index][0].product_id if index is not None else False
+                    if odoo_product:
+                        message = "Error while Export stock for Product ID: %s & Product Name: '%s' for instance: " \
+                                  "'%s'\nError: %s" % (odoo_product.id, odoo_product.name, instance.name,
+                                                       error_message)
+                    else:
+                        message = "Error while Export stock of %s products to Shopify location '%s' for " \
+                                  "instance: '%s'\nError: %s" % (len(batch), location_id.name, instance.name,
+                                                                 error_message)
+                    self.shopify_create_log(message, model_id, odoo_product, log_line_array)
+                    failed_indexes.add(index)
+                if None in failed_indexes:
+                    break
+                batch = [line for index, line in enumerate(batch) if index not in failed_indexes]
+                if not batch:
+                    break
+            self._cr.commit()
+        return exported_products
+
+    def request_for_inventory_set_quantities(self, location_id, stock_lines):
+        """ This method is used to request the inventorySetQuantities mutation for a batch of variants and wait
+            while the GraphQL cost bucket of the store is throttled.
+            :param location_id: Record of shopify location.
+            :param stock_lines: List of tuples of shopify product product record and quantity.
+            @return: List of tuples of the index of the failed line in stock_lines (None if the error is not
+            related to a line) and the error message.
+        """
+        quantities = [{"inventoryItemId": "gid://shopify/InventoryItem/%s" % shopify_product.inventory_item_id,
+                       "locationId": "gid://shopify/Location/%s" % location_id.shopify_location_id,
+                       "quantity": quantity} for shopify_product, quantity in stock_lines]
+        variables = {"input": {"name": "available", "reason": "correction", "ignoreCompareQuantity": True,
+                               "quantities": quantities}}
+        result = shopify.GraphQL(shopify.GRAPHQL_API_VERSION).execute_with_retry(
+            INVENTORY_SET_QUANTITIES_MUTATION, variables, retries=GRAPHQL_THROTTLE_RETRIES)
+        errors = result.get("errors")
+        if errors:
+            return [(None, "; ".join(error.get("message", "") for error in errors))]
+
+        user_errors = []
+        for user_error in result["data"]["inventorySetQuantities"]["userErrors"]:
+            field = user_error.get("field") or []
+            index = int(field[2]) if len(field) > 2 and field[1] == "quantities" and field[2].isdigit() else None
+            user_errors.append((index, user_error.get("message")))
+        return user_errors
+
     def compute_qty_for_export_stock(self, product_stock, shopify_product, odoo_product):
         """ This method is used to find qty base on the configuration of Shopify.
             :param product_stock: Dictionary of the odoo product with qty.
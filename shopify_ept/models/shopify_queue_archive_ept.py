@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+
+import logging
+import time
+from datetime import datetime, timedelta
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import models, api
+
+_logger = logging.getLogger("Shopify Queue Archive")
+
+QUEUE_ARCHIVE_BATCH_SIZE = 1000
+
+# Table of the records, table of their queue, column linking them and archive table.
+QUEUE_LINE_ARCHIVE_TABLES = [
+    ("shopify_order_data_queue_line_ept", "shopify_order_data_queue_ept", "shopify_order_data_queue_id",
+     "shopify_order_data_queue_line_archive"),
+    ("shopify_product_data_queue_line_ept", "shopify_product_data_queue_ept", "product_data_queue_id",
+     "shopify_product_data_queue_line_archive"),
+    ("shopify_customer_data_queue_line_ept", "shopify_customer_data_queue_ept", "synced_customer_queue_id",
+     "shopify_customer_data_queue_line_archive"),
+]
+LOG_LINE_ARCHIVE_TABLE = "shopify_common_log_lines_archive"
+# Model and lines field of the queues and of the log books, by their table.
+ARCHIVED_LINE_PARENTS = {
+    "shopify_order_data_queue_ept": ("shopify.order.data.queue.ept", "order_data_queue_line_ids"),
+    "shopify_product_data_queue_ept": ("shopify.product.data.queue.ept", "product_data_queue_lines"),
+    "shopify_customer_data_queue_ept": ("shopify.customer.data.queue.ept", "synced_customer_queue_line_ids"),
+    "common_log_book_ept": ("common.log.book.ept", "log_lines"),
+}
+
+
+class ShopifyQueueArchiveEpt(models.AbstractModel):
+    """
+    Moves the processed queue lines and the log lines older than the retention days of their instance out of the
+    hot tables. Archived rows are kept as JSON in archive tables partitioned by the month of archiving, so old
+    archives are removed by dropping their partition.
+    """
+    _name = "shopify.queue.archive.ept"
+    _description = "Shopify Queue Lines Archive"
+
+    @api.model
+    def archive_shopify_queue_lines(self):
+        """ This method is used to archive the done, failed and cancelled queue lines and the log lines of every
+            instance with retention days, in batches. It will be called from the archive queue lines cron.
+        """
+        instances = self.env["shopify.instance.ept"].search([("shopify_queue_retention_days", ">", 0)])
+        if not instances:
+            return True
+        start = time.time()
+        archive_cron_time = instances.get_shopify_cron_execution_time(
+            "shopify_ept.ir_cron_archive_shopify_queue_lines")
+        archive_date = datetime.now().date()
+
+        for table in [archive_table for _table, _queue, _column, archive_table in
+                      QUEUE_LINE_ARCHIVE_TABLES] + [LOG_LINE_ARCHIVE_TABLE]:
+            self.create_archive_partition(table, archive_date)
+        self._cr.commit()
+
+        for instance in instances:
+            before_date = datetime.now() - timedelta(days=instance.shopify_queue_retention_days)
+            # Log lines are archived first, so most log lines of the archived queue lines are archived with them.
+            # Newer log lines can still reference an archived queue line, their reference is set to null by the
+            # foreign key when the queue line is deleted.
+            queries = [(self.prepare_log_line_archive_query(), "common_log_book_ept")]
+            queries += [(self.prepare_queue_line_archive_query(table, queue_table, queue_column, archive_table),
+                         queue_table) for table, queue_table, queue_column, archive_table in QUEUE_LINE_ARCHIVE_TABLES]
+            for query, parent_table in queries:
+                while True:
+                    self._cr.execute(query, {"instance_id": instance.id, "before_date": before_date,
+                                             "archive_date": archive_date, "limit": QUEUE_ARCHIVE_BATCH_SIZE})
+                    archived_count = self._cr.rowcount
+                    parent_ids = {parent_id for parent_id, in self._cr.fetchall() if parent_id}
+                    self.update_archived_line_parents(parent_table, parent_ids)
+                    self._cr.commit()
+                    if time.time() - start > archive_cron_time - 60:
+                        return True
+                    if archived_count < QUEUE_ARCHIVE_BATCH_SIZE:
+                        break
+            _logger.info("Archived queue lines and log lines older than %s of instance %s.", before_date,
+                         instance.name)
+        return True
+
+    @api.model
+    def update_archived_line_parents(self, parent_table, parent_ids):
+        """ This method is used to update the queues or log books of the archived lines, as the lines are deleted
+            behind the ORM. The state of the queues is recomputed and the queues and log books without lines are
+            deleted.
+            :param parent_table: Table of the queues or of the log books.
+            :param parent_ids: Ids of the queues or log books of the archived lines.
+        """
+        model_name, lines_field = ARCHIVED_LINE_PARENTS[parent_table]
+        parents = self.env[model_name].browse(parent_ids).exists()
+        if not parents:
+            return True
+        self.env[parents[lines_field]._name].invalidate_cache()
+        parents.invalidate_cache([lines_field])
+        parents.modified([lines_field])
+        parents.recompute()
+        parents.filtered(lambda parent: not parent[lines_field]).unlink()
+        return True
+
+    @api.model
+    def create_archive_partition(self, table, archive_date):
+        """ This method is used to create the archive table and its partition of the month of the archive date.
+            :param table: Name of the archive table.
+            :param archive_date: Date of archiving.
+        """
+        self._cr.execute("""CREATE TABLE IF NOT EXISTS %s (id integer NOT NULL, instance_id integer,
+                                                           create_date timestamp, archive_date date NOT NULL,
+                                                           data jsonb) PARTITION BY RANGE (archive_date)""" % table)
+        month_start = archive_date.replace(day=1)
+        self._cr.execute("""CREATE TABLE IF NOT EXISTS %s_%s PARTITION OF %s FOR VALUES FROM (%%s) TO (%%s)"""
+                         % (table, month_start.strftime("%Y_%m"), table),
+                         (month_start, month_start + relativedelta(months=1)))
+        return True
+
+    @api.model
+    def prepare_queue_line_archive_query(self, table, queue_table, queue_column, archive_table):
+        """ This method is used to prepare the query which moves a batch of done, failed and cancelled queue lines
+            of an instance into the archive table.
+            @return: Query, returning the queue id of every archived line.
+        """
+        return """WITH archived_line AS (
+                    DELETE FROM {table} WHERE id IN (
+                        SELECT queue_line.id FROM {table} AS queue_line
+                        INNER JOIN {queue_table} AS queue ON queue.id = queue_line.{queue_column}
+                        WHERE queue.shopify_instance_id = %(instance_id)s
+                        AND queue_line.state IN ('done', 'failed', 'cancel')
+                        AND queue_line.create_date < %(before_date)s
+                        ORDER BY queue_line.id LIMIT %(limit)s FOR UPDATE OF queue_line SKIP LOCKED)
+                    RETURNING *)
+                  INSERT INTO {archive_table} (id, instance_id, create_date, archive_date, data)
+                  SELECT id, %(instance_id)s, create_date, %(archive_date)s, to_jsonb(archived_line)
+                  FROM archived_line
+                  RETURNING (data ->> '{queue_column}')::integer""".format(table=table, queue_table=queue_table,
+                                                                          queue_column=queue_column,
+                                                                          archive_table=archive_table)
+
+    @api.model
+    def prepare_log_line_archive_query(self):
+        """ This method is used to prepare the query which moves a batch of log lines of the log books of an
+            instance into the archive table.
+            @return: Query, returning the log book id of every archived line.
+        """
+        return """WITH archived_line AS (
+                    DELETE FROM common_log_lines_ept WHERE id IN (
+                        SELECT log_line.id FROM common_log_lines_ept AS log_line
+                        INNER JOIN common_log_book_ept AS log_book ON log_book.id = log_line.log_book_id
+                        WHERE log_book.shopify_instance_id = %(instance_id)s
+                        AND log_line.create_date < %(before_date)s
+                        ORDER BY log_line.id LIMIT %(limit)s FOR UPDATE OF log_line SKIP LOCKED)
+                    RETURNING *)
+                  INSERT INTO {archive_table} (id, instance_id, create_date, archive_date, data)
+                  SELECT id, %(instance_id)s, create_date, %(archive_date)s, to_jsonb(archived_line)
+                  FROM archived_line
+                  RETURNING (data ->> 'log_book_id')::integer""".format(archive_table=LOG_LINE_ARCHIVE_TABLE)
+
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+
+import logging
+import time
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger("Shopify Stock Export Queue")
+
+# Seconds to wait before draining the queue, so the moves of one picking or one batch of orders are exported
+# together.
+STOCK_EXPORT_QUEUE_DELAY = 10
+STOCK_EXPORT_QUEUE_BATCH_SIZE = 500
+
+
+class ShopifyStockExportQueueEpt(models.Model):
+    """
+    Products whose stock changed and which are pending to be exported to Shopify. A product is queued once
+    whatever the number of moves done on it, and removed when its stock is exported.
+    """
+    _name = "shopify.stock.export.queue.ept"
+    _description = "Shopify Pending Stock Export"
+    _order = "id"
+
+    product_id = fields.Many2one("product.product", required=True, ondelete="cascade")
+
+    _sql_constraints = [("product_unique", "unique(product_id)", "Product is already pending for stock export!")]
+
+    @api.model
+    def enqueue_products(self, products):
+        """ This method is used to add products in the pending stock export queue. Only the products exported
+            in a Shopify instance which exports stock on stock moves are queued, and the queue processing cron is
+            triggered shortly after.
+            :param products: Records of product.product.
+        """
+        product_ids = tuple(products.filtered(lambda product: product.type == "product").ids)
+        if not product_ids:
+            return False
+        self._cr.execute("""INSERT INTO shopify_stock_export_queue_ept (product_id, create_uid, create_date,
+                                                                         write_uid, write_date)
+                            SELECT DISTINCT shopify_product.product_id, %s, now() at time zone 'UTC', %s,
+                                            now() at time zone 'UTC'
+                            FROM shopify_product_product_ept AS shopify_product
+                            INNER JOIN shopify_instance_ept AS instance
+                                    ON instance.id = shopify_product.shopify_instance_id
+                            WHERE shopify_product.product_id IN %s AND shopify_product.exported_in_shopify = True
+                                  AND instance.active = True AND instance.shopify_stock_export_on_move = True
+                            ON CONFLICT (product_id) DO NOTHING""", (self.env.uid, self.env.uid, product_ids))
+        if self._cr.rowcount:
+            cron = self.env.ref("shopify_ept.ir_cron_process_shopify_stock_export_queue", False)
+            if cron:
+                cron._trigger(fields.Datetime.now() + timedelta(seconds=STOCK_EXPORT_QUEUE_DELAY))
+        return True
+
+    @api.model
+    def process_stock_export_queue(self):
+        """ This method is used to export the stock of the pending products, in batches, to every Shopify instance
+            which exports stock on stock moves. It will be called from the stock export queue cron.
+            Products are removed from the queue when their batch is taken, so stock moves done meanwhile queue them
+            again. A batch lost in a crash is still exported by the Shopify Auto Export Stock cron.
+        """
+        shopify_product_obj = self.env["shopify.product.product.ept"]
+        instances = self.env["shopify.instance.ept"].search([("shopify_stock_export_on_move", "=", True)])
+        if not instances:
+            return True
+        start = time.time()
+        queue_process_cron_time = instances.get_shopify_cron_execution_time(
+            "shopify_ept.ir_cron_process_shopify_stock_export_queue")
+
+        while True:
+            self._cr.execute("""DELETE FROM shopify_stock_export_queue_ept
+                                WHERE id IN (SELECT id FROM shopify_stock_export_queue_ept ORDER BY id
+                                             LIMIT %s FOR UPDATE SKIP LOCKED)
+                                RETURNING product_id""", (STOCK_EXPORT_QUEUE_BATCH_SIZE,))
+            product_ids = [row[0] for row in self._cr.fetchall()]
+            if not product_ids:
+                return True
+            self._cr.commit()
+            for instance in instances:
+                _logger.info("Exporting stock of %s queued products for instance - %s", len(product_ids),
+                             instance.name)
+                shopify_product_obj.with_context(is_process_from_stock_queue=True).export_stock_in_shopify(
+                    instance, product_ids)
+            self._cr.commit()
+            if time.time() - start > queue_process_cron_time - 60:
+                return True
@@ -5,19 +5,176 @@ import base64
 import hashlib
 import json
 import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dateutil import parser
 import pytz
 
 from odoo import models, fields, api
+from odoo.osv import expression
 from .. import shopify
 from ..shopify.pyactiveresource.connection import ClientError
 
 utc = pytz.utc
 _logger = logging.getLogger("Shopify Template")
 
+IMAGE_DOWNLOAD_WORKERS = 8
+IMAGE_DOWNLOAD_TIMEOUT = 10
+_image_download_local = threading.local()
+
+
+def get_image_download_session():
+    """ Returns the HTTP session of the current thread, which reuses the connections to the image hosts and retries
+        the failed downloads with backoff.
+    """
+    session = getattr(_image_download_local, "session", None)
+    if not session:
+        session = requests.Session()
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+        adapter = HTTPAdapter(max_retries=retry)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _image_download_local.session = session
+    return session
+
+
+def request_shopify_image(image_request):
+    """ Requests an image, without using the ORM. The ETag and Last-Modified of the image downloaded before make the
+        request conditional, so the image host answers 304 without the image when it has not changed.
+        :param image_request: Tuple of URL, ETag and Last-Modified.
+        @return: Response or None when the image can not be requested.
+    """
+    url, etag, last_modified = image_request
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    try:
+        return get_image_download_session().get(url, headers=headers, verify=True, timeout=IMAGE_DOWNLOAD_TIMEOUT)
+    except requests.RequestException as error:
+        _logger.info("Image %s could not be downloaded: %s", url, error)
+        return None
+
+
+def download_shopify_image(url):
+    """ Downloads an image, without using the ORM.
+        @return: Base64 encoded image or None when it can not be downloaded.
+    """
+    response = request_shopify_image((url, None, None))
+    if response is None or response.status_code != 200:
+        return None
+    return base64.b64encode(response.content)
+
+
+def request_shopify_images(image_requests):
+    """ Requests the images concurrently, with a bounded pool of threads.
+        :param image_requests: List of tuples of URL, ETag and Last-Modified.
+        @return: Dictionary of URL and response or None when the image can not be requested.
+    """
+    if not image_requests:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(IMAGE_DOWNLOAD_WORKERS, len(image_requests))) as executor:
+        return {image_request[0]: response for image_request, response in
+                zip(image_requests, executor.map(request_shopify_image, image_requests))}
+
+
+class ShopifyVariantResolver:
+    """ Shopify variants and Odoo products matching the variant ids, SKUs and barcodes of a batch of Shopify products of
+        one instance. It is prepared with one query per model before importing the products and passed in the
+        context. Keys of the variants and products created or changed meanwhile are forgotten, so they are searched in
+        the database again.
+    """
+
+    def __init__(self, instance_id):
+        self.instance_id = instance_id
+        self.variant_ids, self.skus, self.barcodes = set(), set(), set()
+        self.shopify_product_ids = {"variant_id": {}, "default_code": {}, "product_code": {}, "product_barcode": {}}
+        self.product_ids = {"default_code": {}, "barcode": {}}
+
+    def is_resolved(self, variant_id, sku=False, barcode=False):
+        """ Returns True if the variant id, SKU and barcode are known. """
+        if not variant_id or str(variant_id) not in self.variant_ids:
+            return False
+        return (not sku or sku in self.skus) and (not barcode or barcode in self.barcodes)
+
+    def forget(self, keys):
+        """ Forgets the keys of created or changed records.
+            :param keys: Iterable of tuples of variant id, SKU, SKU of the product, barcode of the product and active.
+        """
+        for variant_id, sku, product_sku, barcode, _active in keys:
+            self.variant_ids.discard(variant_id and str(variant_id))
+            self.skus.difference_update({sku, product_sku})
+            self.barcodes.discard(barcode)
+
+    def forget_changed(self, keys_before, keys_after):
+        """ Forgets the keys of the records changed by a write.
+            :param keys_before: Dictionary of record id and its keys before the write.
+            :param keys_after: Dictionary of record id and its keys after the write.
+        """
+        changed_ids = [record_id for record_id, keys in keys_before.items() if keys != keys_after.get(record_id)]
+        self.forget([keys_before[record_id] for record_id in changed_ids] +
+                    [keys_after[record_id] for record_id in changed_ids if record_id in keys_after])
+
+    def search_variant(self, sync_product_with, variant_id, sku, barcode):
+        """ Matches the Shopify variant and the Odoo product the same way as shopify_search_odoo_product_variant.
+            @return: Tuple of ids of Shopify variant and Odoo product, False when not found.
+        """
+        shopify_product_id = self.shopify_product_ids["variant_id"].get(str(variant_id), False)
+        product_id = False
+        if sync_product_with == "sku" and sku:
+            shopify_product_id, product_id = self.search_variant_by_sku(shopify_product_id, sku)
+        elif sync_product_with == "barcode" and barcode:
+            shopify_product_id, product_id = self.search_variant_by_barcode(shopify_product_id, barcode)
+        elif sync_product_with == "sku_or_barcode":
+            if sku:
+                shopify_product_id, product_id = self.search_variant_by_sku(shopify_product_id, sku)
+            if not product_id and not shopify_product_id and barcode:
+                shopify_product_id, product_id = self.search_variant_by_barcode(shopify_product_id, barcode)
+        return shopify_product_id, product_id
+
+    def search_variant_by_sku(self, shopify_product_id, sku):
+        """ Matches the Shopify variant without variant id, or else the Odoo product, by the SKU. """
+        shopify_product_ids = self.shopify_product_ids
+        shopify_product_id = shopify_product_id or shopify_product_ids["default_code"].get(sku) or \
+            shopify_product_ids["product_code"].get(sku, False)
+        if shopify_product_id:
+            return shopify_product_id, False
+        return False, self.product_ids["default_code"].get(sku, False)
+
+    def search_variant_by_barcode(self, shopify_product_id, barcode):
+        """ Matches the Shopify variant, or else the Odoo product, by the barcode. """
+        shopify_product_id = shopify_product_id or self.shopify_product_ids["product_barcode"].get(barcode, False)
+        if shopify_product_id:
+            return shopify_product_id, False
+        return False, self.product_ids["barcode"].get(barcode, False)
+
+
+class ShopifyAttributeResolver:
+    """ Ids of the product attributes and attribute values named by the options of a batch of Shopify products. It is
+        prepared with one query per model before importing the products and passed in the context. Attributes and
+        values created meanwhile are added to it. Names are compared in lowercase, as they are searched with =ilike.
+    """
+
+    def __init__(self):
+        self.attribute_names = set()
+        self.value_names = set()
+        self.attribute_ids = {}
+        self.value_ids = {}
+
+    def add_attribute(self, attribute):
+        """ Adds the attribute to the attributes of its name. """
+        self.attribute_ids.setdefault(attribute.name.lower(), []).append((attribute.id, attribute.create_variant))
+
+    def add_attribute_value(self, attribute_value):
+        """ Adds the attribute value to the values of its attribute. """
+        self.value_ids.setdefault((attribute_value.attribute_id.id, attribute_value.name.lower()), attribute_value.id)
+
 
 class ProductCategory(models.Model):
     """
@@ -99,12 +256,10 @@ class ShopifyProductTemplateEpt(models.Model):
         return: template_attribute_value_domain data type list
         @change: Maulik Barad on Date 04-Sep-2020.
         """
-        product_attribute_obj = self.env["product.attribute"]
-
         product_attribute_list = []
 
         for attribute in template_options:
-            product_attribute = product_attribute_obj.get_attribute(attribute.get("name"), auto_create=True)[0]
+            product_attribute = self.get_shopify_attribute(attribute.get("name"), auto_create=True)
             product_attribute_list.append(product_attribute.id)
 
         template_attribute_value_domain = self.prepare_template_attribute_value_domain(product_attribute_list, variant,
@@ -121,24 +276,20 @@ class ShopifyProductTemplateEpt(models.Model):
             Task_id: 167537
         """
         template_attribute_value_domain = []
-        product_attribute_value_obj = self.env["product.attribute.value"]
-        product_template_attribute_value_obj = self.env["product.template.attribute.value"]
+        template_attribute_value_ids = self.get_template_attribute_value_ids(product_template_id)
         counter = 0
         for product_attribute in product_attribute_list:
             counter += 1
             attribute_name = "option" + str(counter)
             attribute_val = variant.get(attribute_name)
-            product_attribute_value = product_attribute_value_obj.get_attribute_values(attribute_val, product_attribute,
-                                                                                       auto_create=True)
+            product_attribute_value = self.get_shopify_attribute_value(attribute_val, product_attribute,
+                                                                       auto_create=True)
 
             if product_attribute_value:
-                product_attribute_value = product_attribute_value[0]
-                template_attribute_value_id = product_template_attribute_value_obj.search(
-                    [("product_attribute_value_id", "=", product_attribute_value.id),
-                     ("attribute_id", "=", product_attribute),
-                     ("product_tmpl_id", "=", product_template_id)], limit=1)
+                template_attribute_value_id = template_attribute_value_ids.get((product_attribute,
+                                                                                product_attribute_value.id))
                 if template_attribute_value_id:
-                    domain = ("product_template_attribute_value_ids", "=", template_attribute_value_id.id)
+                    domain = ("product_template_attribute_value_ids", "=", template_attribute_value_id)
                     template_attribute_value_domain.append(domain)
 
         return template_attribute_value_domain
@@ -618,7 +769,6 @@ class ShopifyProductTemplateEpt(models.Model):
         If new attribute is not added then we can add value and generate new variant in Odoo.
         @author: Maulik Barad on Date 04-Sep-2020.
         """
-        product_attribute_value_obj = self.env["product.attribute.value"]
         odoo_product_obj = self.env["product.product"]
 
         counter = 0
@@ -639,9 +789,7 @@ class ShopifyProductTemplateEpt(models.Model):
 
                 attribute_id = odoo_attribute_lines.filtered(
                     lambda x: x.display_name == shopify_attribute.get("name")).attribute_id.id
-                value_id = \
-                    product_attribute_value_obj.get_attribute_values(attribute_value, attribute_id, auto_create=True)[
-                        0].id
+                value_id = self.get_shopify_attribute_value(attribute_value, attribute_id, auto_create=True).id
 
                 attribute_line = odoo_attribute_lines.filtered(lambda x: x.attribute_id.id == attribute_id)
                 if value_id not in attribute_line.value_ids.ids:
@@ -666,9 +814,6 @@ class ShopifyProductTemplateEpt(models.Model):
         @param shopify_attributes: Attribute data of shopify template.
         @param variant_data: Data of variant.
         """
-        product_attribute_obj = self.env['product.attribute']
-        product_attribute_value_obj = self.env['product.attribute.value']
-
         attribute_line_data = []
         counter = 0
 
@@ -677,11 +822,10 @@ class ShopifyProductTemplateEpt(models.Model):
             attribute_name = "option" + str(counter)
             shopify_attribute_value = variant_data.get(attribute_name)
 
-            attribute = product_attribute_obj.get_attribute(shopify_attribute.get("name"), auto_create=True)
-            attribute_value = product_attribute_value_obj.get_attribute_values(shopify_attribute_value, attribute.id,
-                                                                               auto_create=True)
+            attribute = self.get_shopify_attribute(shopify_attribute.get("name"), auto_create=True)
+            attribute_value = self.get_shopify_attribute_value(shopify_attribute_value, attribute.id,
+                                                               auto_create=True)
             if attribute_value:
-                attribute_value = attribute_value[0]
                 attribute_line_vals = (
                     0, False, {'attribute_id': attribute.id, 'value_ids': [[6, False, attribute_value.ids]]})
                 attribute_line_data.append(attribute_line_vals)
@@ -713,7 +857,7 @@ class ShopifyProductTemplateEpt(models.Model):
 
         return shopify_product
 
-    def shopify_sync_product_images(self, template_data):
+    def shopify_sync_product_images(self, template_data, downloaded_images=None):
         """
         Author: Bhavesh Jadav 18/12/2019
         This method use for sync image from store and the add reference in shopify.product.image.ept
@@ -730,17 +874,16 @@ class ShopifyProductTemplateEpt(models.Model):
         removed in layer. So far, when no images come in response, those were not removing
         from layer.
         @version: Shopify 13.0.0.23
+
+        @change: The images missing in the image layer are taken from the downloaded images or downloaded together
+        before syncing them, the images of a batch of templates can be passed in downloaded_images.
         """
         shopify_product_image_obj = shopify_product_images = self.env["shopify.product.image.ept"]
-        existing_common_template_images = {}
+        if downloaded_images is None:
+            downloaded_images = self.env["shopify.image.index.ept"].get_shopify_images(
+                self.prepare_shopify_images_to_sync(template_data))
         is_template_image_set = bool(self.product_tmpl_id.image_1920)
-        for odoo_image in self.product_tmpl_id.ept_image_ids:
-            if not odoo_image.image:
-                continue
-            key = hashlib.md5(odoo_image.image).hexdigest()
-            if not key:
-                continue
-            existing_common_template_images.update({key: odoo_image.id})
+        existing_common_template_images = self.prepare_common_image_checksums(self.product_tmpl_id.ept_image_ids)
         for image in template_data.get("images", {}):
             if image.get("src"):
                 shopify_image_id = str(image.get("id"))
@@ -750,11 +893,13 @@ class ShopifyProductTemplateEpt(models.Model):
                 if not variant_ids:
                     # below method is used to sync simple product images.
                     shopify_product_images += self.sync_simple_product_images(shopify_image_id,
-                                                                              existing_common_template_images, url)
+                                                                              existing_common_template_images, url,
+                                                                              downloaded_images)
                 else:
                     # The below method is used to sync variable(variation) product images.
                     shopify_product_images += self.sync_variable_product_images(shopify_image_id, url, variant_ids,
-                                                                                is_template_image_set)
+                                                                                is_template_image_set,
+                                                                                downloaded_images)
 
         all_shopify_product_images = shopify_product_image_obj.search([("shopify_template_id",
                                                                         "=", self.id)])
@@ -763,7 +908,39 @@ class ShopifyProductTemplateEpt(models.Model):
         _logger.info("Images Updated for shopify %s", self.name)
         return True
 
-    def sync_simple_product_images(self, shopify_image_id, existing_common_template_images, url):
+    def prepare_shopify_images_to_sync(self, template_data):
+        """ This method is used to get the images of the template which are not in the image layer.
+            :param template_data: Data of Shopify Template.
+            @return: List of image responses.
+        """
+        images = [image for image in template_data.get("images", {}) if image.get("src")]
+        if not images:
+            return []
+        synced_image_ids = {image["shopify_image_id"] for image in self.env["shopify.product.image.ept"].search_read(
+            [("shopify_image_id", "in", [str(image.get("id")) for image in images]), "|",
+             ("shopify_template_id", "=", self.id), ("shopify_variant_id", "in", self.shopify_product_ids.ids)],
+            ["shopify_image_id"])}
+        return [image for image in images if str(image.get("id")) not in synced_image_ids]
+
+    def prepare_common_image_checksums(self, common_images):
+        """ This method is used to prepare the dictionary of the common images by their stored checksum, without
+            reading the images.
+            :param common_images: Records of common product images.
+            @return: Dictionary of checksum and id of common product image.
+        """
+        return {common_image.shopify_image_checksum: common_image.id for common_image in common_images
+                if common_image.shopify_image_checksum}
+
+    def get_shopify_image(self, url, downloaded_images):
+        """ This method is used to get the image of the URL from the downloaded images, or to download it.
+            @return: Base64 encoded image or None.
+        """
+        if downloaded_images and url in downloaded_images:
+            return downloaded_images[url]
+        return download_shopify_image(url)
+
+    def sync_simple_product_images(self, shopify_image_id, existing_common_template_images, url,
+                                   downloaded_images=None):
         """
         This method is used to create images in the Shopify image layer and common product image layer for the
         simple product.
@@ -776,9 +953,8 @@ class ShopifyProductTemplateEpt(models.Model):
         shopify_product_image = self.search_shopify_product_images(self.id, False, shopify_image_id, False)
         if not shopify_product_image:
             try:
-                response = requests.get(url, stream=True, verify=True, timeout=10)
-                if response.status_code == 200:
-                    image = base64.b64encode(response.content)
+                image = self.get_shopify_image(url, downloaded_images)
+                if image:
                     key = hashlib.md5(image).hexdigest()
                     if key in existing_common_template_images.keys():
                         shopify_product_image = self.create_shopify_layer_image(shopify_image_id,
@@ -787,8 +963,9 @@ class ShopifyProductTemplateEpt(models.Model):
                     else:
                         if not self.product_tmpl_id.image_1920:
                             self.product_tmpl_id.image_1920 = image
+                            checksum = hashlib.md5(self.product_tmpl_id.image_1920).hexdigest()
                             common_product_image = self.product_tmpl_id.ept_image_ids.filtered(
-                                lambda x: x.image == self.product_tmpl_id.image_1920)
+                                lambda x: x.shopify_image_checksum == checksum)
                         else:
                             common_product_image = self.create_common_product_image(image, url, False)
                         shopify_product_image = self.search_shopify_product_images(self.id, False, False,
@@ -855,7 +1032,8 @@ class ShopifyProductTemplateEpt(models.Model):
         })
         return common_product_image
 
-    def sync_variable_product_images(self, shopify_image_id, url, variant_ids, is_template_image_set):
+    def sync_variable_product_images(self, shopify_image_id, url, variant_ids, is_template_image_set,
+                                     downloaded_images=None):
         """ This method is used to sync images of the variable products.
             :param variant_ids: An array of variant ids associated with the image.
             :param is_template_image_set: It is used to identify that the odoo template has already image set or not.
@@ -865,21 +1043,14 @@ class ShopifyProductTemplateEpt(models.Model):
         shopify_product_images = self.env["shopify.product.image.ept"]
         shopify_products = self.shopify_product_ids.filtered(lambda x: int(x.variant_id) in variant_ids)
         for shopify_product in shopify_products:
-            existing_common_variant_images = {}
-            for odoo_image in shopify_product.product_id.ept_image_ids:
-                if not odoo_image.image:
-                    continue
-                key = hashlib.md5(odoo_image.image).hexdigest()
-                if not key:
-                    continue
-                existing_common_variant_images.update({key: odoo_image.id})
+            existing_common_variant_images = self.prepare_common_image_checksums(
+                shopify_product.product_id.ept_image_ids)
             shopify_product_image = self.search_shopify_product_images(False, shopify_product.id, shopify_image_id,
                                                                        False)
             if not shopify_product_image:
                 try:
-                    response = requests.get(url, stream=True, verify=True, timeout=10)
-                    if response.status_code == 200:
-                        image = base64.b64encode(response.content)
+                    image = self.get_shopify_image(url, downloaded_images)
+                    if image:
                         key = hashlib.md5(image).hexdigest()
                         if key in existing_common_variant_images.keys():
                             shopify_product_image = self.create_shopify_layer_image(shopify_image_id,
@@ -888,8 +1059,9 @@ class ShopifyProductTemplateEpt(models.Model):
                         else:
                             if not shopify_product.product_id.image_1920 or not is_template_image_set:
                                 shopify_product.product_id.image_1920 = image
+                                checksum = hashlib.md5(shopify_product.product_id.image_1920).hexdigest()
                                 common_product_image = shopify_product.product_id.ept_image_ids.filtered(
-                                    lambda x: x.image == shopify_product.product_id.image_1920)
+                                    lambda x: x.shopify_image_checksum == checksum)
 
                             else:
                                 common_product_image = self.create_common_product_image(image, url, shopify_product)
@@ -974,6 +1146,13 @@ class ShopifyProductTemplateEpt(models.Model):
         odoo_product = self.env["product.product"]
         shopify_product_obj = self.env["shopify.product.product.ept"]
 
+        variant_resolver = self.get_shopify_variant_resolver(shopify_instance)
+        if variant_resolver and variant_resolver.is_resolved(variant_id, product_sku, barcode):
+            shopify_product_id, odoo_product_id = variant_resolver.search_variant(
+                shopify_instance.shopify_sync_product_with, variant_id, product_sku, barcode)
+            shopify_product = shopify_product_obj.browse(shopify_product_id)
+            return shopify_product, odoo_product.browse(odoo_product_id) or shopify_product.product_id
+
         shopify_product = shopify_product_obj.search([("variant_id", "=", variant_id),
                                                       ("shopify_instance_id", "=", shopify_instance.id)],
                                                      limit=1)
@@ -1027,6 +1206,208 @@ class ShopifyProductTemplateEpt(models.Model):
 
         return shopify_product, odoo_product
 
+    def prepare_shopify_variant_resolver(self, instance, templates_data):
+        """ This method is used to search the Shopify variants and Odoo products matching the variant ids, SKUs and
+            barcodes of the products with one query each, instead of searching them for every variant.
+            :param instance: Record of instance.
+            :param templates_data: List of product responses.
+            @return: ShopifyVariantResolver of the instance.
+        """
+        variant_resolver = ShopifyVariantResolver(instance.id)
+        variant_ids, skus, barcodes = set(), set(), set()
+        for template_data in templates_data:
+            for variant in template_data.get("variants") or []:
+                if variant.get("id"):
+                    variant_ids.add(str(variant.get("id")))
+                if variant.get("sku"):
+                    skus.add(variant.get("sku"))
+                if variant.get("barcode"):
+                    barcodes.add(variant.get("barcode"))
+
+        # Archived products are read too, as the searches through product_id of the Shopify variants find them.
+        products = self.env["product.product"].with_context(active_test=False).search(
+            ["|", ("default_code", "in", list(skus)), ("barcode", "in", list(barcodes))]) if skus or barcodes else []
+        for product in products:
+            if not product.active:
+                continue
+            if product.default_code in skus:
+                variant_resolver.product_ids["default_code"].setdefault(product.default_code, product.id)
+            if product.barcode in barcodes:
+                variant_resolver.product_ids["barcode"].setdefault(product.barcode, product.id)
+
+        shopify_products = self.env["shopify.product.product.ept"].search(
+            [("shopify_instance_id", "=", instance.id), "|", "|", ("variant_id", "in", list(variant_ids)),
+             ("default_code", "in", list(skus)), ("product_id", "in", [product.id for product in products])])
+        shopify_product_ids = variant_resolver.shopify_product_ids
+        for shopify_product in shopify_products:
+            product = shopify_product.product_id
+            if shopify_product.variant_id:
+                shopify_product_ids["variant_id"].setdefault(shopify_product.variant_id, shopify_product.id)
+            else:
+                if shopify_product.default_code in skus:
+                    shopify_product_ids["default_code"].setdefault(shopify_product.default_code, shopify_product.id)
+                if product.default_code in skus:
+                    shopify_product_ids["product_code"].setdefault(product.default_code, shopify_product.id)
+            if product.barcode in barcodes:
+                shopify_product_ids["product_barcode"].setdefault(product.barcode, shopify_product.id)
+
+        variant_resolver.variant_ids, variant_resolver.skus, variant_resolver.barcodes = variant_ids, skus, barcodes
+        return variant_resolver
+
+    def prepare_shopify_attribute_resolver(self, templates_data):
+        """ This method is used to search the attributes and attribute values of the options of the products with one
+            query each. Missing attributes and values are created later, for the templates which are created.
+            :param templates_data: List of product responses.
+            @return: ShopifyAttributeResolver.
+        """
+        product_attribute_obj = self.env["product.attribute"]
+        product_attribute_value_obj = self.env["product.attribute.value"]
+        attribute_resolver = ShopifyAttributeResolver()
+        options = self.prepare_shopify_attribute_options(templates_data)
+        if not options:
+            return attribute_resolver
+
+        for attribute in product_attribute_obj.search(
+                expression.OR([[("name", "=ilike", name)] for name, _values in options.values()])):
+            attribute_resolver.add_attribute(attribute)
+        attribute_resolver.attribute_names.update(options)
+
+        attribute_values = {}
+        for key, (_name, values) in options.items():
+            for attribute_id, _create_variant in attribute_resolver.attribute_ids.get(key, []):
+                attribute_values.setdefault(attribute_id, {}).update(values)
+        value_names = {value for values in attribute_values.values() for value in values.values()}
+        if value_names:
+            for attribute_value in product_attribute_value_obj.search(
+                    [("attribute_id", "in", list(attribute_values))] +
+                    expression.OR([[("name", "=ilike", value)] for value in value_names])):
+                attribute_resolver.add_attribute_value(attribute_value)
+        attribute_resolver.value_names.update((attribute_id, key) for attribute_id, values in attribute_values.items()
+                                              for key in values)
+        return attribute_resolver
+
+    def prepare_shopify_attribute_options(self, templates_data):
+        """ This method is used to collect the option names and values of the products, by their lowercase name.
+            Names with the wildcards of =ilike are left out.
+            :param templates_data: List of product responses.
+            @return: Dictionary of lowercase option name and tuple of name and dictionary of lowercase value and value.
+        """
+        options = {}
+        for template_data in templates_data:
+            for option in template_data.get("options") or []:
+                if not option.get("name") or self.is_shopify_attribute_pattern(option.get("name")):
+                    continue
+                option_values = options.setdefault(option.get("name").lower(), (option.get("name"), {}))[1]
+                for value in option.get("values") or []:
+                    if value and not self.is_shopify_attribute_pattern(value):
+                        option_values.setdefault(value.lower(), value)
+        return options
+
+    def create_shopify_template_attributes(self, template_data):
+        """ This method is used to create the missing attributes and attribute values of the options of a product
+            which template is created, with one create each. Options not known by the attribute resolver are left to
+            the get_shopify_attribute and get_shopify_attribute_value methods.
+            :param template_data: Product response.
+        """
+        product_attribute_obj = self.env["product.attribute"]
+        product_attribute_value_obj = self.env["product.attribute.value"]
+        attribute_resolver = self._context.get("shopify_attribute_resolver")
+        if not attribute_resolver:
+            return False
+        options = {key: option for key, option in self.prepare_shopify_attribute_options([template_data]).items()
+                   if key in attribute_resolver.attribute_names}
+
+        missing_names = [key for key in options if not any(
+            create_variant == "always" for _attribute_id, create_variant in
+            attribute_resolver.attribute_ids.get(key, []))]
+        if missing_names:
+            attributes = product_attribute_obj.create([{"name": options[key][0], "create_variant": "always",
+                                                        "display_type": "radio"} for key in missing_names])
+            for key, attribute in zip(missing_names, attributes):
+                attribute_resolver.add_attribute(attribute)
+                # A new attribute has no values.
+                attribute_resolver.value_names.update((attribute.id, value_key) for value_key in options[key][1])
+
+        missing_values = []
+        for key, (_name, values) in options.items():
+            attribute_id = next(attribute_id for attribute_id, create_variant in attribute_resolver.attribute_ids[key]
+                                if create_variant == "always")
+            missing_values += [{"name": value, "attribute_id": attribute_id} for value_key, value in values.items()
+                               if (attribute_id, value_key) in attribute_resolver.value_names and
+                               (attribute_id, value_key) not in attribute_resolver.value_ids]
+        for attribute_value in product_attribute_value_obj.create(missing_values):
+            attribute_resolver.add_attribute_value(attribute_value)
+        return True
+
+    @staticmethod
+    def is_shopify_attribute_pattern(name):
+        """ Names with the wildcards of =ilike are always searched in the database. """
+        return not isinstance(name, str) or "%" in name or "_" in name
+
+    def get_shopify_attribute(self, name, auto_create=False, create_variant="always"):
+        """ This method is used to get the attribute of the name, from the attribute resolver when it is known, else
+            the same way as the get_attribute method of the product attribute.
+            :param create_variant: Variants creation mode of the attribute, False to get the attribute of any mode.
+            @return: Record of product attribute, empty when not found.
+        """
+        product_attribute_obj = self.env["product.attribute"]
+        attribute_resolver = self._context.get("shopify_attribute_resolver")
+        if not attribute_resolver or self.is_shopify_attribute_pattern(name) or \
+                name.lower() not in attribute_resolver.attribute_names:
+            if not create_variant:
+                return product_attribute_obj.search([("name", "=ilike", name)], limit=1)
+            return product_attribute_obj.get_attribute(name, create_variant=create_variant,
+                                                       auto_create=auto_create)[:1]
+
+        attribute_ids = [attribute_id for attribute_id, attribute_create_variant in
+                         attribute_resolver.attribute_ids.get(name.lower(), [])
+                         if not create_variant or attribute_create_variant == create_variant]
+        if not attribute_ids and auto_create and create_variant:
+            attribute = product_attribute_obj.get_attribute(name, create_variant=create_variant, auto_create=True)[:1]
+            attribute_resolver.add_attribute(attribute)
+            return attribute
+        return product_attribute_obj.browse(attribute_ids[:1])
+
+    def get_shopify_attribute_value(self, name, attribute_id, auto_create=False):
+        """ This method is used to get the attribute value of the name, from the attribute resolver when it is known,
+            else the same way as the get_attribute_values method of the product attribute value.
+            @return: Record of product attribute value, empty when not found.
+        """
+        product_attribute_value_obj = self.env["product.attribute.value"]
+        attribute_resolver = self._context.get("shopify_attribute_resolver")
+        if not attribute_resolver or self.is_shopify_attribute_pattern(name) or \
+                (attribute_id, name.lower()) not in attribute_resolver.value_names:
+            return product_attribute_value_obj.get_attribute_values(name, attribute_id, auto_create=auto_create)[:1]
+
+        attribute_value_id = attribute_resolver.value_ids.get((attribute_id, name.lower()))
+        if not attribute_value_id and auto_create:
+            attribute_value = product_attribute_value_obj.get_attribute_values(name, attribute_id,
+                                                                               auto_create=True)[:1]
+            attribute_resolver.add_attribute_value(attribute_value)
+            return attribute_value
+        return product_attribute_value_obj.browse(attribute_value_id)
+
+    def get_template_attribute_value_ids(self, product_template_id):
+        """ This method is used to search the attribute values of the template with one query.
+            @return: Dictionary of attribute id and attribute value id with the template attribute value id.
+        """
+        template_attribute_value_ids = {}
+        for template_attribute_value in self.env["product.template.attribute.value"].search(
+                [("product_tmpl_id", "=", product_template_id)]):
+            template_attribute_value_ids.setdefault((template_attribute_value.attribute_id.id,
+                                                     template_attribute_value.product_attribute_value_id.id),
+                                                    template_attribute_value.id)
+        return template_attribute_value_ids
+
+    def get_shopify_variant_resolver(self, instance):
+        """ This method is used to get the variant resolver of the products being imported for the instance, if any.
+            @return: ShopifyVariantResolver or None.
+        """
+        variant_resolver = self._context.get("shopify_variant_resolver")
+        if variant_resolver and variant_resolver.instance_id == instance.id:
+            return variant_resolver
+        return None
+
     def create_or_update_shopify_template(self, template_dict, variant_length, shopify_template, odoo_product=False,
                                           odoo_template=False):
         """
@@ -1074,10 +1455,10 @@ class ShopifyProductTemplateEpt(models.Model):
         variants = template_data.get("variants")
         template_title = template_data.get("title", "")
         template_id = template_data.get("id", "")
+        variant_resolver = self.get_shopify_variant_resolver(instance)
 
         shopify_skus = []
         shopify_barcodes = []
-        shopify_product_ids_list = []
         for variant in variants:
             variant_id = variant.get("id") or False
             sku = variant.get("sku", "")
@@ -1085,14 +1466,15 @@ class ShopifyProductTemplateEpt(models.Model):
             sku and shopify_skus.append(sku)
             barcode and shopify_barcodes.append(barcode)
             if barcode:
-                duplicate_barcode = odoo_product_obj.search([("barcode", "=", barcode)])
-                shopify_variant = shopify_product_obj.search([
-                    ("shopify_instance_id", "=", instance.id),
-                    ("variant_id", "=", variant_id)])
-                shopify_product_ids = shopify_product_obj.search(
-                    [("shopify_instance_id", "=", instance.id), ("exported_in_shopify", "=", False),
-                     ('product_id.barcode', '=', barcode)])
-                shopify_product_ids_list.append(shopify_product_ids)
+                if variant_resolver and variant_resolver.is_resolved(variant_id, barcode=barcode):
+                    duplicate_barcode = odoo_product_obj.browse(variant_resolver.product_ids["barcode"].get(barcode))
+                    shopify_variant = shopify_product_obj.browse(
+                        variant_resolver.shopify_product_ids["variant_id"].get(str(variant_id)))
+                else:
+                    duplicate_barcode = odoo_product_obj.search([("barcode", "=", barcode)])
+                    shopify_variant = shopify_product_obj.search([
+                        ("shopify_instance_id", "=", instance.id),
+                        ("variant_id", "=", variant_id)])
                 if duplicate_barcode and shopify_variant and shopify_variant.product_id and \
                         shopify_variant.product_id.id != duplicate_barcode.id:
                     message = "Duplicate barcode(%s) found in Product: %s and ID: %s." % (barcode, template_title,
@@ -1120,7 +1502,7 @@ class ShopifyProductTemplateEpt(models.Model):
 
         if not odoo_product and not shopify_product and instance.shopify_sync_product_with in ["barcode",
                                                                                                "sku_or_barcode"]:
-            if not shopify_product_ids_list:
+            if not shopify_barcodes:
                 message = "Duplicate barcode found in Product: %s and ID: %s." % (template_title, template_id)
                 return message
 
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+
+import base64
+import hashlib
+import hmac
+import logging
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger("Shopify Webhook Event")
+
+# Shopify retries a webhook during 48 hours, received webhook ids are kept a bit longer.
+WEBHOOK_EVENT_RETENTION_DAYS = 3
+
+
+class ShopifyWebhookEventEpt(models.Model):
+    """
+    Ids of the webhooks received from Shopify. Shopify delivers a webhook again when Odoo answers slowly, the
+    webhook id is the same for every delivery, so the deliveries after the first one are skipped.
+    """
+    _name = "shopify.webhook.event.ept"
+    _description = "Shopify Received Webhook"
+    _order = "id desc"
+
+    webhook_event_id = fields.Char("Webhook Id", required=True, help="X-Shopify-Webhook-Id of the webhook.")
+    topic = fields.Char(help="X-Shopify-Topic of the webhook.")
+    instance_id = fields.Many2one("shopify.instance.ept", "Shopify Instance", required=True, ondelete="cascade")
+
+    _sql_constraints = [("webhook_event_unique", "unique(instance_id, webhook_event_id)",
+                         "Webhook is already received!")]
+
+    @api.model
+    def verify_shopify_webhook(self, shared_secret, data, hmac_header):
+        """ This method is used to verify that the webhook is sent by Shopify, by its HMAC signed with the secret
+            key of the instance.
+            :param shared_secret: Secret key of the instance.
+            :param data: Raw body of the webhook request.
+            :param hmac_header: X-Shopify-Hmac-Sha256 of the webhook.
+            @return: True if the webhook is valid.
+        """
+        if not hmac_header or not shared_secret:
+            return False
+        digest = hmac.new(shared_secret.encode("utf-8"), data, hashlib.sha256).digest()
+        return hmac.compare_digest(base64.b64encode(digest), hmac_header.encode("utf-8"))
+
+    @api.model
+    def register_shopify_webhook_event(self, instance, webhook_event_id, topic):
+        """ This method is used to record the id of a received webhook.
+            :param webhook_event_id: X-Shopify-Webhook-Id of the webhook.
+            :param topic: X-Shopify-Topic of the webhook.
+            @return: True if the webhook is received for the first time.
+        """
+        if not webhook_event_id:
+            return True
+        self._cr.execute("""INSERT INTO shopify_webhook_event_ept (webhook_event_id, topic, instance_id, create_uid,
+                                                                    create_date, write_uid, write_date)
+                            VALUES (%s, %s, %s, %s, now() at time zone 'UTC', %s, now() at time zone 'UTC')
+                            ON CONFLICT (instance_id, webhook_event_id) DO NOTHING""",
+                         (webhook_event_id, topic, instance.id, self.env.uid, self.env.uid))
+        return bool(self._cr.rowcount)
+
+    @api.autovacuum
+    def _gc_shopify_webhook_events(self):
+        """ Deletes the ids of the webhooks which Shopify does not deliver anymore. """
+        self._cr.execute("""DELETE FROM shopify_webhook_event_ept
+                            WHERE create_date < now() at time zone 'UTC' - %s * interval '1 day'""",
+                         (WEBHOOK_EVENT_RETENTION_DAYS,))
+        _logger.info("Deleted %s received Shopify webhook ids.", self._cr.rowcount)
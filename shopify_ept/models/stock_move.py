@@ -22,4 +22,30 @@ class StockMove(models.Model):
         for picking in self.picking_id:
             if not picking.shopify_instance_id and picking.sale_id and picking.sale_id.shopify_instance_id:
                 picking.write({'shopify_instance_id':picking.sale_id.shopify_instance_id.id})
+        self.env["shopify.stock.export.queue.ept"].enqueue_products(self.product_id)
         return res
+
+    def _action_confirm(self, merge=True, merge_into=False):
+        """Queue the products for stock export as their forecasted quantity changes."""
+        moves = super(StockMove, self)._action_confirm(merge=merge, merge_into=merge_into)
+        self.env["shopify.stock.export.queue.ept"].enqueue_products(moves.product_id)
+        return moves
+
+    def _do_unreserve(self):
+        """Queue the products for stock export as their free quantity changes."""
+        res = super(StockMove, self)._do_unreserve()
+        self.env["shopify.stock.export.queue.ept"].enqueue_products(self.product_id)
+        return res
+
+    def _action_cancel(self):
+        """Queue the products for stock export as their forecasted quantity changes."""
+        res = super(StockMove, self)._action_cancel()
+        self.env["shopify.stock.export.queue.ept"].enqueue_products(self.product_id)
+        return res
+
+    def _action_done(self, cancel_backorder=False):
+        """Queue the products for stock export as their on hand quantity changes. Inventory adjustments of
+        quants are applied through done moves as well."""
+        moves = super(StockMove, self)._action_done(cancel_backorder=cancel_backorder)
+        self.env["shopify.stock.export.queue.ept"].enqueue_products(self.product_id | moves.product_id)
+        return moves
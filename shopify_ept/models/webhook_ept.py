@@ -3,12 +3,16 @@
 
 import logging
 
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import UserError
 from .. import shopify
 
 _logger = logging.getLogger("Shopify Webhook")
 
+# Fields of the instance and the webhook used to resolve the webhook requests.
+WEBHOOK_RESOLVER_INSTANCE_FIELDS = {"shopify_host", "shopify_shared_secret", "active"}
+WEBHOOK_RESOLVER_WEBHOOK_FIELDS = {"state", "delivery_url", "instance_id"}
+
 class ShopifyWebhookEpt(models.Model):
     _name = "shopify.webhook.ept"
     _description = 'Shopify Webhook'
@@ -51,9 +55,32 @@ class ShopifyWebhookEpt(models.Model):
                     raise UserError(_("Something went wrong while deleting the webhook."))
             _logger.info("Deleted %s webhook from Odoo.", record.webhook_action)
         unlink_main = super(ShopifyWebhookEpt, self).unlink()
+        self.clear_caches()
         self.deactivate_auto_create_webhook(instance)
         return unlink_main
 
+    def write(self, vals):
+        """ Clears the cache of the webhook requests resolution, when a field used by it changes. """
+        res = super(ShopifyWebhookEpt, self).write(vals)
+        if WEBHOOK_RESOLVER_WEBHOOK_FIELDS.intersection(vals):
+            self.clear_caches()
+        return res
+
+    @api.model
+    @tools.ormcache("host", "route")
+    def resolve_shopify_webhook(self, host, route):
+        """ This method is used to find the instance and the webhook of a webhook request. It is cached per shop
+            domain and route, the cache is cleared when the instances or the webhooks change.
+            :param host: X-Shopify-Shop-Domain of the request.
+            :param route: Route of the request.
+            @return: Id of instance, id of webhook, True if both are active and secret key of the instance.
+        """
+        instance = self.env["shopify.instance.ept"].sudo().with_context(active_test=False).search(
+            [("shopify_host", "ilike", host)], limit=1)
+        webhook = self.sudo().search([("delivery_url", "ilike", route), ("instance_id", "=", instance.id)], limit=1)
+        is_active = bool(instance.active and webhook.state == "active")
+        return instance.id, webhook.id, is_active, instance.shopify_shared_secret
+
     def deactivate_auto_create_webhook(self, instance):
         """ This method is used to for deactivate the webhook for shopify configuration if webhook are delete from
             shopify instance.
@@ -92,6 +119,7 @@ class ShopifyWebhookEpt(models.Model):
             raise UserError(_('Webhook is already created with the same action.'))
 
         result = super(ShopifyWebhookEpt, self).create(values)
+        self.clear_caches()
         result.get_webhook()
         return result
 
@@ -9,6 +9,7 @@ from six.moves import urllib
 import six
 
 from .collection import PaginatedCollection
+from .limits import CallLimiter
 from . pyactiveresource.collection import Collection
 
 # Store the response from the last request in the connection object
@@ -20,14 +21,33 @@ class ShopifyConnection(pyactiveresource.connection.Connection):
     def __init__(self, site, user=None, password=None, timeout=None, format=formats.JSONFormat):
         super(ShopifyConnection, self).__init__(site, user, password, timeout, format)
 
-    def _open(self, *args, **kwargs):
-        self.response = None
-        try:
-            self.response = super(ShopifyConnection, self)._open(*args, **kwargs)
-        except pyactiveresource.connection.ConnectionError as err:
-            self.response = err.response
-            raise
-        return self.response
+    @property
+    def limiter(self):
+        """The call limiter shared by all connections to this shop."""
+        return CallLimiter.for_site(self.site)
+
+    def _open(self, method, path, headers=None, data=None):
+        limiter = self.limiter
+        attempt = 0
+        while True:
+            self.response = None
+            limiter.acquire()
+            try:
+                self.response = super(ShopifyConnection, self)._open(method, path, headers=headers, data=data)
+            except pyactiveresource.connection.ConnectionError as err:
+                self.response = err.response
+                limiter.update(self.response)
+                if not limiter.should_retry(method, err.code, attempt):
+                    raise
+                limiter.backoff(err.code, attempt, self.response.get("Retry-After"))
+            except pyactiveresource.connection.ServerError as err:
+                if not limiter.should_retry(method, err.code, attempt):
+                    raise
+                limiter.backoff(err.code, attempt)
+            else:
+                limiter.update(self.response)
+                return self.response
+            attempt += 1
 
 
 # Inherit from pyactiveresource's metaclass in order to use ShopifyConnection
@@ -1,6 +1,8 @@
 from . pyactiveresource.collection import Collection
 from six.moves.urllib.parse import urlparse, parse_qs
+from six.moves import queue
 import cgi
+import threading
 
 
 class PaginatedCollection(Collection):
@@ -156,3 +158,88 @@ class PaginatedIterator(object):
                 current_page = current_page.next_page(no_cache=True)
             except IndexError:
                 return
+
+
+class PrefetchPaginatedIterator(PaginatedIterator):
+    """
+    A PaginatedIterator which fetches the next page in a background thread
+    while the caller works on the current one, so waiting on Shopify and
+    processing a page overlap. At most `prefetch` pages wait in the buffer.
+
+    The background thread only does HTTP requests, with its own connection
+    configured from the session of the calling thread.
+
+    >>> from shopify import Order, PrefetchPaginatedIterator
+    >>> for page in PrefetchPaginatedIterator(Order.find(limit=250)):
+    ...     store(page)
+    ...
+    # the next page is already being fetched while a page is stored
+    """
+
+    _done = object()
+
+    def __init__(self, collection, prefetch=1):
+        super(PrefetchPaginatedIterator, self).__init__(collection)
+        self.prefetch = prefetch
+
+    def __iter__(self):
+        pages = queue.Queue(maxsize=self.prefetch)
+        stopped = threading.Event()
+        resource_class = self.collection.metadata["resource_class"]
+        session = _get_thread_session(resource_class)
+
+        def put(item):
+            while not stopped.is_set():
+                try:
+                    pages.put(item, timeout=1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def fetch_pages():
+            _set_thread_session(resource_class, session)
+            try:
+                for page in PaginatedIterator(self.collection):
+                    if not put((page, None)):
+                        return
+                put((self._done, None))
+            except Exception as error:
+                put((None, error))
+
+        thread = threading.Thread(target=fetch_pages, name="shopify-page-prefetch")
+        thread.daemon = True
+        thread.start()
+        try:
+            while True:
+                page, error = pages.get()
+                if error is not None:
+                    raise error
+                if page is self._done:
+                    return
+                yield page
+        finally:
+            stopped.set()
+
+
+def _get_thread_session(resource_class):
+    """Returns the connection settings of the current thread."""
+    return {
+        "site": resource_class.site,
+        "user": resource_class.user,
+        "password": resource_class.password,
+        "timeout": resource_class.timeout,
+        "headers": dict(resource_class.headers),
+        "format": resource_class.format,
+        "version": resource_class.version,
+        "url": resource_class.url,
+    }
+
+
+def _set_thread_session(resource_class, session):
+    """Configures the connection of the current thread without changing the
+    defaults shared by all the threads."""
+    local = resource_class._threadlocal
+    for key, value in session.items():
+        setattr(local, key, value)
+    local.connection = None
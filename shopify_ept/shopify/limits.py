@@ -1,4 +1,7 @@
 from .. import shopify
+import random
+import threading
+import time
 
 
 class Limits(object):
@@ -60,3 +63,140 @@ class Limits(object):
         How many API calls have I made?
         """
         return int(cls.api_credit_limit_param()[0])
+
+
+class CallLimiter(object):
+    """
+    Client side model of the leaky bucket Shopify applies to every shop.
+
+    One limiter is shared by all connections (and threads) talking to the
+    same shop. Each request reserves a slot in the bucket before it is sent
+    and waits when the bucket is about to overflow, so callers are paced at
+    the leak rate instead of running into 429 responses. The bucket level is
+    re-synchronised from the X-Shopify-Shop-Api-Call-Limit header of every
+    response.
+
+    >>> limiter = CallLimiter.for_site("https://my-shop.myshopify.com")
+    >>> limiter.counters()
+    {'requests': 0, 'throttled': 0, 'retries': 0, 'waited': 0.0}
+    """
+
+    # Default bucket of standard plans: 40 calls, leaking 2 calls/second.
+    # The real size is learnt from the response headers (80 on Shopify Plus)
+    # and the leak rate scales with it.
+    DEFAULT_BUCKET_SIZE = 40
+    BUCKET_DRAIN_SECONDS = 20.0
+    # Slots kept free for other processes (webhooks, crons) using the shop.
+    HEADROOM = 2
+    MAX_RETRIES = 5
+    BACKOFF_BASE = 1.0
+    BACKOFF_MAX = 32.0
+    RETRY_SERVER_ERROR_METHODS = ("GET", "HEAD", "PUT", "DELETE")
+    RETRY_SERVER_ERROR_CODES = (500, 502, 503, 504)
+
+    _registry = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, bucket_size=DEFAULT_BUCKET_SIZE):
+        self._lock = threading.Lock()
+        self.bucket_size = bucket_size
+        self.level = 0.0
+        self._updated_at = time.monotonic()
+        self._counters = {"requests": 0, "throttled": 0, "retries": 0, "waited": 0.0}
+
+    @classmethod
+    def for_site(cls, site):
+        """Return the limiter shared by every connection to the given shop."""
+        with cls._registry_lock:
+            limiter = cls._registry.get(site)
+            if limiter is None:
+                limiter = cls._registry[site] = cls()
+            return limiter
+
+    @classmethod
+    def reset(cls):
+        """Forget all known shops and their counters."""
+        with cls._registry_lock:
+            cls._registry.clear()
+
+    @property
+    def leak_rate(self):
+        """Number of calls per second the bucket drains."""
+        return self.bucket_size / self.BUCKET_DRAIN_SECONDS
+
+    def _leak(self, now):
+        elapsed = now - self._updated_at
+        self.level = max(0.0, self.level - elapsed * self.leak_rate)
+        self._updated_at = now
+
+    def acquire(self):
+        """
+        Reserve a slot for one request, sleeping first if the bucket would overflow.
+
+        Returns:
+            The number of seconds waited.
+        """
+        with self._lock:
+            self._leak(time.monotonic())
+            self.level += 1
+            overflow = self.level - (self.bucket_size - self.HEADROOM)
+            wait = overflow / self.leak_rate if overflow > 0 else 0.0
+            self._counters["requests"] += 1
+            self._counters["waited"] += wait
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def update(self, response):
+        """Synchronise the bucket level with the call limit header of a response."""
+        headers = getattr(response, "headers", None) or {}
+        value = headers.get(Limits.CREDIT_LIMIT_HEADER_PARAM)
+        if not value:
+            return
+        try:
+            used, size = [int(part) for part in value.split("/")]
+        except ValueError:
+            return
+        with self._lock:
+            self.bucket_size = size
+            self.level = float(used)
+            self._updated_at = time.monotonic()
+
+    def should_retry(self, method, code, attempt):
+        """Tell whether a failed request may be sent again."""
+        if attempt >= self.MAX_RETRIES:
+            return False
+        if code == 429:
+            return True
+        return code in self.RETRY_SERVER_ERROR_CODES and method in self.RETRY_SERVER_ERROR_METHODS
+
+    def backoff(self, code, attempt, retry_after=None):
+        """
+        Sleep before retrying a throttled or failed request.
+
+        A 429 marks the bucket as full and honours the Retry-After header,
+        other errors use exponential backoff. Both are jittered so workers
+        hitting the same shop do not retry in lockstep.
+        """
+        if code == 429:
+            try:
+                delay = float(retry_after)
+            except (TypeError, ValueError):
+                delay = 1 / self.leak_rate
+            delay += random.uniform(0, self.BACKOFF_BASE)
+            with self._lock:
+                self.level = float(self.bucket_size)
+                self._updated_at = time.monotonic()
+                self._counters["throttled"] += 1
+        else:
+            delay = random.uniform(0, min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2 ** attempt))
+        with self._lock:
+            self._counters["retries"] += 1
+            self._counters["waited"] += delay
+        time.sleep(delay)
+        return delay
+
+    def counters(self):
+        """Return a snapshot of the requests, throttles, retries and seconds waited."""
+        with self._lock:
+            return dict(self._counters)
@@ -3,10 +3,15 @@
 """A connection object to interface with REST services."""
 
 import base64
+import collections
 import logging
+import select
 import socket
 import sys
+import threading
+import time
 import six
+from six.moves import http_client
 from six.moves import urllib
 from . import formats
 
@@ -123,6 +128,190 @@ class Request(urllib.request.Request):
         self._method = method
 
 
+class PooledResponse(object):
+    """An HTTP response whose socket goes back to its pool once consumed.
+
+    Exposes the attributes of the response returned by urllib.request.urlopen
+    (code, msg, headers, url) so it can be used in its place.
+    """
+
+    def __init__(self, pool, key, conn, response, url):
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._response = response
+        self.code = response.status
+        self.msg = response.reason
+        self.headers = response.headers
+        self.url = url
+
+    def info(self):
+        return self.headers
+
+    def read(self):
+        """Read the entire response body and release the connection."""
+        try:
+            body = self._response.read()
+        except (http_client.HTTPException, socket.error):
+            self._release(reuse=False)
+            raise
+        self._release(reuse=not self._response.will_close)
+        return body
+
+    def close(self):
+        """Close the response, dropping the connection if it was not consumed."""
+        self._release(reuse=False)
+
+    def _release(self, reuse):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        if reuse:
+            self._pool.put(self._key, conn)
+        else:
+            conn.close()
+
+
+def _is_connection_dropped(conn):
+    """Return True if the server closed the idle connection.
+
+    An idle keep-alive socket has nothing to read; when it is readable the
+    server has sent EOF (or unexpected data), so it must not be reused.
+    """
+    sock = conn.sock
+    if sock is None:
+        return True
+    try:
+        readable, _writable, _errored = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+class HTTPConnectionPool(object):
+    """A thread-safe pool of keep-alive HTTP(S) connections, one bucket per host.
+
+    Sequential requests to the same host reuse an idle socket instead of
+    paying a new TCP and TLS handshake each time.
+
+    Args:
+        maxsize: Number of idle connections kept per host.
+        idle_timeout: Seconds after which an idle connection is discarded.
+        ssl_context: SSLContext used for HTTPS connections.
+    """
+
+    # Requests which can be sent again when their response is lost.
+    IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'PUT', 'DELETE'])
+
+    def __init__(self, maxsize=10, idle_timeout=30.0, ssl_context=None):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.ssl_context = ssl_context
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _new_connection(self, key, timeout):
+        scheme, host, port = key
+        if scheme == 'https':
+            return http_client.HTTPSConnection(host, port, timeout=timeout, context=self.ssl_context)
+        return http_client.HTTPConnection(host, port, timeout=timeout)
+
+    def get(self, key, timeout=None):
+        """Return an idle connection for key, or None if there is none."""
+        expired = []
+        conn = None
+        with self._lock:
+            idle = self._idle.get(key) or collections.deque()
+            now = time.monotonic()
+            # Oldest connections sit on the left, the most recent on the right.
+            while idle and now - idle[0][1] >= self.idle_timeout:
+                expired.append(idle.popleft()[0])
+            while idle and conn is None:
+                conn = idle.pop()[0]
+                if _is_connection_dropped(conn):
+                    expired.append(conn)
+                    conn = None
+        for candidate in expired:
+            candidate.close()
+        if conn is not None:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+        return conn
+
+    def put(self, key, conn):
+        """Hand a connection back to the pool, closing it if the pool is full."""
+        with self._lock:
+            idle = self._idle.setdefault(key, collections.deque())
+            if len(idle) < self.maxsize:
+                idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def clear(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn, _released_at in connections:
+                conn.close()
+
+    def urlopen(self, request, timeout=None):
+        """Send a urllib request over a pooled connection.
+
+        Args:
+            request: A urllib.request.Request object.
+            timeout: socket timeout.
+        Returns:
+            A PooledResponse object.
+        Raises:
+            urllib.error.HTTPError on 4xx and 5xx responses.
+            urllib.error.URLError on IO errors.
+        """
+        parts = urllib.parse.urlsplit(request.full_url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        selector = urllib.parse.urlunsplit(('', '', parts.path or '/', parts.query, ''))
+        headers = dict(request.header_items())
+        headers.setdefault('Connection', 'keep-alive')
+
+        method = request.get_method()
+        conn = self.get(key, timeout)
+        reused = conn is not None
+        while True:
+            if conn is None:
+                conn = self._new_connection(key, timeout)
+            sent = False
+            try:
+                conn.request(method, selector, request.data, headers)
+                sent = True
+                http_response = conn.getresponse()
+                break
+            except (http_client.HTTPException, socket.error) as err:
+                conn.close()
+                conn = None
+                # The server may have dropped a connection that sat idle in
+                # the pool. When sending failed the request never reached it,
+                # so try a fresh one. Once sent, the server may have processed
+                # it, so only idempotent requests are sent again, unless the
+                # server closed the connection without any response bytes,
+                # which is how it drops an idle keep-alive connection.
+                if (reused and not isinstance(err, socket.timeout) and
+                        (not sent or method in self.IDEMPOTENT_METHODS or
+                         isinstance(err, http_client.RemoteDisconnected))):
+                    reused = False
+                    continue
+                raise urllib.error.URLError(err)
+
+        response = PooledResponse(self, key, conn, http_response, request.full_url)
+        if response.code >= 400:
+            raise urllib.error.HTTPError(request.full_url, response.code, response.msg,
+                                         response.headers, response)
+        return response
+
+
+default_pool = HTTPConnectionPool()
+
+
 def _urllib_has_timeout():
   """Determines if our version of urllib.request.urlopen has a timeout argument."""
   # NOTE: This is a terrible hack, but there's no other indication that this
@@ -188,6 +377,10 @@ class Response(object):
 class Connection(object):
     """A connection object to interface with REST services."""
 
+    # Keep-alive transport shared by all connections. Set to None to open a
+    # new urllib connection for every request.
+    pool = default_pool
+
     def __init__(self, site, user=None, password=None, timeout=None,
                  format=formats.JSONFormat):
 
@@ -285,7 +478,13 @@ class Connection(object):
             try:
                 http_response = self._handle_error(self._urlopen(request))
             except urllib.error.HTTPError as err:
-                http_response = self._handle_error(err)
+                try:
+                    http_response = self._handle_error(err)
+                except ServerError:
+                    # The body of a server error is not read by the error,
+                    # drain it so its pooled connection is released.
+                    self._release_error_response(err)
+                    raise
             except urllib.error.URLError as err:
                 raise Error(err, url)
             response = Response.from_httpresponse(http_response)
@@ -301,6 +500,19 @@ class Connection(object):
                       len(response.body))
         return response
 
+    def _release_error_response(self, err):
+        """Read and close the response of an HTTP error.
+
+        Args:
+            err: A urllib.error.HTTPError object.
+        """
+        try:
+            err.read()
+        except (http_client.HTTPException, socket.error):
+            pass
+        finally:
+            err.close()
+
     def _urlopen(self, request):
         """Wrap calls to urllib so they can be overriden.
 
@@ -312,6 +524,8 @@ class Connection(object):
             urllib.error.HTTPError on server errors.
             urllib.error.URLError on IO errors.
         """
+        if self.pool is not None and not urllib.request.getproxies():
+          return self.pool.urlopen(request, timeout=self.timeout)
         if _urllib_has_timeout():
           return urllib.request.urlopen(request, timeout=self.timeout)
         else:
@@ -9,6 +9,7 @@ from pprint import pformat
 import six
 from six import BytesIO
 from six.moves import urllib
+from .. import connection
 
 
 class Error(Exception):
@@ -19,6 +20,8 @@ def initialize():
     """Install TestHandler as the only active handler for http requests."""
     opener = urllib.request.build_opener(TestHandler)
     urllib.request.install_opener(opener)
+    # The keep-alive pool bypasses urllib openers.
+    connection.Connection.pool = None
 
 
 def create_response_key(method, url, request_headers):
@@ -77,6 +77,6 @@ from .api_permission import ApiPermission
 from .publication import Publication
 from .collection_publication import CollectionPublication
 from .product_publication import ProductPublication
-from .graphql import GraphQL
+from .graphql import GraphQL, GRAPHQL_API_VERSION
 
 from ..base import ShopifyResource
@@ -2,11 +2,30 @@ from ... import shopify
 from ..base import ShopifyResource
 from six.moves import urllib
 import json
+import time
+
+# The GraphQL queries and mutations of the connector need a newer API version than its REST endpoints.
+GRAPHQL_API_VERSION = "2024-07"
+GRAPHQL_THROTTLE_RETRIES = 2
+
+
+def get_throttle_delay(result):
+    """Return how long to wait until the GraphQL cost bucket of the store has
+    restored enough points for the throttled query, in seconds."""
+    cost = result.get("extensions", {}).get("cost", {})
+    throttle_status = cost.get("throttleStatus", {})
+    missing = cost.get("requestedQueryCost", 0) - throttle_status.get("currentlyAvailable", 0)
+    restore_rate = throttle_status.get("restoreRate") or 50.0
+    return max(1.0, missing / restore_rate)
 
 
 class GraphQL:
-    def __init__(self):
-        self.endpoint = shopify.ShopifyResource.get_site() + "/graphql.json"
+    def __init__(self, version=None):
+        site = shopify.ShopifyResource.get_site()
+        if version:
+            # Target another API version than the one of the active session.
+            site = site.rsplit("/", 1)[0] + "/" + version
+        self.endpoint = site + "/graphql.json"
         self.headers = shopify.ShopifyResource.get_headers()
 
     def merge_headers(self, *headers):
@@ -30,3 +49,15 @@ class GraphQL:
             print((e.read()))
             print("")
             raise e
+
+    def execute_with_retry(self, query, variables=None, retries=GRAPHQL_THROTTLE_RETRIES):
+        """Execute the query and decode its response, waiting and retrying
+        while the GraphQL cost bucket of the store is throttled."""
+        for attempt in range(retries + 1):
+            result = json.loads(self.execute(query, variables))
+            errors = result.get("errors") or []
+            if not any(error.get("extensions", {}).get("code") == "THROTTLED" for error in errors) or \
+                    attempt == retries:
+                break
+            time.sleep(get_throttle_delay(result))
+        return result
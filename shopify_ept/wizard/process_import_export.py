@@ -16,7 +16,6 @@ from odoo.tools.misc import split_every
 
 from odoo import models, fields, api, _
 from .. import shopify
-from ..shopify.pyactiveresource.connection import ClientError
 
 _logger = logging.getLogger("Shopify Operations")
 
@@ -71,10 +70,17 @@ class ShopifyProcessImportExport(models.TransientModel):
     shopify_order_ids = fields.Text(string="Order Ids",
                                     help="Based on template ids get product from shopify and import products in odoo")
     export_stock_from = fields.Datetime(help="It is used for exporting stock from Odoo to Shopify.")
+    is_force_stock_resync = fields.Boolean(string="Force Full Stock Resync",
+                                           help="If you mark it, the stock of all products is exported even if it "
+                                                "did not change since the last export.")
     payout_start_date = fields.Date(string="Start Date")
     payout_end_date = fields.Date(string="End Date")
     skip_existing_product = fields.Boolean(string="Do Not Update Existing Products",
                                            help="Check if you want to skip existing products.")
+    is_bulk_import = fields.Boolean(string="Use Bulk Operation",
+                                    help="If you mark it, Shopify exports all the records of the period at once in "
+                                         "the background and they are added into queues by the bulk operation "
+                                         "cron. Recommended for the first import of a big store.")
     csv_file = fields.Binary(help="Select CSV file to upload.")
     file_name = fields.Char(help="Name of CSV file.")
     cron_process_notification = fields.Text(string="Shopify Note: ", store=False,
@@ -96,6 +102,10 @@ class ShopifyProcessImportExport(models.TransientModel):
         queue_ids = False
 
         instance = self.shopify_instance_id
+        if self.is_bulk_import and self.shopify_operation in ["sync_product", "import_unshipped_orders",
+                                                              "import_shipped_orders"]:
+            return self.shopify_start_bulk_import(instance)
+
         if self.shopify_operation == "sync_product":
             product_queue_ids = product_data_queue_obj.shopify_create_product_data_queue(
                 instance, self.import_products_based_on_date, self.orders_from_date, self.orders_to_date,
@@ -198,6 +208,21 @@ class ShopifyProcessImportExport(models.TransientModel):
             "tag": "reload",
         }
 
+    def shopify_start_bulk_import(self, instance):
+        """ This method is used to launch the bulk operation of the selected import and to open it.
+            @return: Action of the bulk operation.
+        """
+        import_types = {"sync_product": "product", "import_unshipped_orders": "unshipped_order",
+                        "import_shipped_orders": "shipped_order"}
+        bulk_operation = self.env["shopify.bulk.operation.ept"].start_bulk_import(
+            instance, import_types[self.shopify_operation], self.orders_from_date, self.orders_to_date,
+            self.import_products_based_on_date, self.skip_existing_product)
+        action = self.env.ref("shopify_ept.action_shopify_bulk_operation_ept").sudo().read()[0]
+        form_view = self.sudo().env.ref("shopify_ept.view_shopify_bulk_operation_ept_form")
+        action.update({"view_id": (form_view.id, form_view.name), "res_id": bulk_operation.id,
+                       "views": [(form_view.id, "form")]})
+        return action
+
     def manual_export_product_to_shopify(self):
         """ This method is used to call child method for export products from shopify layer products to Shopify store.
             It calls from the Shopify layer product screen.
@@ -303,9 +328,9 @@ class ShopifyProcessImportExport(models.TransientModel):
             customer_ids = shopify.Customer().find(
                 updated_at_min=self.shopify_instance_id.shopify_last_date_customer_import, limit=250)
         if customer_ids:
-            customer_queues_ids = self.create_customer_data_queues(customer_ids)
-            if len(customer_ids) == 250:
-                customer_queues_ids += self.shopify_list_all_customer(customer_ids)
+            # The next page is fetched in the background while the queues of the current one are created.
+            for page in shopify.PrefetchPaginatedIterator(customer_ids):
+                customer_queues_ids += self.create_customer_data_queues(page)
 
             self.shopify_instance_id.shopify_last_date_customer_import = datetime.now()
         if not customer_ids:
@@ -342,6 +367,7 @@ class ShopifyProcessImportExport(models.TransientModel):
     def webhook_customer_create_process(self, res, instance):
         """
         This method is used for create customer queue and queue line while the customer create form the webhook method.
+        The queue line is processed by the customer queue cron which is triggered right away.
         :param res: Response of customer which receive from the webhook.
         :param instance: Record of the instance.
         @author: Angel Patel @Emipro Technologies Pvt. Ltd on date 13/01/2020.
@@ -358,42 +384,9 @@ class ShopifyProcessImportExport(models.TransientModel):
         _logger.info(message)
 
         customer_queue_id.synced_customer_queue_line_ids.shopify_customer_data_queue_line_create(res, customer_queue_id)
-        if len(customer_queue_id.synced_customer_queue_line_ids) == 50:
-            customer_queue_id.synced_customer_queue_line_ids.sync_shopify_customer_into_odoo()
+        self.env.ref("shopify_ept.process_shopify_customer_queue")._trigger()
         return True
 
-    def shopify_list_all_customer(self, result):
-        """
-        This method used to call the page wise data import for customers from Shopify to Odoo.
-        @author: Angel Patel @Emipro Technologies Pvt. Ltd on date 14/10/2019.
-        :Task ID: 157065
-        Modify by Haresh Mori on date 26/12/2019, Taken Changes for the pagination and API version.
-        """
-        catch = ""
-        customer_queue_list = []
-        while result:
-            page_info = ""
-            link = shopify.ShopifyResource.connection.response.headers.get('Link')
-            if not link or not isinstance(link, str):
-                return customer_queue_list
-            for page_link in link.split(','):
-                if page_link.find('next') > 0:
-                    page_info = page_link.split(';')[0].strip('<>').split('page_info=')[1]
-                    try:
-                        result = shopify.Customer().find(page_info=page_info, limit=250)
-                    except ClientError as error:
-                        if hasattr(error, "response"):
-                            if error.response.code == 429 and error.response.msg == "Too Many Requests":
-                                time.sleep(int(float(error.response.headers.get('Retry-After', 5))))
-                                result = shopify.Customer().find(page_info=page_info, limit=250)
-                    except Exception as error:
-                        raise UserError(error)
-                    if result:
-                        customer_queue_list += self.create_customer_data_queues(result)
-            if catch == page_info:
-                break
-        return customer_queue_list
-
     def import_cancel_order_cron_action(self, ctx=False):
         """This method is used to import cancel orders from the auto-import cron job.
         """
@@ -440,7 +433,9 @@ class ShopifyProcessImportExport(models.TransientModel):
         products = product_obj.get_products_based_on_movement_date_ept(last_update_date,
                                                                        instance.shopify_company_id)
         if products:
-            shopify_products = shopify_product_obj.export_stock_in_shopify(instance, products)
+            is_force_stock_resync = self.is_force_stock_resync or ctx.get('is_force_stock_resync', False)
+            shopify_products = shopify_product_obj.with_context(
+                is_force_stock_resync=is_force_stock_resync).export_stock_in_shopify(instance, products)
             if shopify_products:
                 instance.write({'shopify_last_date_update_stock': shopify_products[0].last_stock_update_date})
         else:
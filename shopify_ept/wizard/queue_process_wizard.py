@@ -69,14 +69,15 @@ class ShopifyQueueProcessEpt(models.TransientModel):
         if model == "shopify.order.data.queue.line.ept":
             order_queue_ids = shopify_order_queue_line_obj.search([('id', 'in', order_queue_ids)]).mapped(
                 "shopify_order_data_queue_id").ids
-        self.env.cr.execute(
-            """update shopify_order_data_queue_ept set is_process_queue = False where is_process_queue = True""")
-        self._cr.commit()
+        lease_time = self.env["shopify.instance.ept"].get_shopify_cron_execution_time(
+            "shopify_ept.process_shopify_order_queue") * 2
         for order_queue_id in order_queue_ids:
-            order_queue_line_batch = shopify_order_queue_line_obj.search(
-                [("shopify_order_data_queue_id", "=", order_queue_id),
-                 ("state", "in", ('draft', 'failed'))])
+            # Lines claimed by a worker of the order queue cron are left to it.
+            order_queue_line_batch = shopify_order_queue_line_obj.claim_order_queue_lines_of_queue(order_queue_id,
+                                                                                                   lease_time)
             order_queue_line_batch.process_import_order_queue_data()
+            order_queue_line_batch.exists().write({"lease_expires_at": False})
+            self._cr.commit()
         return True
 
     def set_to_completed_queue(self):
@@ -201,6 +201,10 @@ class ResConfigSettings(models.TransientModel):
                                                  string="Sync Product With", default="sku")
     shopify_pricelist_id = fields.Many2one("product.pricelist", string="Shopify Pricelist")
     shopify_stock_field = fields.Many2one("ir.model.fields", string="Stock Field")
+    shopify_stock_export_method = fields.Selection([("rest", "One Request per Product"),
+                                                    ("graphql", "Batched GraphQL Requests")],
+                                                   string="Export Stock Method", default="rest")
+    shopify_stock_export_on_move = fields.Boolean("Export Shopify Stock on Stock Moves", default=False)
     shopify_section_id = fields.Many2one("crm.team", "Shopify Sales Team")
     shopify_is_use_default_sequence = fields.Boolean("Use Odoo Default Sequence in Shopify Orders",
                                                      help="If checked,Then use default sequence of odoo while create "
@@ -222,6 +226,7 @@ class ResConfigSettings(models.TransientModel):
     shopify_activity_type_id = fields.Many2one("mail.activity.type", string="Shopify Activity Type")
     shopify_date_deadline = fields.Integer("Deadline Lead Days for Shopify", default=1,
                                            help="its add number of  days in schedule activity deadline date ")
+    shopify_queue_retention_days = fields.Integer("Shopify Queue Lines Retention Days", default=0)
     is_shopify_create_schedule = fields.Boolean("Create Schedule activity ? ", default=False,
                                                 help="If checked, Then Schedule Activity create on order dara queues"
                                                      " will any queue line failed.")
@@ -276,6 +281,8 @@ class ResConfigSettings(models.TransientModel):
 
     shopify_import_order_after_date = fields.Datetime(
         help="Connector only imports those orders which have created after a given date.")
+    shopify_defer_auto_workflow = fields.Boolean("Process Auto Workflow Separately", default=False)
+    shopify_batch_auto_workflow_invoices = fields.Boolean("Batch Invoices and Payments", default=False)
 
     # Analytic
     shopify_analytic_account_id = fields.Many2one('account.analytic.account', string='Shopify Analytic Account',
@@ -294,6 +301,8 @@ class ResConfigSettings(models.TransientModel):
             self.shopify_sync_product_with = instance.shopify_sync_product_with
             self.shopify_pricelist_id = instance.shopify_pricelist_id and instance.shopify_pricelist_id.id or False
             self.shopify_stock_field = instance.shopify_stock_field and instance.shopify_stock_field.id or False
+            self.shopify_stock_export_method = instance.shopify_stock_export_method
+            self.shopify_stock_export_on_move = instance.shopify_stock_export_on_move
             self.shopify_section_id = instance.shopify_section_id.id or False
             self.shopify_order_prefix = instance.shopify_order_prefix
             self.shopify_is_use_default_sequence = instance.is_use_default_sequence
@@ -307,6 +316,7 @@ class ResConfigSettings(models.TransientModel):
             self.shopify_activity_type_id = instance.shopify_activity_type_id or False
             self.shopify_date_deadline = instance.shopify_date_deadline or False
             self.is_shopify_create_schedule = instance.is_shopify_create_schedule or False
+            self.shopify_queue_retention_days = instance.shopify_queue_retention_days
             self.shopify_sync_product_with_images = instance.sync_product_with_images or False
             self.create_shopify_products_webhook = instance.create_shopify_products_webhook
             self.create_shopify_customers_webhook = instance.create_shopify_customers_webhook
@@ -324,6 +334,8 @@ class ResConfigSettings(models.TransientModel):
             self.shopify_order_status_ids = instance.shopify_order_status_ids.ids
             self.auto_fulfill_gift_card_order = instance.auto_fulfill_gift_card_order
             self.shopify_import_order_after_date = instance.import_order_after_date or False
+            self.shopify_defer_auto_workflow = instance.defer_auto_workflow
+            self.shopify_batch_auto_workflow_invoices = instance.batch_auto_workflow_invoices
             self.shopify_analytic_account_id = instance.shopify_analytic_account_id.id or False
             self.shopify_analytic_tag_ids = instance.shopify_analytic_tag_ids.ids
 
@@ -341,6 +353,8 @@ class ResConfigSettings(models.TransientModel):
             values["shopify_sync_product_with"] = self.shopify_sync_product_with
             values["shopify_pricelist_id"] = self.shopify_pricelist_id and self.shopify_pricelist_id.id or False
             values["shopify_stock_field"] = self.shopify_stock_field and self.shopify_stock_field.id or False
+            values["shopify_stock_export_method"] = self.shopify_stock_export_method
+            values["shopify_stock_export_on_move"] = self.shopify_stock_export_on_move
             values["shopify_section_id"] = self.shopify_section_id and self.shopify_section_id.id or False
             values["shopify_order_prefix"] = self.shopify_order_prefix
             values["is_use_default_sequence"] = self.shopify_is_use_default_sequence
@@ -355,6 +369,7 @@ class ResConfigSettings(models.TransientModel):
             values["shopify_date_deadline"] = self.shopify_date_deadline or False
             values.update({"shopify_user_ids": [(6, 0, self.shopify_user_ids.ids)]})
             values["is_shopify_create_schedule"] = self.is_shopify_create_schedule
+            values["shopify_queue_retention_days"] = self.shopify_queue_retention_days
             values["sync_product_with_images"] = self.shopify_sync_product_with_images or False
             values["create_shopify_products_webhook"] = self.create_shopify_products_webhook
             values["create_shopify_customers_webhook"] = self.create_shopify_customers_webhook
@@ -371,6 +386,8 @@ class ResConfigSettings(models.TransientModel):
             values['shopify_order_status_ids'] = [(6, 0, self.shopify_order_status_ids.ids)]
             values["auto_fulfill_gift_card_order"] = self.auto_fulfill_gift_card_order
             values["import_order_after_date"] = self.shopify_import_order_after_date
+            values["defer_auto_workflow"] = self.shopify_defer_auto_workflow
+            values["batch_auto_workflow_invoices"] = self.shopify_batch_auto_workflow_invoices
             values["shopify_analytic_account_id"] = self.shopify_analytic_account_id and \
                                                     self.shopify_analytic_account_id.id or False
             values["shopify_analytic_tag_ids"] = [(6, 0, self.shopify_analytic_tag_ids.ids)]